@@ -1,17 +1,45 @@
-import os
 import json
 import logging
-from langchain_mistralai import ChatMistralAI
-from langchain_core.messages import HumanMessage
-from dotenv import load_dotenv
+from pipeline import llm
+from pipeline.prompts import compact_product, get_prompt_budget
+from pipeline.responses import comparison_schema, resolve, aresolve
+from pipeline.scheduler import PRIORITY_COMPARISON
 
-load_dotenv()
 logger = logging.getLogger()
 
 # Comparison Agent - LangGraph Node Function
 class ComparisonAgent:
     """Comparison Agent: Compares two products using LangChain + Mistral AI"""
     
+    # State keys this agent consumes and produces
+    READS = ('product_a', 'product_b')
+    WRITES = ('comparison',)
+    
+    # Bump whenever the prompt template changes so cached responses are not reused
+    PROMPT_VERSION = "2"
+    
+    # Scheduler queue position of this agent's requests (lower is served first)
+    PRIORITY = PRIORITY_COMPARISON
+    
+    def build_prompt(self, product_a, product_b) -> str:
+        """Comparison prompt for one product pair; the summaries are keyed by product name"""
+        name_a = json.dumps(product_a.get('name', ''), ensure_ascii=False)
+        name_b = json.dumps(product_b.get('name', ''), ensure_ascii=False)
+        return f"""You are an expert product reviewer. Compare the two products below using ONLY their data; \
+do not assume anything.
+Product A: {compact_product(product_a)}
+Product B: {compact_product(product_b)}
+Reply with JSON only, without ``` fences, with these keys:
+{name_a}: summary of Product A
+{name_b}: summary of Product B
+"Comparison": 3 points of difference between the products, each with its conclusion
+"Recommendation": which product to recommend to which user
+Be factual and concise; each summary and the recommendation must be under 200 words."""
+    
+    def schema(self, product_a, product_b):
+        """Expected answer shape: summaries keyed by the two product names"""
+        return comparison_schema(product_a.get('name', ''), product_b.get('name', ''))
+    
     def run(self, state):
         """LangGraph Node: Compare Product A and B using LangChain + Mistral AI"""
         logger.info("Comparison Node Loaded successfully")
@@ -20,51 +48,46 @@ class ComparisonAgent:
         try:
             product_a = state.get('product_a', {})
             product_b = state.get('product_b', {})
-            api_key = os.environ.get('MISTRAL_API_KEY')
             
-            if not api_key:
-                logger.warning("MISTRAL_API_KEY not set. Skipping comparison.")
-                state['comparison'] = {}
-                return state
+            if not llm.is_available():
+                return self._skip()
             
-            # Initialize LangChain ChatMistralAI
-            llm = ChatMistralAI(api_key=api_key, model="mistral-large-latest", temperature=0.4)
-            
-            prompt_text = f"""
-You are an expert product review agent with overall 15+ years of experience. You have a sharp eye for details and is able to 
-extract meaningful and smart insights from a product. Your task is to compare the following 2 products and then give the json output
-as per the desired output structure.
-
-Products to Compare - 
-Product A - {json.dumps(product_a, indent=2)}
-Product B - {json.dumps(product_b, indent=2)}
-
-Output Structure - 
-{product_a} - Summarise the Product A 
-{product_b} - Summarise the Product B
-Comparison - 3 points of differentation between both the products along with conclusion of that point
-Recommendation - Recommend the right product for a user
-
-Guardrails:
-1. Give factual and concise answers only.
-2. Use the names of products at the place of "Product A" and "Product B"
-3. Do not assume anything.
-4. The summary and recommendation must be strictly less than 200 words.
-5. Give a proper JSON output and do not include "```JSON" or "```" in the output.
-"""
+            prompt = get_prompt_budget().admit(self.build_prompt(product_a, product_b), 'comparison')
+            response = llm.invoke(prompt, self.PROMPT_VERSION, priority=self.PRIORITY)
+            return self._store(resolve(response.content, self.schema(product_a, product_b), prompt,
+                                       self.PROMPT_VERSION, self.PRIORITY))
+        
+        except Exception as e:
+            return self._fail(e)
+    
+    async def arun(self, state):
+        """Async LangGraph Node: Compare Product A and B on the shared event loop"""
+        logger.info("Comparison Node Loaded successfully")
+        
+        try:
+            product_a = state.get('product_a', {})
+            product_b = state.get('product_b', {})
             
-            message = HumanMessage(content=prompt_text)
-            response = llm.invoke([message])
-            content = response.content
+            if not llm.is_available():
+                return self._skip()
             
-            comparison_data = json.loads(content)
-            state['comparison'] = comparison_data
-            logger.info("Comparison generated successfully")
-            return state
+            prompt = get_prompt_budget().admit(self.build_prompt(product_a, product_b), 'comparison')
+            response = await llm.ainvoke(prompt, self.PROMPT_VERSION, priority=self.PRIORITY)
+            return self._store(await aresolve(response.content, self.schema(product_a, product_b), prompt,
+                                              self.PROMPT_VERSION, self.PRIORITY))
         
         except Exception as e:
-            error_msg = f"Error comparing products: {e}"
-            logger.error(error_msg)
-            state['error'] = error_msg
-            state['comparison'] = {}
-            return state
\ No newline at end of file
+            return self._fail(e)
+    
+    def _skip(self):
+        logger.warning("MISTRAL_API_KEY not set. Skipping comparison.")
+        return {'comparison': {}}
+    
+    def _store(self, comparison_data):
+        logger.info("Comparison generated successfully")
+        return {'comparison': comparison_data}
+    
+    def _fail(self, e):
+        error_msg = f"Error comparing products: {e}"
+        logger.error(error_msg)
+        return {'error': error_msg, 'comparison': {}}
\ No newline at end of file
@@ -0,0 +1,291 @@
+import re
+import json
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from agents.parser import Product, PRODUCT_FIELDS
+from agents.content_block import create_summary, create_price
+from pipeline import llm
+from pipeline.prompts import get_prompt_budget
+from pipeline.responses import NARRATIVE_SCHEMA, load_object
+from pipeline.scheduler import PRIORITY_COMPARISON
+
+logger = logging.getLogger()
+
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+
+# Profiles kept for reuse by later pairs and windows
+MAX_PROFILES = 100_000
+
+# Answer shape of one comparison's narrative
+NARRATIVE_SHAPE = '{"Comparison": [{"Point": string, "Conclusion": string}], "Recommendation": string}'
+
+
+class ProductProfile:
+    """What every comparison of a product needs, computed once per product: its summary,
+    price and concentration as numbers, and its skin types, ingredients and benefits with
+    lowercased sets for overlap tests. facts is the compact JSON a comparison prompt lists
+    for the product."""
+    __slots__ = ('name', 'summary', 'price', 'currency', 'concentration', 'lists', 'sets', 'facts')
+
+    def __init__(self, product):
+        self.name = product.get('name', '')
+        self.summary = create_summary(self.name, product.get('concentration', ''), product.get('skin_type', ()),
+                                      product.get('benefits', ()))
+        price = create_price(product.get('price', ''))
+        self.price, self.currency = price['value'], price['currency']
+        percent = _PERCENT.search(product.get('concentration', ''))
+        self.concentration = float(percent.group(1)) if percent else None
+        self.lists = {field: tuple(product.get(field, ())) for field in ('skin_type', 'ingredients', 'benefits')}
+        self.sets = {field: frozenset(item.lower() for item in items) for field, items in self.lists.items()}
+        # The summary already names the product and its skin types
+        facts = {'summary': self.summary, 'price': self.price, 'currency': self.currency,
+                 'concentration_percent': self.concentration, 'ingredients': self.lists['ingredients'],
+                 'benefits': self.lists['benefits']}
+        self.facts = json.dumps({field: list(value) if isinstance(value, tuple) else value
+                                 for field, value in facts.items() if value not in ("", (), None)},
+                                ensure_ascii=False, separators=(',', ':'))
+
+
+@functools.lru_cache(maxsize=MAX_PROFILES)
+def _cached_profile(product: Product) -> ProductProfile:
+    return ProductProfile(product)
+
+
+def profile(product) -> ProductProfile:
+    """Profile of a product, cached by content so a product compared N times is analysed once"""
+    if not isinstance(product, Product):
+        product = Product(**{field: product[field] for field in PRODUCT_FIELDS if field in product})
+    try:
+        return _cached_profile(product)
+    except TypeError:
+        # Unhashable field values (nested dicts) are profiled without the cache
+        return ProductProfile(product)
+
+
+def _numeric(value_a, value_b, larger: str) -> dict:
+    fact = {'a': value_a, 'b': value_b}
+    if value_a is not None and value_b is not None:
+        fact['difference'] = round(value_b - value_a, 2)
+        fact[larger] = 'same' if value_a == value_b else 'a' if value_a > value_b else 'b'
+    return fact
+
+
+def _overlap(profile_a: ProductProfile, profile_b: ProductProfile, field: str) -> dict:
+    set_a, set_b = profile_a.sets[field], profile_b.sets[field]
+    union = set_a | set_b
+    return {
+        'shared': [item for item in profile_a.lists[field] if item.lower() in set_b],
+        'only_a': [item for item in profile_a.lists[field] if item.lower() not in set_b],
+        'only_b': [item for item in profile_b.lists[field] if item.lower() not in set_a],
+        'overlap': round(len(set_a & set_b) / len(union), 2) if union else 1.0,
+    }
+
+
+def compare_profiles(profile_a: ProductProfile, profile_b: ProductProfile) -> dict:
+    """Deterministic differences of product a and b: price and concentration deltas (b - a)
+    and the shared and distinct skin types, ingredients and benefits with their overlap"""
+    price = _numeric(profile_a.price, profile_b.price, 'pricier')
+    if profile_a.currency != profile_b.currency:
+        # Prices in different currencies are listed but not subtracted
+        price = {'a': f"{profile_a.price} {profile_a.currency}", 'b': f"{profile_b.price} {profile_b.currency}"}
+    return {
+        'price': price,
+        'concentration_percent': _numeric(profile_a.concentration, profile_b.concentration, 'stronger'),
+        'skin_type': _overlap(profile_a, profile_b, 'skin_type'),
+        'ingredients': _overlap(profile_a, profile_b, 'ingredients'),
+        'benefits': _overlap(profile_a, profile_b, 'benefits'),
+    }
+
+
+# Comparison Matrix Agent - comparisons of many pairs with shared per-product analysis
+class ComparisonMatrixAgent:
+    """Comparison Matrix Agent: compares many product pairs at once.
+
+    Each product is profiled once (summary, numeric price and concentration, item sets) and
+    each pair's differences are computed locally. The LLM only writes the comparison points
+    and recommendation, for several pairs per request: every product appears once per
+    request as its profile facts and every pair as its precomputed differences. This saves the
+    re-read product descriptions and the per-request overhead, but each pair still costs its
+    differences in the prompt and its narrative in the answer, so token volume stays
+    proportional to the number of pairs; only the number of requests shrinks.
+    """
+
+    # State keys a single comparison consumes and produces (for incremental mode)
+    READS = ('product_a', 'product_b')
+    WRITES = ('comparison',)
+
+    # Bump whenever the prompt template changes so cached responses are not reused
+    PROMPT_VERSION = "2"
+
+    # Scheduler queue position of this agent's requests (lower is served first)
+    PRIORITY = PRIORITY_COMPARISON
+
+    # Expected completion tokens per pair (3 points and a recommendation) and request rounds
+    NARRATIVE_OUTPUT_TOKENS = 300
+    MAX_BATCH_ATTEMPTS = 3
+
+    def build_batch_prompt(self, pool: list, batch: dict, facts: dict) -> str:
+        """Narrative prompt for the pairs of batch ({comparison id: (pool index a, pool index b)});
+        products are listed once as P1, P2, ... by their profile facts and each pair by its differences"""
+        product_ids = {}
+        for pair in batch.values():
+            for index in pair:
+                product_ids.setdefault(index, f"P{len(product_ids) + 1}")
+        products = "\n".join(f"{product_id}: {profile(pool[index]).facts}"
+                             for index, product_id in product_ids.items())
+        comparisons = "\n".join(
+            f"{comparison_id}: a={product_ids[index_a]} b={product_ids[index_b]} "
+            f"{json.dumps(facts[comparison_id], ensure_ascii=False, separators=(',', ':'))}"
+            for comparison_id, (index_a, index_b) in batch.items()
+        )
+        ids = ", ".join(f'"{comparison_id}"' for comparison_id in batch)
+        return f"""You are an expert product reviewer. Each comparison below names its products a and b and gives \
+their differences, already computed from the product data. Use ONLY that data; do not assume anything.
+Products (summary, price, concentration, ingredients, benefits):
+{products}
+Comparisons:
+{comparisons}
+For EACH comparison write 3 points of difference, each with its conclusion, and which product to recommend \
+to which user (under 100 words).
+Reply with JSON only, without ``` fences: one object with exactly the keys {ids}, each mapping to {NARRATIVE_SHAPE}"""
+
+    def _prompt_cost(self, pool: list, comparison_id: str, pair: tuple, facts: dict, listed: set) -> int:
+        """Estimated prompt tokens a pair adds to a request that already lists the products in listed"""
+        line = f"{comparison_id}: a=P1 b=P2 {json.dumps(facts[comparison_id], ensure_ascii=False)}, \"{comparison_id}\""
+        return llm.estimate_tokens(line) + sum(llm.estimate_tokens(f"P1: {profile(pool[index]).facts}")
+                                               for index in set(pair) - listed)
+
+    def pack(self, pool: list, pairs: dict, facts: dict, token_budget: int) -> list:
+        """Split {comparison id: (pool index a, pool index b)} into request groups whose estimated
+        prompt and answer tokens fit token_budget, and whose prompt fits the per-call prompt budget.
+        Pairs sharing a first product are packed together so it is listed once; a pair larger
+        than either budget still gets a request of its own."""
+        prompt_budget = get_prompt_budget()
+        base = llm.estimate_tokens(self.build_batch_prompt(pool, {}, {}))
+        batches, current, listed, used, prompt_used = [], {}, set(), base, base
+        for comparison_id, pair in sorted(pairs.items(), key=lambda item: item[1]):
+            prompt_cost = self._prompt_cost(pool, comparison_id, pair, facts, listed)
+            if current and (used + prompt_cost + self.NARRATIVE_OUTPUT_TOKENS > token_budget
+                            or not prompt_budget.fits(prompt_used + prompt_cost)):
+                batches.append(current)
+                current, listed, used, prompt_used = {}, set(), base, base
+                prompt_cost = self._prompt_cost(pool, comparison_id, pair, facts, listed)
+            current[comparison_id] = pair
+            listed.update(pair)
+            used += prompt_cost + self.NARRATIVE_OUTPUT_TOKENS
+            prompt_used += prompt_cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def split_response(self, content: str, batch: dict) -> dict:
+        """Valid per-pair narratives of a batched response; pairs whose section is missing or
+        unusable are left out"""
+        data, _ = load_object(content)
+        if data is None:
+            return {}
+        sections = {}
+        for comparison_id in batch:
+            section, broken = NARRATIVE_SCHEMA.check(data.get(comparison_id))
+            if not broken:
+                sections[comparison_id] = section
+        return sections
+
+    def page(self, product_a, product_b, narrative: dict) -> dict:
+        """Comparison page in the ComparisonAgent shape: both summaries keyed by product name and the narrative"""
+        profile_a, profile_b = profile(product_a), profile(product_b)
+        return {
+            profile_a.name: profile_a.summary,
+            profile_b.name: profile_b.summary,
+            'Comparison': narrative['Comparison'],
+            'Recommendation': narrative['Recommendation'],
+        }
+
+    def _batch_prompt(self, pool: list, batch: dict, facts: dict) -> str:
+        return get_prompt_budget().admit(self.build_batch_prompt(pool, batch, facts), 'comparison_batch')
+
+    def _settle(self, pool: list, batch: dict, facts: dict, content: str) -> dict:
+        sections = self.split_response(content, batch)
+        if len(sections) < len(batch):
+            # Do not let the cache replay the broken answer on the retry or the next run
+            llm.forget(self.build_batch_prompt(pool, batch, facts), self.PROMPT_VERSION)
+            logger.warning(f"Batched comparison response unusable for {len(batch) - len(sections)} "
+                           f"of {len(batch)} pairs")
+        return sections
+
+    def _request(self, pool: list, batch: dict, facts: dict) -> dict:
+        try:
+            response = llm.invoke(self._batch_prompt(pool, batch, facts), self.PROMPT_VERSION,
+                                  priority=self.PRIORITY)
+            return self._settle(pool, batch, facts, response.content)
+        except Exception as e:
+            logger.error(f"Error generating batched comparisons: {e}")
+            return {}
+
+    async def _arequest(self, pool: list, batch: dict, facts: dict) -> dict:
+        try:
+            response = await llm.ainvoke(self._batch_prompt(pool, batch, facts), self.PROMPT_VERSION,
+                                         priority=self.PRIORITY)
+            return self._settle(pool, batch, facts, response.content)
+        except Exception as e:
+            logger.error(f"Error generating batched comparisons: {e}")
+            return {}
+
+    def differences(self, pool: list, pairs: dict) -> dict:
+        """{comparison id: deterministic differences} of {comparison id: (pool index a, pool index b)}"""
+        return {comparison_id: compare_profiles(profile(pool[index_a]), profile(pool[index_b]))
+                for comparison_id, (index_a, index_b) in pairs.items()}
+
+    def _pages(self, pool: list, pairs: dict, narratives: dict) -> dict:
+        return {comparison_id: self.page(pool[pairs[comparison_id][0]], pool[pairs[comparison_id][1]], narrative)
+                for comparison_id, narrative in narratives.items()}
+
+    def compare_many(self, pool: list, pairs: dict, token_budget: int, max_workers: int = 8) -> tuple[dict, dict]:
+        """Comparison pages of {comparison id: (pool index a, pool index b)} with as few requests
+        as token_budget allows, sent up to max_workers at a time.
+
+        Returns ({comparison id: page}, {comparison id: error}); only pairs whose section failed
+        are packed again for the next attempt.
+        """
+        if not llm.is_available():
+            logger.warning("MISTRAL_API_KEY not set. Skipping batched comparisons.")
+            return {}, {}
+        facts = self.differences(pool, pairs)
+        narratives, pending, requests = {}, dict(pairs), 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for attempt in range(self.MAX_BATCH_ATTEMPTS):
+                batches = self.pack(pool, pending, facts, token_budget)
+                requests += len(batches)
+                for sections in executor.map(lambda batch: self._request(pool, batch, facts), batches):
+                    narratives.update(sections)
+                pending = {key: pair for key, pair in pending.items() if key not in narratives}
+                if not pending:
+                    break
+        return self._finish(pool, pairs, narratives, pending, requests)
+
+    async def acompare_many(self, pool: list, pairs: dict, token_budget: int) -> tuple[dict, dict]:
+        """Async variant of compare_many; the requests of one attempt run concurrently"""
+        if not llm.is_available():
+            logger.warning("MISTRAL_API_KEY not set. Skipping batched comparisons.")
+            return {}, {}
+        facts = self.differences(pool, pairs)
+        narratives, pending, requests = {}, dict(pairs), 0
+        for attempt in range(self.MAX_BATCH_ATTEMPTS):
+            batches = self.pack(pool, pending, facts, token_budget)
+            requests += len(batches)
+            for sections in await asyncio.gather(*(self._arequest(pool, batch, facts) for batch in batches)):
+                narratives.update(sections)
+            pending = {key: pair for key, pair in pending.items() if key not in narratives}
+            if not pending:
+                break
+        return self._finish(pool, pairs, narratives, pending, requests)
+
+    def _finish(self, pool, pairs, narratives, pending, requests) -> tuple[dict, dict]:
+        logger.info(f"Comparison matrix: {len(narratives)} of {len(pairs)} pairs compared in {requests} requests")
+        if pending:
+            logger.warning(f"Batched comparison failed for {len(pending)} pairs after "
+                           f"{self.MAX_BATCH_ATTEMPTS} attempts")
+        errors = {comparison_id: "Batched comparison response missing or invalid" for comparison_id in pending}
+        return self._pages(pool, pairs, narratives), errors
@@ -1,77 +1,186 @@
+import re
 import logging
+from operator import attrgetter
+from agents.parser import Product
 
 logger = logging.getLogger()
 
+# Precompiled tables shared by the per-product and columnar paths
+_USAGE_SEPARATORS = re.compile(r"[.•]")
+_LOW_SEVERITY = re.compile(r"tingling|mild")
+_HIGH_SEVERITY = re.compile(r"rash|burn")
+_DIGITS = re.compile(r"\d+")
+_CURRENCY = re.compile(r"₹|\$|€|£|\b(?:INR|USD|EUR|GBP|Rs)\b")
+_CURRENCY_CODES = {"₹": "INR", "Rs": "INR", "INR": "INR", "$": "USD", "USD": "USD",
+                   "€": "EUR", "EUR": "EUR", "£": "GBP", "GBP": "GBP"}
+DEFAULT_CURRENCY = "INR"
+
+# Product fields used by the content blocks, i.e. the columns of a columnar batch
+CONTENT_FIELDS = ('name', 'concentration', 'skin_type', 'ingredients', 'use', 'benefits', 'price', 'side_effects')
+_FIELD_DEFAULTS = {'skin_type': [], 'ingredients': [], 'benefits': []}
+_content_values = attrgetter(*CONTENT_FIELDS)
+
+
+# Function to create summary block for the product
+def create_summary(name, conc, skin_types, benefits) -> str:
+    main_benefit = benefits[0] if benefits else ""
+    return f"{name} with {conc} is suitable for {', '.join(skin_types).lower()} skin and helps with {main_benefit.lower()}."
+
+# Function to create benefits block for the product
+def create_benefits(benefits) -> list:
+    return [
+        {
+            "benefit": b,
+            "explanation": f"This product supports {b.lower()} based on the provided product details."
+        }
+        for b in benefits
+    ]
+
+# Function to create usage block for the product
+def create_usage(raw) -> list:
+    steps = [s.strip() for s in _USAGE_SEPARATORS.split(raw)]
+    return [{"step_number": i + 1, "instruction": step} for i, step in enumerate(s for s in steps if s)]
+
+# Function to create ingredients block for the product
+def create_ingredients(ingredients) -> list:
+    return [{"ingredient": ing} for ing in ingredients]
+
+# Function to classify side-effects severity
+def side_effect_severity(text) -> str:
+    lowered = text.lower()
+    return "low" if _LOW_SEVERITY.search(lowered) else "high" if _HIGH_SEVERITY.search(lowered) else "medium"
+
+# Function to create price block for the product
+def create_price(price_str) -> dict:
+    digits = "".join(_DIGITS.findall(price_str))
+    currency = _CURRENCY.search(price_str)
+    return {
+        "value": int(digits) if digits else None,
+        "currency": _CURRENCY_CODES[currency.group()] if currency else DEFAULT_CURRENCY,
+    }
+
+
+def to_columns(products: list) -> dict:
+    """Column-oriented view (field -> list of values) of a list of Product records or product dicts"""
+    if products and all(type(product) is Product for product in products):
+        # Slot reads in C, one tuple per product, transposed by zip
+        return dict(zip(CONTENT_FIELDS, map(list, zip(*map(_content_values, products)))))
+    try:
+        # Parsed products always carry every field
+        return {field: [product[field] for product in products] for field in CONTENT_FIELDS}
+    except KeyError:
+        return {
+            field: [product.get(field, _FIELD_DEFAULTS.get(field, '')) for product in products]
+            for field in CONTENT_FIELDS
+        }
+
+
 # Content Block Node
 class ContentBlockAgent:
     """Content Block Agent: Generates structured content blocks for a product"""
-    
+
+    # State keys this agent consumes and produces
+    READS = ('product_a',)
+    WRITES = ('content_a',)
+
+    def build(self, product) -> dict:
+        """All content blocks of one product"""
+        return {
+            "summary_block": create_summary(product.get('name', ''), product.get('concentration', ''),
+                                            product.get('skin_type', []), product.get('benefits', [])),
+            "benefits_block": create_benefits(product.get('benefits', [])),
+            "usage_block": create_usage(product.get('use', '')),
+            "ingredients_block": create_ingredients(product.get('ingredients', [])),
+            "side_effects_block": {"description": product.get('side_effects', ''),
+                                   "severity": side_effect_severity(product.get('side_effects', ''))},
+            "price_block": create_price(product.get('price', '')),
+        }
+
+    def build_batch(self, columns: dict) -> list:
+        """Content blocks for a whole columnar batch in one pass per block type.
+
+        Produces exactly what build() returns for each product. Values that repeat across a
+        catalog (usage texts, side-effect texts, prices, benefit names, skin type lists) are
+        parsed or formatted once per distinct value; every product still gets its own dicts.
+        """
+        usage_steps = {}
+        for raw in columns['use']:
+            if raw not in usage_steps:
+                usage_steps[raw] = [step for step in (s.strip() for s in _USAGE_SEPARATORS.split(raw)) if step]
+        severities = {}
+        for text in columns['side_effects']:
+            if text not in severities:
+                severities[text] = side_effect_severity(text)
+        prices = {}
+        for price_str in columns['price']:
+            if price_str not in prices:
+                prices[price_str] = create_price(price_str)
+        explanations = {}
+        for benefits in columns['benefits']:
+            for b in benefits:
+                if b not in explanations:
+                    explanations[b] = f"This product supports {b.lower()} based on the provided product details."
+        skin_phrases = {}
+        for skin_types in columns['skin_type']:
+            key = tuple(skin_types)
+            if key not in skin_phrases:
+                skin_phrases[key] = ", ".join(skin_types).lower()
+
+        # One column per block, then stitch the columns into per-product dicts
+        summaries = [
+            f"{name} with {conc} is suitable for {skin_phrases[tuple(skin_types)]} skin "
+            f"and helps with {benefits[0].lower() if benefits else ''}."
+            for name, conc, skin_types, benefits in
+            zip(columns['name'], columns['concentration'], columns['skin_type'], columns['benefits'])
+        ]
+        benefit_blocks = [[{"benefit": b, "explanation": explanations[b]} for b in benefits]
+                          for benefits in columns['benefits']]
+        usage_blocks = [[{"step_number": i, "instruction": step} for i, step in enumerate(usage_steps[use], 1)]
+                        for use in columns['use']]
+        ingredient_blocks = [[{"ingredient": ing} for ing in ingredients] for ingredients in columns['ingredients']]
+        side_effect_blocks = [{"description": text, "severity": severities[text]} for text in columns['side_effects']]
+        price_blocks = [dict(prices[price_str]) for price_str in columns['price']]
+
+        return [
+            {
+                "summary_block": summary,
+                "benefits_block": benefits_block,
+                "usage_block": usage_block,
+                "ingredients_block": ingredients_block,
+                "side_effects_block": side_effects_block,
+                "price_block": price_block,
+            }
+            for summary, benefits_block, usage_block, ingredients_block, side_effects_block, price_block in
+            zip(summaries, benefit_blocks, usage_blocks, ingredient_blocks, side_effect_blocks, price_blocks)
+        ]
+
     def run(self, state):
         """LangGraph Node: Generate content blocks for Product A"""
         logger.info("Content Block Node loaded successfully")
-        
+
         try:
             product = state.get('product_a', {})
-            
-            # Function to create summary block for the product
-            def create_summary() -> str:
-                name = product.get('name', '')
-                conc = product.get('concentration', '')
-                skins = ", ".join(product.get('skin_type', []))
-                benefits = product.get('benefits', [])
-                main_benefit = benefits[0] if benefits else ""
-                return f"{name} with {conc} is suitable for {skins.lower()} skin and helps with {main_benefit.lower()}."
-            
-            # Function to create benefits block for the product
-            def create_benefits() -> list:
-                return [
-                    {
-                        "benefit": b,
-                        "explanation": f"This product supports {b.lower()} based on the provided product details."
-                    }
-                    for b in product.get('benefits', [])
-                ]
-            
-            # Function to create usage block for the product
-            def create_usage() -> list:
-                raw = product.get('use', '')
-                steps = [s.strip() for s in raw.replace("•", ".").split(".") if s.strip()]
-                return [{"step_number": i+1, "instruction": step} for i, step in enumerate(steps)]
-            
-            # Function to create ingredients block for the product
-            def create_ingredients() -> list:
-                return [{"ingredient": ing} for ing in product.get('ingredients', [])]
-            
-            # Function to create side-effects block for the product
-            def create_side_effects() -> dict:
-                text = product.get('side_effects', '')
-                severity = "low" if any(word in text.lower() for word in ["tingling", "mild"]) else \
-                          "high" if any(word in text.lower() for word in ["rash", "burn"]) else "medium"
-                return {"description": text, "severity": severity}
-            
-            # Function to create price block for the product
-            def create_price() -> dict:
-                price_str = product.get('price', '')
-                digits = "".join(ch for ch in price_str if ch.isdigit())
-                value = int(digits) if digits else None
-                return {"value": value, "currency": "INR"}
-            
-            content_blocks = {
-                "summary_block": create_summary(),
-                "benefits_block": create_benefits(),
-                "usage_block": create_usage(),
-                "ingredients_block": create_ingredients(),
-                "side_effects_block": create_side_effects(),
-                "price_block": create_price(),
-            }
-            
-            state['content_a'] = content_blocks
+
+            content = self.build(product)
             logger.info("Content blocks generated successfully")
-            return state
-        
+            return {'content_a': content}
+
         except Exception as e:
             error_msg = f"Error generating content blocks: {e}"
             logger.error(error_msg)
-            state['error'] = error_msg
-            state['content_a'] = {}
-            return state
\ No newline at end of file
+            return {'error': error_msg, 'content_a': {}}
+
+    def run_batch(self, state):
+        """LangGraph Node: Generate content blocks for every parsed product of a batch window"""
+        logger.info("Content Block Node for catalog loaded successfully")
+
+        try:
+            products = state.get('products', [])
+            contents = self.build_batch(to_columns(products))
+            logger.info(f"Content blocks generated for {len(products)} products")
+            return {'contents': contents}
+
+        except Exception as e:
+            error_msg = f"Error generating content blocks for catalog: {e}"
+            logger.error(error_msg)
+            return {'contents': [], 'errors': [{'key': 'catalog', 'error': error_msg}]}
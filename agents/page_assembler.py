@@ -7,6 +7,10 @@ logger = logging.getLogger()
 class PageAssemblerAgent:
     """Page Assembler Agent: Assembles product page from product, content, and FAQ data"""
     
+    # State keys this agent consumes and produces
+    READS = ('product_a', 'content_a', 'faq_a')
+    WRITES = ('product_page',)
+    
     def run(self, state):
         """LangGraph Node: Assemble product page from product, content, and FAQ"""
         logger.info("Page Assemble Node loaded successfully")
@@ -34,13 +38,10 @@ class PageAssemblerAgent:
             product_page.update(content_block)
             product_page.update(faqs)
             
-            state['product_page'] = product_page
             logger.info("Product page assembled successfully")
-            return state
+            return {'product_page': product_page}
         
         except Exception as e:
             error_msg = f"Error assembling product page: {e}"
             logger.error(error_msg)
-            state['error'] = error_msg
-            state['product_page'] = {}
-            return state
\ No newline at end of file
+            return {'error': error_msg, 'product_page': {}}
\ No newline at end of file
@@ -1,26 +1,124 @@
+import sys
 import logging
+from collections.abc import Mapping
 
 logger = logging.getLogger()
 
-class Product:
-    """Template class for product's json"""
-    def __init__(self, name="", concentration="", skin_type=None, ingredients=None, 
+# Product fields, in template order
+PRODUCT_FIELDS = ('name', 'concentration', 'skin_type', 'ingredients', 'use', 'benefits', 'price', 'side_effects')
+_LIST_FIELDS = frozenset({'skin_type', 'ingredients', 'benefits'})
+
+# Distinct string lists seen so far, so products with the same skin types, ingredients or
+# benefits share one tuple; cleared when it grows past the limit
+_shared_lists = {}
+MAX_SHARED_LISTS = 100_000
+
+
+def _share(value):
+    """Interned string, or a shared tuple of interned strings for a list; other values as they are"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if not isinstance(value, (list, tuple)):
+        return value
+    items = tuple(sys.intern(item) if isinstance(item, str) else item for item in value)
+    try:
+        shared = _shared_lists.get(items)
+    except TypeError:
+        # Unhashable entries (nested dicts) are kept unshared
+        return items
+    if shared is None:
+        if len(_shared_lists) >= MAX_SHARED_LISTS:
+            _shared_lists.clear()
+        shared = _shared_lists[items] = items
+    return shared
+
+
+class Product(Mapping):
+    """Compact, immutable product record.
+
+    Fields live in __slots__ and repeated values (skin types, ingredients, benefits, usage and
+    side-effect texts, prices) are interned and shared between products; list fields are stored
+    as tuples. The record reads like the product dict it replaces (product['name'], get, keys).
+    """
+    __slots__ = PRODUCT_FIELDS
+
+    def __init__(self, name="", concentration="", skin_type=None, ingredients=None,
                  use="", benefits=None, price="", side_effects=""):
-        try:
-            self.name = name
-            self.concentration = concentration
-            self.skin_type = skin_type if skin_type is not None else []
-            self.ingredients = ingredients if ingredients is not None else []
-            self.use = use
-            self.benefits = benefits if benefits is not None else []
-            self.price = price
-            self.side_effects = side_effects
-        except Exception as e:
-            logger.error(f"Error initializing Product: {e}")
+        init = object.__setattr__
+        init(self, 'name', name)
+        init(self, 'concentration', _share(concentration))
+        init(self, 'skin_type', _share(skin_type if skin_type is not None else ()))
+        init(self, 'ingredients', _share(ingredients if ingredients is not None else ()))
+        init(self, 'use', _share(use))
+        init(self, 'benefits', _share(benefits if benefits is not None else ()))
+        init(self, 'price', _share(price))
+        init(self, 'side_effects', _share(side_effects))
+
+    def __setattr__(self, field, value):
+        raise AttributeError("Product is immutable")
+
+    def __delattr__(self, field):
+        raise AttributeError("Product is immutable")
+
+    def __getitem__(self, field):
+        if field not in PRODUCT_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in PRODUCT_FIELDS else default
+
+    def __iter__(self):
+        return iter(PRODUCT_FIELDS)
+
+    def __len__(self):
+        return len(PRODUCT_FIELDS)
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, field) for field in PRODUCT_FIELDS))
+
+    def __reduce__(self):
+        # Rebuilt through __init__, so values are shared again in the receiving process
+        return Product, tuple(getattr(self, field) for field in PRODUCT_FIELDS)
+
+    def __repr__(self):
+        return f"Product(name={self.name!r})"
+
+    def as_dict(self) -> dict:
+        """Plain dict with lists, exactly as the parser used to store products (prompts, JSON)"""
+        return {field: list(value) if field in _LIST_FIELDS and isinstance(value, tuple) else value
+                for field, value in ((field, getattr(self, field)) for field in PRODUCT_FIELDS)}
+
+
+def is_product_entry(entry) -> bool:
+    """Whether a raw catalog entry can be parsed: a JSON object (fields may still be missing)"""
+    return isinstance(entry, Mapping)
+
+
+def plain_product(product) -> dict:
+    """Plain dict of a Product record or of an already plain product dict"""
+    return product.as_dict() if isinstance(product, Product) else product
+
 
 # Parser Node Function
 class ParserAgent:
-    """Parser Agent: Converts raw JSON product data to structured Product objects"""
+    """Parser Agent: Converts raw JSON product data to structured Product objects.
+    Nodes return only the keys they produce."""
+    
+    def parse(self, product_dict) -> Product:
+        """Map one raw template entry onto a Product"""
+        if not is_product_entry(product_dict):
+            raise TypeError(f"expected a JSON object, got {type(product_dict).__name__}")
+        return Product(
+            name=product_dict.get("product_name", ""),
+            concentration=product_dict.get("concentration", ""),
+            skin_type=product_dict.get("skin_type", []),
+            ingredients=product_dict.get("key_ingredients", []),
+            use=product_dict.get("how_to_use", ""),
+            benefits=product_dict.get("benefits", []),
+            price=product_dict.get("price", ""),
+            side_effects=product_dict.get("side_effects", "")
+        )
     
     def run_product_a(self, state):
         """LangGraph Node: Parse Product A from template"""
@@ -31,28 +129,15 @@ class ParserAgent:
             if len(template) < 1:
                 raise ValueError("Template must contain at least 1 product for Product A")
             
-            product_dict = template[0]
-            
-            product = Product(
-                name=product_dict.get("product_name", ""),
-                concentration=product_dict.get("concentration", ""),
-                skin_type=product_dict.get("skin_type", []),
-                ingredients=product_dict.get("key_ingredients", []),
-                use=product_dict.get("how_to_use", ""),
-                benefits=product_dict.get("benefits", []),
-                price=product_dict.get("price", ""),
-                side_effects=product_dict.get("side_effects", "")
-            )
+            product = self.parse(template[0])
             
-            state['product_a'] = product.__dict__
             logger.info(f"Product A parsed: {product.name}")
-            return state
+            return {'product_a': product}
         
         except Exception as e:
             error_msg = f"Error parsing Product A: {e}"
             logger.error(error_msg)
-            state['error'] = error_msg
-            return state
+            return {'error': error_msg}
 
     def run_product_b(self, state):
         """LangGraph Node: Parse Product B from template"""
@@ -63,25 +148,34 @@ class ParserAgent:
             if len(template) < 2:
                 raise ValueError("Template must contain at least 2 products for Product B")
             
-            product_dict = template[1]
+            product = self.parse(template[1])
             
-            product = Product(
-                name=product_dict.get("product_name", ""),
-                concentration=product_dict.get("concentration", ""),
-                skin_type=product_dict.get("skin_type", []),
-                ingredients=product_dict.get("key_ingredients", []),
-                use=product_dict.get("how_to_use", ""),
-                benefits=product_dict.get("benefits", []),
-                price=product_dict.get("price", ""),
-                side_effects=product_dict.get("side_effects", "")
-            )
-            
-            state['product_b'] = product.__dict__
             logger.info(f"Product B parsed: {product.name}")
-            return state
+            return {'product_b': product}
         
         except Exception as e:
             error_msg = f"Error parsing Product B: {e}"
             logger.error(error_msg)
-            state['error'] = error_msg
-            return state
+            return {'error': error_msg}
+
+    def run_catalog(self, state):
+        """LangGraph Node: Parse every product of a batch catalog, one entry at a time.
+
+        An entry that fails is reported under its key (state['keys'], else entry-<index>) and
+        left out; the other products are kept.
+        """
+        logger.info("Parser Node for catalog loaded successfully")
+
+        catalog = state.get('catalog', [])
+        keys = state.get('keys') or [f"entry-{index}" for index in range(len(catalog))]
+        products, errors = [], []
+        for key, raw in zip(keys, catalog):
+            try:
+                products.append(self.parse(raw))
+            except Exception as e:
+                error_msg = f"Error parsing catalog entry {key}: {e}"
+                logger.error(error_msg)
+                errors.append({'key': key, 'error': error_msg})
+
+        logger.info(f"Catalog parsed: {len(products)} products, {len(errors)} errors")
+        return {'products': products, 'errors': errors}
@@ -1,68 +1,214 @@
-import os
-import json
+import asyncio
 import logging
-from langchain_mistralai import ChatMistralAI
-from langchain_core.messages import HumanMessage
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import llm
+from pipeline.prompts import compact_product, get_prompt_budget
+from pipeline.responses import FAQ_SCHEMA, load_object, resolve, aresolve
+from pipeline.scheduler import PRIORITY_FAQ
 
-load_dotenv()
 logger = logging.getLogger()
 
+# Answer shape of one product's FAQ, shared by the single and batched prompts
+FAQ_SHAPE = '{"FAQs": [{"Id": integer, "Question": string, "Answer": string}]}'
+
 # FAQ Generation Node 
 class QuestionGenerationAgent:
     """FAQ Generation Agent: Generates FAQs using LangChain + Mistral AI"""
     
+    # State keys this agent consumes and produces
+    READS = ('product_a',)
+    WRITES = ('faq_a',)
+    
+    # Bump whenever the prompt template changes so cached responses are not reused
+    PROMPT_VERSION = "2"
+    
+    # Scheduler queue position of this agent's requests (lower is served first)
+    PRIORITY = PRIORITY_FAQ
+    
+    # Batched mode: expected completion tokens per product (15 Q&A pairs) and request rounds
+    FAQ_OUTPUT_TOKENS = 1200
+    MAX_BATCH_ATTEMPTS = 3
+    
+    def build_prompt(self, product) -> str:
+        """FAQ prompt for one product"""
+        return f"""Create 15 FAQ question and answer pairs for the product below, using ONLY its data: \
+no outside facts, no invented benefits or ingredients. Keep answers factual and grounded.
+Product: {compact_product(product)}
+Reply with JSON only, without ``` fences: {FAQ_SHAPE}"""
+
+    def build_batch_prompt(self, products: dict) -> str:
+        """FAQ prompt for several products ({product id: product}), answered as one JSON object keyed by id"""
+        sections = "\n".join(f"{product_id}: {compact_product(product)}" for product_id, product in products.items())
+        ids = ", ".join(f'"{product_id}"' for product_id in products)
+        return f"""Create 15 FAQ question and answer pairs for EACH product below, using ONLY that product's data: \
+no outside facts, no mixing of facts between products, no invented benefits or ingredients. \
+Keep answers factual and grounded.
+{sections}
+Reply with JSON only, without ``` fences: one object with exactly the keys {ids}, each mapping to {FAQ_SHAPE}"""
+
+    def pack(self, products: dict, token_budget: int) -> list:
+        """Split {product id: product} into request groups whose estimated prompt and answer
+        tokens fit token_budget, and whose prompt fits the per-call prompt budget; a product
+        larger than either still gets a request of its own"""
+        prompt_budget = get_prompt_budget()
+        base = llm.estimate_tokens(self.build_batch_prompt({}))
+        batches, current, used, prompt_used = [], {}, base, base
+        for product_id, product in products.items():
+            prompt_cost = llm.estimate_tokens(f"{product_id}: {compact_product(product)}, \"{product_id}\"")
+            cost = prompt_cost + self.FAQ_OUTPUT_TOKENS
+            if current and (used + cost > token_budget or not prompt_budget.fits(prompt_used + prompt_cost)):
+                batches.append(current)
+                current, used, prompt_used = {}, base, base
+            current[product_id] = product
+            used += cost
+            prompt_used += prompt_cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def split_response(self, content: str, batch: dict) -> dict:
+        """Valid per-product FAQ sections of a batched response (fences stripped, near-JSON and
+        section shapes repaired locally); products whose section is missing or unusable are left out"""
+        data, _ = load_object(content)
+        if data is None:
+            return {}
+        sections = {}
+        for product_id in batch:
+            section, broken = FAQ_SCHEMA.check(data.get(product_id))
+            if not broken:
+                sections[product_id] = section
+        return sections
+
+    def _settle(self, batch: dict, content: str) -> dict:
+        sections = self.split_response(content, batch)
+        if len(sections) < len(batch):
+            # Do not let the cache replay the broken answer on the retry or the next run
+            llm.forget(self.build_batch_prompt(batch), self.PROMPT_VERSION)
+            logger.warning(f"Batched FAQ response unusable for {len(batch) - len(sections)} of {len(batch)} products")
+        return sections
+
+    def _batch_prompt(self, batch: dict) -> str:
+        return get_prompt_budget().admit(self.build_batch_prompt(batch), 'faq_batch')
+
+    def _request(self, batch: dict) -> dict:
+        try:
+            response = llm.invoke(self._batch_prompt(batch), self.PROMPT_VERSION,
+                                  priority=self.PRIORITY)
+            return self._settle(batch, response.content)
+        except Exception as e:
+            logger.error(f"Error generating batched FAQ: {e}")
+            return {}
+
+    async def _arequest(self, batch: dict) -> dict:
+        try:
+            response = await llm.ainvoke(self._batch_prompt(batch), self.PROMPT_VERSION,
+                                         priority=self.PRIORITY)
+            return self._settle(batch, response.content)
+        except Exception as e:
+            logger.error(f"Error generating batched FAQ: {e}")
+            return {}
+
+    def generate_many(self, products: dict, token_budget: int, max_workers: int = 8) -> tuple[dict, dict]:
+        """FAQs for {product id: product} with as few requests as token_budget allows,
+        sent up to max_workers at a time.
+
+        Returns ({product id: faq}, {product id: error}); only products whose section failed
+        are packed again for the next attempt.
+        """
+        if not llm.is_available():
+            logger.warning("MISTRAL_API_KEY not set. Skipping batched FAQ generation.")
+            return {}, {}
+        faqs, pending = {}, dict(products)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for attempt in range(self.MAX_BATCH_ATTEMPTS):
+                for sections in executor.map(self._request, self.pack(pending, token_budget)):
+                    faqs.update(sections)
+                pending = {product_id: product for product_id, product in pending.items() if product_id not in faqs}
+                if not pending:
+                    break
+        return faqs, self._unresolved(pending)
+
+    async def agenerate_many(self, products: dict, token_budget: int) -> tuple[dict, dict]:
+        """Async variant of generate_many; the requests of one attempt run concurrently"""
+        if not llm.is_available():
+            logger.warning("MISTRAL_API_KEY not set. Skipping batched FAQ generation.")
+            return {}, {}
+        faqs, pending = {}, dict(products)
+        for attempt in range(self.MAX_BATCH_ATTEMPTS):
+            for sections in await asyncio.gather(*map(self._arequest, self.pack(pending, token_budget))):
+                faqs.update(sections)
+            pending = {product_id: product for product_id, product in pending.items() if product_id not in faqs}
+            if not pending:
+                break
+        return faqs, self._unresolved(pending)
+
+    def generate_each(self, products: dict, max_workers: int = 8) -> tuple[dict, dict]:
+        """FAQs for {product id: product} with one request per product, sent up to max_workers
+        at a time; returns ({product id: faq}, {product id: error}) like generate_many"""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            updates = executor.map(lambda product: self.run({'product_a': product}), products.values())
+            return self._collect(dict(zip(products, updates)))
+
+    async def agenerate_each(self, products: dict) -> tuple[dict, dict]:
+        """Async variant of generate_each; all requests run concurrently"""
+        updates = await asyncio.gather(*(self.arun({'product_a': product}) for product in products.values()))
+        return self._collect(dict(zip(products, updates)))
+
+    def _collect(self, updates: dict) -> tuple[dict, dict]:
+        faqs = {product_id: update['faq_a'] for product_id, update in updates.items() if update.get('faq_a')}
+        errors = {product_id: update['error'] for product_id, update in updates.items() if update.get('error')}
+        return faqs, errors
+
+    def _unresolved(self, pending: dict) -> dict:
+        if pending:
+            logger.warning(f"Batched FAQ failed for {len(pending)} products after {self.MAX_BATCH_ATTEMPTS} attempts")
+        return {product_id: "Batched FAQ response missing or invalid" for product_id in pending}
+
     def run(self, state):
         """LangGraph Node: Generate FAQ using LangChain + Mistral AI"""
         logger.info("FAQ Generation Node loaded successfully")
         
         try:
             product = state.get('product_a', {})
-            api_key = os.environ.get('MISTRAL_API_KEY')
-            
-            if not api_key:
-                logger.warning("MISTRAL_API_KEY not set. Skipping FAQ generation.")
-                state['faq_a'] = {}
-                return state
             
-            # Initialize LangChain ChatMistralAI
-            llm = ChatMistralAI(api_key=api_key, model="mistral-large-latest", temperature=0.4)
+            if not llm.is_available():
+                return self._skip()
             
-            prompt_text = f"""
-You are an AI FAQ Generator. You must create FAQs ONLY using the information
-from the product data below. You are NOT allowed to add external facts.
-
-STRICT RULES:
-- Use ONLY the information provided.
-- No outside knowledge.
-- No invented benefits or ingredients.
-- 15 Q&A pairs.
-- Keep answers factual, grounded.
-- Give a proper JSON output and do not include "```JSON" or "```" in the output.
-
-PRODUCT DATA:
-{json.dumps(product, indent=2)}
-
-Output Structure - 
-FAQs:
-    Id - "integer"
-    Question - "string"
-    Answer - "string"
-"""
+            prompt = get_prompt_budget().admit(self.build_prompt(product), 'faq')
+            response = llm.invoke(prompt, self.PROMPT_VERSION, priority=self.PRIORITY)
+            return self._store(resolve(response.content, FAQ_SCHEMA, prompt, self.PROMPT_VERSION, self.PRIORITY))
+        
+        except Exception as e:
+            return self._fail(e)
+    
+    async def arun(self, state):
+        """Async LangGraph Node: Generate FAQ on the shared event loop"""
+        logger.info("FAQ Generation Node loaded successfully")
+        
+        try:
+            product = state.get('product_a', {})
             
-            message = HumanMessage(content=prompt_text)
-            response = llm.invoke([message])
-            content = response.content
+            if not llm.is_available():
+                return self._skip()
             
-            faq_data = json.loads(content)
-            state['faq_a'] = faq_data
-            logger.info("FAQ generated successfully")
-            return state
+            prompt = get_prompt_budget().admit(self.build_prompt(product), 'faq')
+            response = await llm.ainvoke(prompt, self.PROMPT_VERSION, priority=self.PRIORITY)
+            return self._store(await aresolve(response.content, FAQ_SCHEMA, prompt, self.PROMPT_VERSION,
+                                              self.PRIORITY))
         
         except Exception as e:
-            error_msg = f"Error generating FAQ: {e}"
-            logger.error(error_msg)
-            logger.warning("Proceeding with empty FAQ.")
-            state['error'] = error_msg
-            state['faq_a'] = {}
-            return state
\ No newline at end of file
+            return self._fail(e)
+    
+    def _skip(self):
+        logger.warning("MISTRAL_API_KEY not set. Skipping FAQ generation.")
+        return {'faq_a': {}}
+    
+    def _store(self, faq_data):
+        logger.info("FAQ generated successfully")
+        return {'faq_a': faq_data}
+    
+    def _fail(self, e):
+        error_msg = f"Error generating FAQ: {e}"
+        logger.error(error_msg)
+        logger.warning("Proceeding with empty FAQ.")
+        return {'error': error_msg, 'faq_a': {}}
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""Content block throughput: per-product ContentBlockAgent.build vs the columnar build_batch.
+
+Both paths run over the catalog in windows of --window-size products, as the batch graph
+calls them. Also checks that both paths (and the original closure-based implementation)
+produce identical blocks, and exits non-zero if they diverge.
+
+    python -m benchmarks.content_blocks --products 200000
+"""
+import sys
+import time
+import argparse
+
+from agents.parser import ParserAgent
+from agents.content_block import ContentBlockAgent, to_columns
+from benchmarks.synthetic import make_catalog
+from pipeline.catalog import iter_windows
+
+# Currency markers in the order the reference looks for them
+LEGACY_CURRENCIES = (("₹", "INR"), ("Rs", "INR"), ("INR", "INR"), ("$", "USD"), ("USD", "USD"),
+                     ("€", "EUR"), ("EUR", "EUR"), ("£", "GBP"), ("GBP", "GBP"))
+
+
+def legacy_content_blocks(product: dict) -> dict:
+    """The pre-columnar ContentBlockAgent.run body, kept as the equivalence reference. The
+    original always reported INR; the currency is looked up by plain substring search here,
+    the one intended change of the price block."""
+    name = product.get('name', '')
+    conc = product.get('concentration', '')
+    skins = ", ".join(product.get('skin_type', []))
+    benefits = product.get('benefits', [])
+    main_benefit = benefits[0] if benefits else ""
+    raw = product.get('use', '')
+    steps = [s.strip() for s in raw.replace("•", ".").split(".") if s.strip()]
+    text = product.get('side_effects', '')
+    severity = "low" if any(word in text.lower() for word in ["tingling", "mild"]) else \
+        "high" if any(word in text.lower() for word in ["rash", "burn"]) else "medium"
+    price = product.get('price', '')
+    digits = "".join(ch for ch in price if ch.isdigit())
+    found = [(price.find(marker), code) for marker, code in LEGACY_CURRENCIES if marker in price]
+    currency = min(found)[1] if found else "INR"
+    return {
+        "summary_block": f"{name} with {conc} is suitable for {skins.lower()} skin and helps with {main_benefit.lower()}.",
+        "benefits_block": [
+            {"benefit": b, "explanation": f"This product supports {b.lower()} based on the provided product details."}
+            for b in benefits
+        ],
+        "usage_block": [{"step_number": i + 1, "instruction": step} for i, step in enumerate(steps)],
+        "ingredients_block": [{"ingredient": ing} for ing in product.get('ingredients', [])],
+        "side_effects_block": {"description": text, "severity": severity},
+        "price_block": {"value": int(digits) if digits else None, "currency": currency},
+    }
+
+
+def check_equivalence(products: list, per_product: list, batch: list) -> int:
+    """Number of products whose blocks differ between the paths"""
+    mismatches = 0
+    for product, single, batched in zip(products, per_product, batch):
+        if not (single == batched == legacy_content_blocks(product)):
+            mismatches += 1
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--window-size', type=int, default=64, help="Products per call (the CLI default window)")
+    args = parser.parse_args(argv)
+
+    parser_agent = ParserAgent()
+    products = [parser_agent.parse(raw) for raw in make_catalog(args.products)]
+    windows = list(iter_windows(products, args.window_size))
+    agent = ContentBlockAgent()
+
+    # Each window's blocks are dropped before the next one, as in a batch run
+    start = time.perf_counter()
+    for window in windows:
+        [agent.build(product) for product in window]
+    per_product_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for window in windows:
+        agent.build_batch(to_columns(window))
+    batch_seconds = time.perf_counter() - start
+
+    per_product = [agent.build(product) for product in products]
+    batch = [content for window in windows for content in agent.build_batch(to_columns(window))]
+    mismatches = check_equivalence(products, per_product, batch)
+    print(f"products:          {args.products} in windows of {args.window_size}")
+    print(f"per-product build: {args.products / per_product_seconds:,.0f} products/s")
+    print(f"columnar batch:    {args.products / batch_seconds:,.0f} products/s")
+    print(f"mismatches:        {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Deterministic local stand-in for ChatMistralAI, installed with pipeline.llm.set_llm_factory.
+
+Answers FAQ, batched FAQ, comparison and batched comparison prompts with canned JSON of realistic size after a
+latency drawn from a configurable distribution, and fails a configurable share of calls
+with 429 or 500 responses (raised like langchain_mistralai does, so the scheduler retries them).
+A share of answers can be made malformed the way real models get them wrong: fenced, with
+trailing chatter, and with comparisons missing their recommendation.
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+import httpx
+from langchain_core.messages import AIMessage
+
+from pipeline.llm import CHARS_PER_TOKEN
+
+_BATCH_IDS = re.compile(r'exactly the keys (.*?), each mapping')
+_QUOTED = re.compile(r'"([^"]+)"')
+_SUMMARY_KEYS = re.compile(r'^("(?:[^"\\]|\\.)*"): summary of Product ([AB])$', re.M)
+_REASK_KEYS = re.compile(r'^- ("(?:[^"\\]|\\.)*"): ', re.M)
+
+
+def parse_latency(spec: str):
+    """Latency sampler from 'fixed:S', 'uniform:LO,HI' or 'lognormal:MEDIAN,SIGMA' (seconds)"""
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',') if value]
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0.0, sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def canned_faq(count: int = 15) -> dict:
+    return {
+        "FAQs": [
+            {
+                "Id": number,
+                "Question": f"What does the product data say about point {number} of this product?",
+                "Answer": "According to the provided product details, this is answered only from the listed "
+                          "ingredients, benefits, usage and side effects, without outside facts.",
+            }
+            for number in range(1, count + 1)
+        ]
+    }
+
+
+def canned_narrative() -> dict:
+    return {
+        "Comparison": [
+            {"Point": f"Difference {number}", "Conclusion": "Conclusion drawn only from the computed differences."}
+            for number in range(1, 4)
+        ],
+        "Recommendation": "Choose according to skin type and the concentration each product lists.",
+    }
+
+
+def canned_comparison(name_a: str = "Product A", name_b: str = "Product B") -> dict:
+    return {
+        name_a: "Summary of the first product based strictly on its listed details.",
+        name_b: "Summary of the second product based strictly on its listed details.",
+        "Comparison": [
+            {"Point": f"Difference {number}", "Conclusion": "Conclusion drawn only from both products' data."}
+            for number in range(1, 4)
+        ],
+        "Recommendation": "Choose according to skin type and the concentration each product lists.",
+    }
+
+
+class FakeChatModel:
+    """Chat model with LangChain's invoke/ainvoke surface and no network access"""
+
+    def __init__(self, latency: str = "lognormal:0.8,0.4", error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = 7, malformed_rate: float = 0.0):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self) -> tuple[float, int | None, bool]:
+        """(latency, error status or None, malformed answer) for the next call, from the seeded generator"""
+        with self._lock:
+            self.calls += 1
+            latency = self.sample_latency(self._rng)
+            roll = self._rng.random()
+            malformed = self._rng.random() < self.malformed_rate
+        if roll < self.rate_limit_rate:
+            return latency, 429, malformed
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, 500, malformed
+        return latency, None, malformed
+
+    def _respond(self, messages, status: int | None, malformed: bool = False) -> AIMessage:
+        prompt = messages[-1].content
+        if status is not None:
+            request = httpx.Request("POST", "http://fake-mistral/v1/chat/completions")
+            response = httpx.Response(status, request=request, text='{"message": "fake failure"}')
+            raise httpx.HTTPStatusError(f"Error response {status} from fake model", request=request,
+                                        response=response)
+
+        batch = _BATCH_IDS.search(prompt)
+        if "previous reply" in prompt:
+            # A re-ask: just the keys it lists
+            keys = [json.loads(key) for key in _REASK_KEYS.findall(prompt)]
+            answer = {**canned_faq(), **canned_narrative()}
+            content = json.dumps({key: answer.get(key, f"Summary of {key} based strictly on its listed details.")
+                                  for key in keys})
+        elif batch and "Recommendation" in prompt:
+            content = json.dumps({pair_id: canned_narrative() for pair_id in _QUOTED.findall(batch.group(1))})
+        elif batch:
+            content = json.dumps({product_id: canned_faq() for product_id in _QUOTED.findall(batch.group(1))})
+        elif "FAQ" in prompt:
+            content = json.dumps(canned_faq())
+        else:
+            # Summaries are keyed by the product names the prompt asks for
+            names = {label: json.loads(name) for name, label in _SUMMARY_KEYS.findall(prompt)}
+            comparison = canned_comparison(names.get("A", "Product A"), names.get("B", "Product B"))
+            if malformed:
+                del comparison["Recommendation"]
+            content = json.dumps(comparison)
+        if malformed:
+            content = f"Here is the JSON you asked for:\n```json\n{content}\n```\nLet me know if you need more."
+        tokens_in = len(prompt) // CHARS_PER_TOKEN + 1
+        tokens_out = len(content) // CHARS_PER_TOKEN + 1
+        return AIMessage(content=content, usage_metadata={'input_tokens': tokens_in, 'output_tokens': tokens_out,
+                                                          'total_tokens': tokens_in + tokens_out})
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        latency, status, malformed = self._draw()
+        time.sleep(latency)
+        return self._respond(messages, status, malformed)
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        latency, status, malformed = self._draw()
+        await asyncio.sleep(latency)
+        return self._respond(messages, status, malformed)
+
+
+def fake_factory(latency: str = "lognormal:0.8,0.4", error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 seed: int = 7, malformed_rate: float = 0.0):
+    """pipeline.llm factory sharing one FakeChatModel (and its seeded draws) across models"""
+    model = FakeChatModel(latency, error_rate, rate_limit_rate, seed, malformed_rate)
+    return lambda model_name, temperature: model
@@ -0,0 +1,140 @@
+"""Startup cost: import time of the CLI and of each package, measured with python -X importtime.
+
+Each target is imported in a fresh interpreter --repeat times; the median cumulative import
+time, the heaviest direct imports and which heavy third-party packages got loaded are
+reported. Results are saved to --results-dir (benchmarks/results/import_time/, not tracked
+by git) and can be compared with an earlier run by the fastest import of each target, the
+least noisy figure. The exit status is 1 if a target got slower by more than --threshold or
+now loads a heavy package it did not load before (e.g. a lazy import became eager).
+
+    python -m benchmarks.import_time --compare latest
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+from benchmarks.pipeline_run import RESULTS_DIR, REPO_ROOT, save_results, load_baseline
+
+IMPORT_RESULTS_DIR = os.path.join(RESULTS_DIR, 'import_time')
+
+# Name -> modules imported together; 'main' is the CLI path, 'workers' what each worker process loads
+TARGETS = {
+    'main': ['main'],
+    'agents': ['agents.parser', 'agents.content_block', 'agents.page_assembler', 'agents.question_gen',
+               'agents.comparison'],
+    'workers': ['pipeline.workers'],
+    'batch': ['pipeline.batch'],
+    'service': ['pipeline.service'],
+}
+
+# Dependencies that should only load when a graph is built or an LLM call is made
+HEAVY_PACKAGES = ('langgraph', 'langchain_core', 'langchain_mistralai', 'httpx', 'dotenv')
+
+TOP_IMPORTS = 5
+# Smaller changes are within the run-to-run noise of a few fresh interpreters
+MIN_REGRESSION_MS = 10
+
+
+def parse_importtime(stderr: str) -> list:
+    """(depth, module, cumulative microseconds) of every import after interpreter startup"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if depth == 0 and name.strip() == 'site':
+            # Everything up to site is interpreter startup, not our imports
+            entries = []
+            continue
+        entries.append((depth, name.strip(), int(cumulative)))
+    return entries
+
+
+def measure_once(modules: list) -> dict:
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {', '.join(modules)}"],
+                               cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    entries = parse_importtime(completed.stderr)
+    loaded = {name.split('.')[0] for _, name, _ in entries}
+    direct = sorted(((name, us) for depth, name, us in entries if depth == 1), key=lambda item: -item[1])
+    return {
+        'total_us': sum(us for depth, _, us in entries if depth == 0),
+        'heavy': sorted(package for package in HEAVY_PACKAGES if package in loaded),
+        'top': [[name, round(us / 1000, 1)] for name, us in direct[:TOP_IMPORTS]],
+    }
+
+
+def measure(name: str, modules: list, repeat: int) -> dict:
+    runs = [measure_once(modules) for _ in range(repeat)]
+    totals = [run['total_us'] / 1000 for run in runs]
+    # The fastest run has the warmest file system cache; its breakdown is the least noisy
+    fastest = min(runs, key=lambda run: run['total_us'])
+    return {'target': name, 'modules': modules, 'median_ms': round(statistics.median(totals), 1),
+            'min_ms': round(min(totals), 1), 'heavy': fastest['heavy'], 'top': fastest['top']}
+
+
+def compare(results: list, baseline: list, threshold: float) -> list:
+    """Print per-target deltas against the baseline; returns the regressions found"""
+    previous = {result['target']: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result['target'])
+        if before is None:
+            print(f"  {result['target']}: no matching target in baseline")
+            continue
+        change = result['min_ms'] / before['min_ms'] - 1 if before['min_ms'] else 0.0
+        added = sorted(set(result['heavy']) - set(before['heavy']))
+        print(f"  {result['target']}: {before['min_ms']} -> {result['min_ms']} ms ({change:+.1%})"
+              f"{', now loads ' + ', '.join(added) if added else ''}")
+        if change > threshold and result['min_ms'] - before['min_ms'] > MIN_REGRESSION_MS:
+            regressions.append(f"{result['target']}: import time {change:+.1%}")
+        if added:
+            regressions.append(f"{result['target']}: now imports {', '.join(added)}")
+    return regressions
+
+
+def report(result: dict) -> None:
+    print(f"{result['target']}: median {result['median_ms']} ms (min {result['min_ms']} ms), "
+          f"heavy packages: {', '.join(result['heavy']) or 'none'}")
+    for name, ms in result['top']:
+        print(f"    {name}: {ms} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--targets', default=','.join(TARGETS), help="Comma-separated subset of " + ", ".join(TARGETS))
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument('--label', default='run', help="Name stored with the results")
+    parser.add_argument('--compare', help="Baseline results file, or 'latest' for the newest saved run")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Relative import time growth counted as a regression")
+    parser.add_argument('--results-dir', default=IMPORT_RESULTS_DIR,
+                        help="Directory the results are saved to and 'latest' is looked up in")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.targets.split(','):
+        result = measure(name, TARGETS[name], args.repeat)
+        report(result)
+        results.append(result)
+
+    path = save_results(results, args.label, args.results_dir)
+    print(f"Results saved: {path}")
+
+    if args.compare:
+        baseline = load_baseline(args.compare, path, args.results_dir)
+        if baseline is None:
+            print("No earlier results to compare with")
+            return 0
+        print(f"Compared with {baseline[0]}:")
+        regressions = compare(results, baseline[1], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Offline end-to-end pipeline benchmark against the local fake Mistral model.
+
+Each case runs in a fresh process over a synthetic catalog (or the two-product template graph
+in --mode single) and reports throughput, per-node latency percentiles, LLM calls, peak RSS
+and output bytes. Results are saved to --results-dir (benchmarks/results/, not tracked by git)
+and can be compared with an earlier run; the exit status is 1 if a case regressed by more
+than --threshold.
+
+    python -m benchmarks.pipeline_run --products 10,1000,10000 --async --compare latest
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Case settings that must match for two results to be compared
+CASE_KEYS = ('mode', 'products', 'use_async', 'pairs', 'faq_batch_tokens', 'compare_batch_tokens', 'concurrency',
+             'window_size', 'workers', 'output_format', 'latency', 'error_rate', 'rate_limit_rate', 'malformed_rate',
+             'variant_ratio', 'dedup')
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _run_single(case: dict, workdir: str) -> int:
+    import main
+    from pipeline import llm
+
+    shutil.copy(os.path.join(REPO_ROOT, 'template.json'), workdir)
+    compiled_graph = main.build_pipeline_graph(use_async=case['use_async']).compile()
+    initial_state = {'template': [], 'product_a': {}, 'product_b': {}, 'faq_a': {}, 'content_a': {},
+                     'product_page': {}, 'comparison': {}, 'error': None}
+    if case['use_async']:
+        llm.run(compiled_graph.ainvoke(initial_state))
+    else:
+        compiled_graph.invoke(initial_state)
+    return 2
+
+
+def _run_batch(case: dict, workdir: str) -> int:
+    from pipeline import llm
+    from pipeline.batch import run_batch, run_batch_async, ALL_PAIRS_IN_CATEGORY, ONE_VS_MANY_PREFIX
+    from pipeline.catalog import iter_products
+    from benchmarks.synthetic import write_catalog, make_catalog
+
+    variant_ratio = case.get('variant_ratio', 0.0)
+    catalog = write_catalog(os.path.join(workdir, 'catalog.jsonl'), case['products'], case['seed'], variant_ratio)
+    pairs_spec = None
+    if case['pairs'] == 'category':
+        pairs_spec = ALL_PAIRS_IN_CATEGORY
+    elif case['pairs'] == 'one-vs-many':
+        # The middle product, so the products read before it are retained until it arrives
+        anchor = make_catalog(case['products'], case['seed'], variant_ratio)[case['products'] // 2]['product_name']
+        pairs_spec = ONE_VS_MANY_PREFIX + anchor
+    options = (pairs_spec, 'category', case['concurrency'], None, case['window_size'], case['faq_batch_tokens'],
+               case.get('compare_batch_tokens', 0))
+    if case['use_async']:
+        llm.run(run_batch_async(iter_products(catalog), *options))
+    else:
+        run_batch(iter_products(catalog), *options)
+    return case['products']
+
+
+def run_case(case: dict) -> dict:
+    """Run one benchmark case in the current (fresh) process and return its metrics"""
+    sys.path.insert(0, REPO_ROOT)
+    from pipeline import llm
+    from pipeline.cache import configure_cache
+    from pipeline.outputs import configure_sink, close_sink
+    from pipeline.scheduler import configure_scheduler, get_scheduler
+    from pipeline.prompts import configure_prompt_budget
+    from pipeline.responses import response_stats
+    from pipeline.canonical import configure_dedup
+    from pipeline.tracing import configure_tracing
+    from pipeline.workers import configure_workers, shutdown_workers
+    from benchmarks.fake_llm import fake_factory
+
+    workdir = tempfile.mkdtemp(prefix='pipeline-bench-')
+    os.chdir(workdir)
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        llm.set_llm_factory(fake_factory(case['latency'], case['error_rate'], case['rate_limit_rate'], case['seed'],
+                                         case['malformed_rate']))
+        configure_cache(enabled=False)
+        sink = configure_sink(case['output_format'])
+        configure_scheduler()
+        prompt_budget = configure_prompt_budget()
+        tracer = configure_tracing(True)
+        configure_workers(case['workers'] if case['mode'] == 'batch' else 0, case['window_size'])
+        dedup = configure_dedup(case.get('dedup', False) and case['mode'] == 'batch')
+
+        start = time.perf_counter()
+        products = _run_single(case, workdir) if case['mode'] == 'single' else _run_batch(case, workdir)
+        shutdown_workers()
+        close_sink()
+        wall = time.perf_counter() - start
+
+        summary = tracer.summary()
+        return {
+            'case': case,
+            'wall_s': round(wall, 3),
+            'products_per_s': round(products / wall, 2),
+            'peak_rss_mb': _peak_rss_mb(),
+            'output_bytes': sink.bytes_written,
+            'output_records': sink.records_written,
+            'llm': summary['llm'],
+            'retries': get_scheduler().stats()['retries'],
+            'prompts': prompt_budget.stats(),
+            'responses': response_stats(),
+            'dedup': dedup.stats() if dedup else None,
+            'nodes': {name: {key: entry[key] for key in ('count', 'p50_s', 'p95_s', 'p99_s', 'max_s')}
+                      for name, entry in summary['nodes'].items()},
+            'critical_path': summary['critical_path'],
+        }
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_isolated(case: dict) -> dict:
+    """run_case in a spawned process so peak RSS and process-wide state belong to this case only"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(run_case, case).result()
+
+
+def _case_id(case: dict) -> tuple:
+    # Settings added after a baseline was saved count as their default (0)
+    return tuple(case.get(key, 0) for key in CASE_KEYS)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results: list, label: str, directory: str = RESULTS_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'label': label, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': _git_commit(),
+                   'python': platform.python_version(), 'results': results}, f, indent=4)
+    return path
+
+
+def load_baseline(spec: str, exclude: str, directory: str = RESULTS_DIR) -> tuple[str, list] | None:
+    """Results of an earlier run: a file path, or 'latest' for the newest saved run in directory"""
+    if spec == 'latest':
+        candidates = sorted(path for path in glob.glob(os.path.join(directory, '*.json')) if path != exclude)
+        if not candidates:
+            return None
+        spec = candidates[-1]
+    with open(spec, 'r', encoding='utf-8') as f:
+        return spec, json.load(f)['results']
+
+
+def compare(results: list, baseline: list, threshold: float) -> list:
+    """Print per-case deltas against the baseline; returns the regressions found"""
+    previous = {_case_id(result['case']): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(_case_id(result['case']))
+        name = _case_name(result['case'])
+        if before is None:
+            print(f"  {name}: no matching case in baseline")
+            continue
+        throughput = result['products_per_s'] / before['products_per_s'] - 1 if before['products_per_s'] else 0.0
+        rss = result['peak_rss_mb'] / before['peak_rss_mb'] - 1 if before['peak_rss_mb'] else 0.0
+        calls = result['llm']['count'] - before['llm']['count']
+        print(f"  {name}: throughput {throughput:+.1%}, peak RSS {rss:+.1%}, LLM calls {calls:+d}, "
+              f"output bytes {result['output_bytes'] - before['output_bytes']:+d}")
+        if throughput < -threshold:
+            regressions.append(f"{name}: throughput {throughput:+.1%}")
+        if rss > threshold:
+            regressions.append(f"{name}: peak RSS {rss:+.1%}")
+    return regressions
+
+
+def _case_name(case: dict) -> str:
+    workers = f", {case['workers']} workers" if case.get('workers') else ""
+    return f"{case['mode']} x{case['products']}{workers}"
+
+
+def report(result: dict) -> None:
+    case = result['case']
+    print(f"{_case_name(case)} ({'async' if case['use_async'] else 'sync'}): "
+          f"{result['wall_s']}s, {result['products_per_s']} products/s, {result['llm']['count']} LLM calls, "
+          f"{result['retries']} retries, peak RSS {result['peak_rss_mb']} MB, {result['output_bytes']} output bytes")
+    if result.get('dedup'):
+        dedup = result['dedup']
+        print(f"    FAQ dedup: {dedup['groups']} content groups ({dedup['exact']} exact, {dedup['near']} near "
+              f"duplicates), {dedup['reused']} FAQ calls avoided")
+    for name, entry in list(result['nodes'].items())[:6]:
+        print(f"    {name}: p50 {entry['p50_s']}s, p95 {entry['p95_s']}s, p99 {entry['p99_s']}s ({entry['count']} runs)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['batch', 'single'], default='batch',
+                        help="batch: catalog run over synthetic products; single: the two-product template graph")
+    parser.add_argument('--products', default='10,1000', help="Comma-separated catalog sizes (batch mode)")
+    parser.add_argument('--async', dest='use_async', action='store_true')
+    parser.add_argument('--pairs', choices=['none', 'category', 'one-vs-many'], default='none',
+                        help="one-vs-many compares the middle catalog product with every other one")
+    parser.add_argument('--faq-batch-tokens', type=int, default=0)
+    parser.add_argument('--compare-batch-tokens', type=int, default=0)
+    parser.add_argument('--dedup', action='store_true', help="One FAQ per group of products with the same content")
+    parser.add_argument('--variant-ratio', type=float, default=0.0,
+                        help="Share of catalog products that are size/bundle/regional variants of an earlier one")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--window-size', type=int, default=256)
+    parser.add_argument('--output-format', choices=['pretty', 'jsonl'], default='jsonl')
+    parser.add_argument('--workers', default='0',
+                        help="Comma-separated worker process counts for the CPU stages (batch mode)")
+    parser.add_argument('--latency', default='lognormal:0.8,0.4',
+                        help="Fake LLM latency: fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of calls failing with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of calls failing with 429")
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help="Share of answers wrapped in fences and chatter (comparisons also lose a field)")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--label', default='run', help="Name stored with the results")
+    parser.add_argument('--compare', help="Baseline results file, or 'latest' for the newest saved run")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative throughput drop or RSS growth counted as a regression")
+    parser.add_argument('--results-dir', default=RESULTS_DIR,
+                        help="Directory the results are saved to and 'latest' is looked up in")
+    args = parser.parse_args(argv)
+
+    sizes = [2] if args.mode == 'single' else [int(size) for size in args.products.split(',')]
+    worker_counts = [int(workers) for workers in args.workers.split(',')]
+    results = []
+    for size, workers in ((size, workers) for size in sizes for workers in worker_counts):
+        case = {'mode': args.mode, 'products': size, 'use_async': args.use_async, 'pairs': args.pairs,
+                'faq_batch_tokens': args.faq_batch_tokens, 'compare_batch_tokens': args.compare_batch_tokens,
+                'dedup': args.dedup, 'variant_ratio': args.variant_ratio, 'concurrency': args.concurrency,
+                'window_size': args.window_size, 'workers': workers, 'output_format': args.output_format,
+                'latency': args.latency, 'error_rate': args.error_rate, 'rate_limit_rate': args.rate_limit_rate,
+                'malformed_rate': args.malformed_rate, 'seed': args.seed}
+        result = run_isolated(case)
+        report(result)
+        results.append(result)
+
+    path = save_results(results, args.label, args.results_dir)
+    print(f"Results saved: {path}")
+
+    if args.compare:
+        baseline = load_baseline(args.compare, path, args.results_dir)
+        if baseline is None:
+            print("No earlier results to compare with")
+            return 0
+        print(f"Compared with {baseline[0]}:")
+        regressions = compare(results, baseline[1], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Prompt size: the compact FAQ and comparison prompts vs the verbose builders they replaced.
+
+Builds every prompt kind both ways over the template products and a synthetic catalog and
+reports the estimated tokens (llm.estimate_tokens) and the share saved. Exits non-zero if a
+compact prompt is not smaller than its verbose counterpart.
+
+    python -m benchmarks.prompt_size --products 200
+"""
+import sys
+import json
+import argparse
+
+from agents.parser import ParserAgent, plain_product
+from agents.question_gen import QuestionGenerationAgent
+from agents.comparison import ComparisonAgent
+from benchmarks.synthetic import make_catalog
+from pipeline.llm import estimate_tokens
+
+# Products per batched FAQ prompt (about what --faq-batch-tokens 8000 packs)
+FAQ_BATCH_SIZE = 5
+
+
+def legacy_faq_prompt(product) -> str:
+    """The FAQ prompt before compact prompts (QuestionGenerationAgent PROMPT_VERSION 1)"""
+    return f"""
+You are an AI FAQ Generator. You must create FAQs ONLY using the information
+from the product data below. You are NOT allowed to add external facts.
+
+STRICT RULES:
+- Use ONLY the information provided.
+- No outside knowledge.
+- No invented benefits or ingredients.
+- 15 Q&A pairs.
+- Keep answers factual, grounded.
+- Give a proper JSON output and do not include "```JSON" or "```" in the output.
+
+PRODUCT DATA:
+{json.dumps(plain_product(product), indent=2)}
+
+Output Structure - 
+FAQs:
+    Id - "integer"
+    Question - "string"
+    Answer - "string"
+"""
+
+
+def legacy_faq_batch_prompt(products: dict) -> str:
+    """The batched FAQ prompt before compact prompts"""
+    sections = "\n\n".join(
+        f"PRODUCT {product_id}:\n{json.dumps(plain_product(product), indent=2)}" for product_id, product in products.items()
+    )
+    ids = ", ".join(f'"{product_id}"' for product_id in products)
+    return f"""
+You are an AI FAQ Generator. You must create FAQs for EACH product below, ONLY using
+the information from that product's data. You are NOT allowed to add external facts.
+
+STRICT RULES:
+- Use ONLY the information provided for each product.
+- No outside knowledge and no mixing of facts between products.
+- No invented benefits or ingredients.
+- 15 Q&A pairs per product.
+- Keep answers factual, grounded.
+- Give a proper JSON output and do not include "```JSON" or "```" in the output.
+
+{sections}
+
+Output Structure - one JSON object with exactly the keys {ids}, each mapping to:
+FAQs:
+    Id - "integer"
+    Question - "string"
+    Answer - "string"
+"""
+
+
+def legacy_comparison_prompt(product_a, product_b) -> str:
+    """The comparison prompt before compact prompts (ComparisonAgent PROMPT_VERSION 1)"""
+    product_a, product_b = plain_product(product_a), plain_product(product_b)
+    return f"""
+You are an expert product review agent with overall 15+ years of experience. You have a sharp eye for details and is able to 
+extract meaningful and smart insights from a product. Your task is to compare the following 2 products and then give the json output
+as per the desired output structure.
+
+Products to Compare - 
+Product A - {json.dumps(product_a, indent=2)}
+Product B - {json.dumps(product_b, indent=2)}
+
+Output Structure - 
+{product_a} - Summarise the Product A 
+{product_b} - Summarise the Product B
+Comparison - 3 points of differentation between both the products along with conclusion of that point
+Recommendation - Recommend the right product for a user
+
+Guardrails:
+1. Give factual and concise answers only.
+2. Use the names of products at the place of "Product A" and "Product B"
+3. Do not assume anything.
+4. The summary and recommendation must be strictly less than 200 words.
+5. Give a proper JSON output and do not include "```JSON" or "```" in the output.
+"""
+
+
+def prompt_sizes(products: list) -> dict:
+    """{prompt kind: (verbose tokens, compact tokens)} summed over every prompt of the catalog:
+    one FAQ per product, batches of FAQ_BATCH_SIZE products, and each product against the next"""
+    faq_agent, comparison_agent = QuestionGenerationAgent(), ComparisonAgent()
+    batches = [{f"P{number}": product for number, product in enumerate(products[start:start + FAQ_BATCH_SIZE], 1)}
+               for start in range(0, len(products), FAQ_BATCH_SIZE)]
+    pairs = list(zip(products, products[1:]))
+    prompts = {
+        'faq': [(legacy_faq_prompt(product), faq_agent.build_prompt(product)) for product in products],
+        'faq_batch': [(legacy_faq_batch_prompt(batch), faq_agent.build_batch_prompt(batch)) for batch in batches],
+        'comparison': [(legacy_comparison_prompt(a, b), comparison_agent.build_prompt(a, b)) for a, b in pairs],
+    }
+    return {kind: (sum(estimate_tokens(verbose) for verbose, _ in built),
+                   sum(estimate_tokens(compact) for _, compact in built))
+            for kind, built in prompts.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--template', default='template.json')
+    args = parser.parse_args(argv)
+
+    parser_agent = ParserAgent()
+    with open(args.template, 'r', encoding='utf-8') as f:
+        catalogs = {'template': json.load(f), f"synthetic x{args.products}": make_catalog(args.products)}
+
+    larger = 0
+    for label, catalog in catalogs.items():
+        products = [parser_agent.parse(raw) for raw in catalog]
+        for kind, (verbose, compact) in prompt_sizes(products).items():
+            saved = 1 - compact / verbose if verbose else 0.0
+            larger += compact >= verbose
+            print(f"{label:<16} {kind:<11} verbose ~{verbose:>8} tokens, compact ~{compact:>8} ({saved:.0%} saved)")
+    return 1 if larger else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import json
+import random
+
+# Vocabulary the synthetic products are drawn from, shaped like template.json
+BRANDS = ["GlowBoost", "Aqualogica", "Minimalist", "DermaCo", "Plum", "Dot & Key", "Foxtale", "Deconstruct"]
+ACTIVES = ["Vitamin C", "Niacinamide", "Retinol", "Salicylic Acid", "Hyaluronic Acid", "Ceramide", "Peptide"]
+FORMATS = ["Serum", "Cream", "Gel", "Toner", "Essence"]
+SKIN_TYPES = ["Oily", "Combination", "Dry", "Normal", "Sensitive"]
+INGREDIENTS = ["Vitamin C", "Hyaluronic Acid", "Vitamin E", "Niacinamide", "Zinc", "Squalane", "Panthenol", "Allantoin"]
+BENEFITS = ["Brightening", "Fades dark spots", "Reduces fine lines", "Hydration", "Controls oil", "Soothes redness"]
+USAGE = [
+    "Apply 2–3 drops in the morning before sunscreen",
+    "Cleanse face. Apply a pea-sized amount • Follow with moisturiser",
+    "Use at night on dry skin. Start twice a week. Increase gradually",
+]
+SIDE_EFFECTS = [
+    "Mild tingling for sensitive skin",
+    "Mild tingling. May cause dryness for very sensitive skin",
+    "May cause rash on broken skin",
+    "Possible redness during the first week",
+]
+CURRENCIES = ["₹", "₹", "₹", "$", "Rs. "]
+# Size, bundle and regional listings of the same product
+VARIANT_SUFFIXES = ["15ml", "30ml", "50ml", "Travel Size", "Twin Pack", "Value Bundle", "(India)", "(Intl.)"]
+# Rewordings a regional listing applies to the usage text
+REWORDINGS = [("moisturiser", "moisturizer"), (" • ", ". "), ("–", "-"), ("Increase gradually", "increase gradually")]
+
+
+def make_product(rng: random.Random, index: int) -> dict:
+    """One raw catalog entry with the template.json field names"""
+    active = rng.choice(ACTIVES)
+    product_format = rng.choice(FORMATS)
+    return {
+        "product_name": f"{rng.choice(BRANDS)} {active} {product_format} #{index}",
+        "category": product_format.lower(),
+        "concentration": f"{rng.choice([1, 2, 5, 10, 15, 20])}% {active}",
+        "skin_type": rng.sample(SKIN_TYPES, rng.randint(1, 3)),
+        "key_ingredients": rng.sample(INGREDIENTS, rng.randint(2, 4)),
+        "benefits": rng.sample(BENEFITS, rng.randint(1, 3)),
+        "how_to_use": rng.choice(USAGE),
+        "side_effects": rng.choice(SIDE_EFFECTS),
+        "price": f"{rng.choice(CURRENCIES)}{rng.randint(199, 2999)}",
+    }
+
+
+def make_variant(rng: random.Random, base: dict, index: int) -> dict:
+    """A listing of base with its own name and price and the same content; every other one
+    has a slightly reworded usage text (a near duplicate)"""
+    variant = dict(base)
+    stem = base["product_name"].rsplit(" #", 1)[0]
+    variant["product_name"] = f"{stem} {rng.choice(VARIANT_SUFFIXES)} #{index}"
+    variant["price"] = f"{rng.choice(CURRENCIES)}{rng.randint(199, 2999)}"
+    if rng.random() < 0.5:
+        for old, new in REWORDINGS:
+            variant["how_to_use"] = variant["how_to_use"].replace(old, new)
+        variant["how_to_use"] += " regularly"
+    return variant
+
+
+def make_catalog(size: int, seed: int = 7, variant_ratio: float = 0.0) -> list:
+    """Deterministic synthetic catalog of size products; about variant_ratio of them are
+    variants of an earlier product (the catalog is unchanged for 0)"""
+    rng = random.Random(seed)
+    variants = random.Random(seed + 1) if variant_ratio else None
+    catalog = []
+    for index in range(size):
+        if variants and catalog and variants.random() < variant_ratio:
+            catalog.append(make_variant(variants, variants.choice(catalog), index))
+        else:
+            catalog.append(make_product(rng, index))
+    return catalog
+
+
+def write_catalog(path: str, size: int, seed: int = 7, variant_ratio: float = 0.0) -> str:
+    """Write a synthetic catalog as JSONL (.jsonl) or a JSON array (anything else)"""
+    catalog = make_catalog(size, seed, variant_ratio)
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for product in catalog:
+                f.write(json.dumps(product, ensure_ascii=False) + "\n")
+        else:
+            json.dump(catalog, f, ensure_ascii=False)
+    return path
@@ -1,9 +1,10 @@
 import os
 import json
+import inspect
 import logging
-from typing import TypedDict, Annotated
-from dotenv import load_dotenv
-from langgraph.graph import StateGraph, START, END
+import argparse
+from itertools import islice
+from typing import TypedDict, Annotated, TYPE_CHECKING
 
 # LanGraph Nodes
 from agents.parser import ParserAgent
@@ -11,8 +12,23 @@ from agents.content_block import ContentBlockAgent
 from agents.question_gen import QuestionGenerationAgent
 from agents.page_assembler import PageAssemblerAgent
 from agents.comparison import ComparisonAgent
+from pipeline import llm
+from pipeline.state import keep_first
+from pipeline.outputs import get_sink, configure_sink, close_sink, compact_shards
+from pipeline.cache import configure_cache, log_cache_stats
+from pipeline.scheduler import configure_scheduler, log_scheduler_stats
+from pipeline.prompts import configure_prompt_budget, log_prompt_stats
+from pipeline.responses import log_response_stats
+from pipeline.tracing import configure_tracing, get_tracer, observe_graph, traced
+from pipeline.workers import configure_workers, shutdown_workers
+from pipeline.runs import UnknownRun, configure_run_store, get_run_store, close_run_store
+from pipeline.canonical import DEFAULT_THRESHOLD, configure_dedup, log_dedup_stats
+from pipeline.manifest import NodeManifest
+from pipeline.dag import Dataflow
+from pipeline.catalog import iter_products
 
-load_dotenv()
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
 
 # Setup logging
 logger = logging.getLogger()
@@ -24,11 +40,10 @@ logger.addHandler(console_handler)
 
 
 # STATE DEFINITION - TypedDict for LangGraph state management with Annotated
-def keep_first(existing, new):
-    """Reducer: Keep existing value (first write wins), ignore concurrent updates"""
-    return existing if existing else new
 class PipelineState(TypedDict):
-    """Shared state across all LangGraph nodes with Annotated fields for concurrent writes"""
+    """Shared state across all LangGraph nodes with Annotated fields for concurrent writes.
+    Nodes return only the keys they produce, so each reducer runs once per actual write;
+    product_a / product_b hold compact Product records."""
     template: Annotated[list, keep_first]
     product_a: Annotated[dict, keep_first]      
     product_b: Annotated[dict, keep_first]      
@@ -38,17 +53,12 @@ class PipelineState(TypedDict):
     comparison: Annotated[dict, keep_first]     
     error: Annotated[str | None, keep_first]    
 
-# UTILITY FUNCTIONS
-
-def save_json(data: dict, path: str) -> None:
-    """Safe JSON save utility"""
-    try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        logger.info(f"Saved JSON: {path}")
-    except Exception as e:
-        logger.error(f"Failed to save JSON to {path}: {e}")
+# Agents are stateless, so one instance per process is shared by every node call
+parser_agent = ParserAgent()
+content_agent = ContentBlockAgent()
+faq_agent = QuestionGenerationAgent()
+page_agent = PageAssemblerAgent()
+compare_agent = ComparisonAgent()
 
 # Function for Node load_template
 def load_template_node(state: PipelineState) -> PipelineState:
@@ -56,117 +66,290 @@ def load_template_node(state: PipelineState) -> PipelineState:
     logger.info("Template Load Node Loaded successfully")
     
     try:
-        with open('template.json', 'r', encoding='utf-8') as f:
-            template = json.load(f)
+        # Only the two products this run needs are read, however large the file is
+        template = list(islice(iter_products('template.json'), 2))
         
         if len(template) < 2:
             error_msg = "Template JSON must contain at least 2 products."
             logger.error(error_msg)
-            state['error'] = error_msg
-            return state
+            return {'error': error_msg}
         
-        state['template'] = template
         logger.info("Template loaded successfully with 2 products")
-        return state
+        return {'template': template}
     
     except Exception as e:
         error_msg = f"Failed to load template.json: {e}"
         logger.error(error_msg)
-        state['error'] = error_msg
-        return state
+        return {'error': error_msg}
 
 # Function for parse product_a node
 def parse_product_a_node(state: PipelineState) -> PipelineState:
     """Parse Product A using ParserAgent"""
-    parser = ParserAgent()
-    return parser.run_product_a(state)
+    return parser_agent.run_product_a(state)
 
 # Function for parse product_b node
 def parse_product_b_node(state: PipelineState) -> PipelineState:
     """Parse Product B using ParserAgent"""
-    parser = ParserAgent()
-    return parser.run_product_b(state)
+    return parser_agent.run_product_b(state)
 
 # Function for content block node
 def generate_content_blocks_node(state: PipelineState) -> PipelineState:
     """Generate content blocks using ContentBlockAgent"""
-    content_agent = ContentBlockAgent()
     return content_agent.run(state)
 
-# Function for generating faq node
-def generate_faq_node(state: PipelineState) -> PipelineState:
-    """Generate FAQ using QuestionGenerationAgent"""
-    faq_agent = QuestionGenerationAgent()
-    state = faq_agent.run(state)
+# Nodes that save an artifact are built around their agent call, which incremental mode may
+# skip; the stored outputs of a skipped call are saved like fresh ones
+def _save(artifact: str, data: dict | None) -> None:
+    if data:
+        get_sink().write(artifact, data)
+
+# Function for generating faq node (async variant for compiled_graph.ainvoke when generate is async)
+def make_faq_node(generate):
+    """Generate FAQ with generate (QuestionGenerationAgent.run or arun) and save it to output"""
+    def generate_faq_node(state: PipelineState) -> PipelineState:
+        update = generate(state)
+        _save('faq', update.get('faq_a'))
+        return update
     
-    # Save FAQ to output
-    if state.get('faq_a'):
-        save_json(state['faq_a'], os.path.join('output', 'faq.json'))
+    async def agenerate_faq_node(state: PipelineState) -> PipelineState:
+        update = await generate(state)
+        _save('faq', update.get('faq_a'))
+        return update
     
-    return state
+    return agenerate_faq_node if inspect.iscoroutinefunction(generate) else generate_faq_node
 
 # Function for product page assemble node
-def assemble_product_page_node(state: PipelineState) -> PipelineState:
-    """Assemble product page using PageAssemblerAgent"""
-    page_agent = PageAssemblerAgent()
-    state = page_agent.run(state)
+def make_page_node(assemble):
+    """Assemble product page with assemble (PageAssemblerAgent.run) and save it to output"""
+    def assemble_product_page_node(state: PipelineState) -> PipelineState:
+        update = assemble(state)
+        _save('product_page', update.get('product_page'))
+        return update
     
-    # Save product page to output
-    if state.get('product_page'):
-        save_json(state['product_page'], os.path.join('output', 'product_page.json'))
-    
-    return state
+    return assemble_product_page_node
 
-# Function for comparing products node
-def compare_products_node(state: PipelineState) -> PipelineState:
-    """Compare products using ComparisonAgent"""
-    compare_agent = ComparisonAgent()
-    state = compare_agent.run(state)
+# Function for comparing products node (async variant for compiled_graph.ainvoke when compare is async)
+def make_compare_node(compare):
+    """Compare products with compare (ComparisonAgent.run or arun) and save the comparison to output"""
+    def compare_products_node(state: PipelineState) -> PipelineState:
+        update = compare(state)
+        _save('comparison_page', update.get('comparison'))
+        return update
     
-    # Save comparison to output
-    if state.get('comparison'):
-        save_json(state['comparison'], os.path.join('output', 'comparison_page.json'))
+    async def acompare_products_node(state: PipelineState) -> PipelineState:
+        update = await compare(state)
+        _save('comparison_page', update.get('comparison'))
+        return update
     
-    return state
+    return acompare_products_node if inspect.iscoroutinefunction(compare) else compare_products_node
 
 
 #LangGraph Workflow with parallel execution
-def build_pipeline_graph() -> StateGraph:
-    logger.info("Building LangGraph pipeline with parallel execution...")
+def build_pipeline_dataflow(use_async: bool = False, manifest: NodeManifest | None = None) -> Dataflow:
+    """Pipeline nodes with the state keys they read and write; the edges follow from these"""
+    # Wrap a node for tracing (--profile); agent nodes are built by make around the agent call,
+    # which incremental mode skips when its inputs are unchanged
+    def node(name, fn, agent=None, make=None):
+        if manifest and agent is not None:
+            fn = manifest.wrap(name, fn, agent)
+        return traced(name, make(fn) if make else fn)
     
-    # Create the state graph
-    graph = StateGraph(PipelineState)
-    
-    # All nodes
-    graph.add_node("load_template", load_template_node)
-    graph.add_node("parse_product_a", parse_product_a_node)
-    graph.add_node("parse_product_b", parse_product_b_node)
-    graph.add_node("generate_content_blocks", generate_content_blocks_node)
-    graph.add_node("generate_faq", generate_faq_node)
-    graph.add_node("assemble_product_page", assemble_product_page_node)
-    graph.add_node("compare_products", compare_products_node)
-    
-
-    # All Edges
-    graph.add_edge(START, "load_template")
-    graph.add_edge("load_template", "parse_product_a")
-    graph.add_edge("parse_product_a", "generate_content_blocks")
-    graph.add_edge("generate_content_blocks", "generate_faq")
-    graph.add_edge("generate_faq", "assemble_product_page")
-    graph.add_edge("load_template", "parse_product_b")
-    graph.add_edge("assemble_product_page", "compare_products")
-    graph.add_edge("parse_product_b", "compare_products")
-    graph.add_edge("compare_products", END)
+    flow = Dataflow()
+    flow.add("load_template", node("load_template", load_template_node), writes=('template',))
+    flow.add("parse_product_a", node("parse_product_a", parse_product_a_node),
+             reads=('template',), writes=('product_a',))
+    flow.add("parse_product_b", node("parse_product_b", parse_product_b_node),
+             reads=('template',), writes=('product_b',))
+    flow.add("generate_content_blocks",
+             node("generate_content_blocks", generate_content_blocks_node, content_agent), content_agent)
+    flow.add("generate_faq",
+             node("generate_faq", faq_agent.arun if use_async else faq_agent.run, faq_agent, make_faq_node),
+             faq_agent)
+    flow.add("assemble_product_page",
+             node("assemble_product_page", page_agent.run, page_agent, make_page_node), page_agent)
+    flow.add("compare_products",
+             node("compare_products", compare_agent.arun if use_async else compare_agent.run, compare_agent,
+                  make_compare_node), compare_agent)
+    return flow
+
+
+def build_pipeline_graph(use_async: bool = False, manifest: NodeManifest | None = None) -> "StateGraph":
+    """use_async swaps the LLM nodes for their async variants (run with ainvoke);
+    a manifest makes the agent nodes skip when their inputs are unchanged since the last run.
+    Each node waits only for the nodes writing what it reads, so the comparison starts as
+    soon as both products are parsed and runs alongside content, FAQ and page assembly."""
+    logger.info("Building LangGraph pipeline with parallel execution...")
+    graph = build_pipeline_dataflow(use_async, manifest).build(PipelineState)
+    observe_graph("pipeline", graph)
     
     logger.info("LangGraph pipeline built with parallel execution:")
     return graph
 
 
-def main():
+def parse_args(argv=None):
+    """Command line options; without --catalog the classic two-product run is executed"""
+    parser = argparse.ArgumentParser(description="LangGraph product content pipeline")
+    parser.add_argument('--catalog', help="Run batch mode over every product of this catalog "
+                                          "(JSON array or JSONL, read lazily)")
+    parser.add_argument('--pairs', help="Comparisons in batch mode: 'category' for all pairs within a category, "
+                                        "'vs:<product name>' for that product against every other one, "
+                                        "or a JSON file with a list of [product_a, product_b] names")
+    parser.add_argument('--category-key', default='category', help="Product field used to group pairs by category")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="Maximum number of nodes running at once in batch mode, or of jobs in service mode")
+    parser.add_argument('--window-size', type=int, default=64,
+                        help="Products read from the catalog stream and processed per graph invocation")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="Run LLM nodes on one event loop with the shared pooled client")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the on-disk LLM response cache")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Ignore cached LLM responses but store the fresh ones")
+    parser.add_argument('--output-format', choices=['pretty', 'jsonl'], default='pretty',
+                        help="pretty: one indented JSON file per artifact; jsonl: buffered, sharded JSONL")
+    parser.add_argument('--flush-size', type=int, default=500, help="Records buffered per JSONL write")
+    parser.add_argument('--shard-size', type=int, default=50000, help="Records per JSONL shard file")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Skip nodes whose inputs are unchanged since the last run and reuse their outputs")
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help="Batch mode: continue an interrupted run, skipping the products and pairs it finished "
+                             "and retrying failed or missing ones")
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help="Batch mode: do not record finished products and pairs for --resume")
+    parser.add_argument('--faq-batch-tokens', type=int, default=0,
+                        help="Batch mode: pack several products into each FAQ request, up to this many estimated "
+                             "prompt and answer tokens (0 sends one request per product)")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Batch mode: generate one FAQ per group of products with the same content (variants "
+                             "differing in name and price) and adapt it to each member's name and price")
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Batch mode: usage / side-effect text similarity (0-1) from which products with "
+                             "otherwise identical content share a FAQ")
+    parser.add_argument('--compare-batch-tokens', type=int, default=0,
+                        help="Batch mode: compare pairs with the comparison matrix, whose locally computed "
+                             "differences and narrative requests for several pairs fit this many estimated "
+                             "tokens (0 sends one full comparison request per pair)")
+    parser.add_argument('--rpm', type=int, default=int(os.environ.get('LLM_RPM', '0')),
+                        help="Provider requests-per-minute limit the LLM scheduler paces to (0 = unlimited)")
+    parser.add_argument('--tpm', type=int, default=int(os.environ.get('LLM_TPM', '0')),
+                        help="Provider tokens-per-minute limit, budgeted from estimated prompt and answer sizes "
+                             "(0 = unlimited)")
+    parser.add_argument('--prompt-budget', type=int, default=int(os.environ.get('LLM_PROMPT_BUDGET', '0')),
+                        help="Per-call prompt budget: prompts estimated above this many tokens are not sent "
+                             "(0 = no limit)")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Batch mode: render content blocks, product pages and their JSON in this many worker "
+                             "processes (0 keeps every stage in this process)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Trace every node and LLM call; log a latency summary and save output/trace.json "
+                             "(Chrome/Perfetto) and output/profile.json")
+    parser.add_argument('--show-dag', action='store_true',
+                        help="Print the node DAG derived from the agents' reads/writes and its critical path, "
+                             "then exit (with --catalog: the per-product subgraph)")
+    parser.add_argument('--compact-output', action='store_true',
+                        help="Rewrite the JSONL shards under output/ so every key keeps only its newest record, "
+                             "then exit (run it while no run writes there)")
+    parser.add_argument('--serve', action='store_true',
+                        help="Run as a long-lived service that takes product and comparison jobs over HTTP")
+    parser.add_argument('--host', default='127.0.0.1', help="Service mode: address to listen on")
+    parser.add_argument('--port', type=int, default=8080, help="Service mode: port to listen on")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="Service mode: jobs waiting beyond the running ones before new jobs get 503")
+    parser.add_argument('--inbox', help="Service mode: also take job files dropped into this directory")
+    args = parser.parse_args(argv)
+    if args.resume and (not args.catalog or args.no_checkpoint):
+        parser.error("--resume needs --catalog and checkpoints (no --no-checkpoint)")
+    return args
+
+
+def run_batch_mode(args, manifest: NodeManifest | None = None) -> None:
+    """Batch entry point: fan out over the whole catalog in one compiled graph"""
+    from pipeline.batch import run_batch, run_batch_async, ALL_PAIRS_IN_CATEGORY, ONE_VS_MANY_PREFIX
+    
+    catalog = iter_products(args.catalog)
+    
+    pairs_spec = None
+    if args.pairs == ALL_PAIRS_IN_CATEGORY or (args.pairs or "").startswith(ONE_VS_MANY_PREFIX):
+        pairs_spec = args.pairs
+    elif args.pairs:
+        with open(args.pairs, 'r', encoding='utf-8') as f:
+            pairs_spec = json.load(f)
+    
+    if args.use_async:
+        summary = llm.run(run_batch_async(catalog, pairs_spec, args.category_key, args.concurrency,
+                                              manifest, args.window_size, args.faq_batch_tokens,
+                                              args.compare_batch_tokens))
+    else:
+        summary = run_batch(catalog, pairs_spec, args.category_key, args.concurrency, manifest, args.window_size,
+                            args.faq_batch_tokens, args.compare_batch_tokens)
+    
+    for failure in summary['errors']:
+        logger.error(f"{failure['key']}: {failure['error']}")
+    if get_run_store():
+        get_run_store().finish()
+    logger.info("BATCH EXECUTION COMPLETED")
+
+
+def start_run(args) -> str | None:
+    """Open the checkpoint record of a catalog run (a new one, or --resume's); returns its run id"""
+    if not args.catalog or args.no_checkpoint:
+        configure_run_store(False)
+        return None
+    run_id = configure_run_store(True).start(vars(args), args.resume)
+    if args.resume:
+        logger.info(f"Resuming run {run_id}: {len(get_run_store().done)} products and pairs already done")
+    else:
+        logger.info(f"Run id: {run_id} (continue an interrupted run with --resume {run_id})")
+    return run_id
+
+
+def show_dag(args) -> None:
+    """--show-dag: the derived dependencies, parallel steps and critical path of the graph this
+    command line would run"""
+    if args.catalog:
+        from pipeline.batch import product_dataflow
+        print(product_dataflow(args.use_async, render_in_workers=args.workers > 0).describe("Per-product"))
+    else:
+        print(build_pipeline_dataflow(args.use_async).describe("Pipeline"))
+
+
+def main(argv=None):
     """Main entry point for the pipeline"""
+    # Before parsing: .env may set option defaults such as LLM_RPM
+    llm.load_env()
+    args = parse_args(argv)
+    if args.show_dag:
+        show_dag(args)
+        return
+    if args.compact_output:
+        logger.info(f"Compacted JSONL output: dropped {compact_shards()} superseded records")
+        return
+    manifest = None
     try:
+        configure_cache(enabled=not args.no_cache, refresh=args.refresh)
+        configure_scheduler(args.rpm, args.tpm)
+        configure_prompt_budget(args.prompt_budget)
+        configure_tracing(args.profile)
+        if args.catalog:
+            configure_workers(args.workers, args.window_size)
+        configure_dedup(args.dedup and bool(args.catalog), args.dedup_threshold)
+        run_id = start_run(args)
+        sink = configure_sink(args.output_format, args.flush_size, args.shard_size, run_id)
+        if args.resume and args.output_format == "jsonl":
+            dropped = sink.recover(get_run_store().is_done)
+            logger.info(f"Recovered the run's JSONL shards, dropped {dropped} records of unfinished items")
+        manifest = NodeManifest() if args.incremental else None
+        
+        if args.catalog:
+            run_batch_mode(args, manifest)
+            return
+        
+        if args.serve:
+            from pipeline.service import serve
+            serve(args.host, args.port, args.concurrency, args.queue_size, args.inbox, manifest)
+            return
+        
         # Build the graph
-        graph = build_pipeline_graph()
+        graph = build_pipeline_graph(use_async=args.use_async, manifest=manifest)
         
         # Compile the graph
         compiled_graph = graph.compile()
@@ -185,7 +368,10 @@ def main():
         
         # Execute the pipeline
         logger.info("Executing pipeline with parallel node execution...")
-        final_state = compiled_graph.invoke(initial_state)
+        if args.use_async:
+            final_state = llm.run(compiled_graph.ainvoke(initial_state))
+        else:
+            final_state = compiled_graph.invoke(initial_state)
         
         if final_state.get('error'):
             logger.critical(f"Pipeline failed: {final_state['error']}")
@@ -194,10 +380,31 @@ def main():
         logger.info("PIPELINE EXECUTION COMPLETED SUCCESSFULLY")
         logger.info(f"Output files saved successfully")
     
+    except UnknownRun as e:
+        logger.critical(str(e))
+    
     except Exception as e:
         logger.critical(f"Pipeline failed unexpectedly: {e}")
         import traceback
         logger.critical(traceback.format_exc())
+    
+    finally:
+        shutdown_workers()
+        close_sink()
+        log_cache_stats()
+        log_scheduler_stats()
+        log_prompt_stats()
+        log_response_stats()
+        log_dedup_stats()
+        if get_tracer():
+            get_tracer().write()
+        if manifest:
+            manifest.write_report()
+            manifest.close()
+        store = get_run_store()
+        if store and store.run_id and not store.finished:
+            logger.warning(f"Run {store.run_id} did not finish; continue it with --resume {store.run_id}")
+        close_run_store()
 
 # Entry Point
 if __name__ == "__main__":
@@ -0,0 +1,652 @@
+import inspect
+import logging
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+
+from agents.parser import ParserAgent, is_product_entry
+from agents.content_block import ContentBlockAgent
+from agents.question_gen import QuestionGenerationAgent
+from agents.page_assembler import PageAssemblerAgent
+from agents.comparison import ComparisonAgent
+from agents.comparison_matrix import ComparisonMatrixAgent
+from pipeline.state import ProductState, PairState, BatchState
+from pipeline.outputs import get_sink, slugify
+from pipeline.manifest import NodeManifest
+from pipeline.catalog import iter_windows
+from pipeline.tracing import traced, observe_graph
+from pipeline.dag import Dataflow
+from pipeline.workers import WorkerPool, get_pool
+from pipeline.runs import get_run_store
+from pipeline.canonical import CanonicalIndex, get_dedup_index
+
+logger = logging.getLogger()
+
+DEFAULT_CONCURRENCY = 8
+ALL_PAIRS_IN_CATEGORY = "category"
+# "vs:<product name>" compares that product with every other product of the catalog
+ONE_VS_MANY_PREFIX = "vs:"
+
+# Agents are stateless, so one instance per process is shared by every node call
+parser_agent = ParserAgent()
+content_agent = ContentBlockAgent()
+faq_agent = QuestionGenerationAgent()
+page_agent = PageAssemblerAgent()
+compare_agent = ComparisonAgent()
+matrix_agent = ComparisonMatrixAgent()
+
+
+# PAIR PLANNING
+
+class PairPlanner:
+    """Decides, window by window, which comparisons become possible as products stream in.
+
+    pairs_spec is either None (no comparisons), ALL_PAIRS_IN_CATEGORY (every pair of
+    products sharing the same category_key value), ONE_VS_MANY_PREFIX + a product name
+    (that product against every other one) or an explicit list of pairs given as product
+    names or catalog indices. Only products that a pair can still refer to are retained
+    between windows: in one-vs-many mode the anchor, and the products read before it.
+    Entries that are not JSON objects are skipped (they keep their catalog index).
+    """
+
+    def __init__(self, pairs_spec, category_key: str = "category"):
+        self.pairs_spec = pairs_spec
+        self.category_key = category_key
+        self.position = 0
+        self.retained = {}
+        self.categories = {}
+        one_vs_many = isinstance(pairs_spec, str) and pairs_spec.startswith(ONE_VS_MANY_PREFIX)
+        self.anchor = pairs_spec[len(ONE_VS_MANY_PREFIX):] if one_vs_many else None
+        self.anchor_position = None
+        self.explicit = [] if pairs_spec in (None, ALL_PAIRS_IN_CATEGORY) or one_vs_many \
+            else [tuple(pair) for pair in pairs_spec]
+        self.wanted = {ref for pair in self.explicit for ref in pair}
+        self.resolved = {}
+        self.pending = set(range(len(self.explicit)))
+        self.emitted = 0
+
+    def plan(self, window: list) -> tuple[list, list]:
+        """(partner positions from earlier windows, (position_a, position_b) pairs) completed by this window"""
+        start = self.position
+        self.position += len(window)
+        if not self.pairs_spec:
+            return [], []
+
+        if self.explicit:
+            # Forget products that no pending pair can refer to any more
+            needed = {self.resolved.get(ref) for index in self.pending for ref in self.explicit[index]}
+            self.retained = {position: product for position, product in self.retained.items() if position in needed}
+        elif self.anchor_position is not None:
+            self.retained = {self.anchor_position: self.retained[self.anchor_position]}
+
+        pairs = []
+        for position, product_dict in enumerate(window, start):
+            if not is_product_entry(product_dict):
+                logger.warning(f"Catalog entry {position} is not a JSON object; it is not paired")
+                continue
+            if self.anchor is not None:
+                pairs.extend(self._pair_with_anchor(position, product_dict))
+                continue
+            if self.pairs_spec == ALL_PAIRS_IN_CATEGORY:
+                members = self.categories.setdefault(product_dict.get(self.category_key, ""), [])
+                pairs.extend((earlier, position) for earlier in members)
+                members.append(position)
+                self.retained[position] = product_dict
+                continue
+
+            name = product_dict.get("product_name", "")
+            for ref in (position, name):
+                if ref in self.wanted:
+                    self.resolved.setdefault(ref, position)
+                    self.retained[position] = product_dict
+
+        for index in sorted(self.pending):
+            first, second = self.explicit[index]
+            if first in self.resolved and second in self.resolved:
+                pairs.append((self.resolved[first], self.resolved[second]))
+                self.pending.discard(index)
+
+        self.emitted += len(pairs)
+        partners = sorted({position for pair in pairs for position in pair if position < start})
+        return partners, pairs
+
+    def _pair_with_anchor(self, position: int, product_dict: dict) -> list:
+        """One-vs-many pairs completed by one product: (anchor, product) once the anchor is known,
+        or (anchor, every product read so far) when the product is the anchor"""
+        if self.anchor_position is not None:
+            return [(self.anchor_position, position)]
+        earlier = sorted(self.retained)
+        self.retained[position] = product_dict
+        if product_dict.get("product_name", "") != self.anchor:
+            return []
+        self.anchor_position = position
+        return [(position, other) for other in earlier]
+
+    def unresolved(self) -> list:
+        """Explicit pairs (or the one-vs-many anchor) that never matched products of the stream"""
+        if self.anchor is not None and self.anchor_position is None:
+            return [(self.anchor, "*")]
+        return [self.explicit[index] for index in sorted(self.pending)]
+
+
+# PER-PRODUCT SUBGRAPH NODES
+# Nodes that write to the sink are built around their agent call, which the manifest skips in
+# incremental runs; the node writes the call's outputs whether they are fresh or stored
+
+def generate_content_blocks_node(state: ProductState) -> dict:
+    """Generate content blocks using ContentBlockAgent, unless the columnar batch stage already did"""
+    if state.get('content_a'):
+        return {}
+    return content_agent.run(state)
+
+def generate_faq(state: ProductState) -> dict:
+    """FAQ using QuestionGenerationAgent, unless the batched FAQ stage already generated it"""
+    return {} if state.get('faq_a') else faq_agent.run(state)
+
+async def agenerate_faq(state: ProductState) -> dict:
+    """Async variant of generate_faq"""
+    return {} if state.get('faq_a') else await faq_agent.arun(state)
+
+def _write_faq(state: ProductState, update: dict) -> dict:
+    faq = update.get('faq_a') or state.get('faq_a')
+    if faq:
+        get_sink().write('faq', faq, state['key'])
+    return update
+
+def make_faq_node(generate):
+    """Node writing the FAQ of generate (generate_faq, or agenerate_faq for an async node) to the output sink"""
+    def generate_faq_node(state: ProductState) -> dict:
+        return _write_faq(state, generate(state))
+
+    async def agenerate_faq_node(state: ProductState) -> dict:
+        return _write_faq(state, await generate(state))
+
+    return agenerate_faq_node if inspect.iscoroutinefunction(generate) else generate_faq_node
+
+def make_page_node(assemble):
+    """Assemble product page with assemble (PageAssemblerAgent.run) and write it to the output sink"""
+    def assemble_product_page_node(state: ProductState) -> dict:
+        update = assemble(state)
+        if update.get('product_page'):
+            get_sink().write('product_page', update['product_page'], state['key'])
+        return update
+    return assemble_product_page_node
+
+def _agent_call(manifest: NodeManifest | None, name: str, call, agent):
+    """Agent call of node name, skipped by the manifest when its inputs are unchanged"""
+    return manifest.wrap(name, call, agent) if manifest else call
+
+def _node(manifest: NodeManifest | None, name: str, call, agent, make=None):
+    """Node built by make (if any) around the (incremental) agent call, wrapped for tracing"""
+    call = _agent_call(manifest, name, call, agent)
+    return traced(name, make(call) if make else call)
+
+def product_dataflow(use_async: bool = False, manifest: NodeManifest | None = None,
+                     render_in_workers: bool = False) -> Dataflow:
+    """Nodes of the per-product subgraph: content and FAQ (independent, so concurrent), then
+    page assembly; only the FAQ when content and pages are rendered in worker processes"""
+    flow = Dataflow()
+    if not render_in_workers:
+        flow.add("generate_content_blocks",
+                 _node(manifest, "generate_content_blocks", generate_content_blocks_node, content_agent), content_agent)
+    flow.add("generate_faq",
+             _node(manifest, "generate_faq", agenerate_faq if use_async else generate_faq, faq_agent, make_faq_node),
+             faq_agent)
+    if not render_in_workers:
+        flow.add("assemble_product_page",
+                 _node(manifest, "assemble_product_page", page_agent.run, page_agent, make_page_node), page_agent)
+    return flow
+
+
+def build_product_graph(use_async: bool = False, manifest: NodeManifest | None = None,
+                        render_in_workers: bool = False) -> StateGraph:
+    """Subgraph run once per product, wired from product_dataflow"""
+    graph = product_dataflow(use_async, manifest, render_in_workers).build(ProductState)
+    observe_graph("product", graph)
+    return graph
+
+
+# BATCH GRAPH NODES
+
+def parse_catalog_node(state: BatchState) -> dict:
+    """Parse every catalog entry of the window using ParserAgent (BatchRun has already left out
+    the entries it cannot parse, so products stay aligned with the window keys)"""
+    result = parser_agent.run_catalog({'catalog': state['catalog'], 'keys': window_keys(state)})
+    return {'products': result.get('products', []), 'errors': result.get('errors', [])}
+
+def generate_content_batch_node(state: BatchState) -> dict:
+    """Generate content blocks for the whole window in one columnar pass"""
+    result = content_agent.run_batch({'products': state['products']})
+    return {'contents': result.get('contents', []), 'errors': result.get('errors', [])}
+
+def make_faq_batch_node(token_budget: int, use_async: bool = False, manifest: NodeManifest | None = None,
+                        max_concurrency: int = DEFAULT_CONCURRENCY, dedup: CanonicalIndex | None = None):
+    """Generate the FAQs of the whole window before fan-out: with token_budget > 0 in
+    multi-product requests of at most token_budget estimated tokens, else one request per
+    product. Products left without a FAQ fall back to the per-product FAQ node; with a
+    manifest, products whose stored FAQ is still current are left to it as well. Products a
+    resumed run already finished are skipped.
+
+    With a dedup index, only the first product of each content group is requested (and none
+    of a group whose FAQ an earlier window produced); the other members get that FAQ with
+    their own name and price."""
+    def pending(state: BatchState) -> tuple[dict, dict]:
+        """(products to request by id, content group by product id when deduplicating)"""
+        products, groups, requested, store = {}, {}, set(), get_run_store()
+        keys = window_keys(state)
+        for index, product in enumerate(state.get('products', [])):
+            key = keys[index]
+            if store and store.is_done(key):
+                continue
+            if manifest and manifest.prepare("generate_faq", faq_agent, {'key': key, 'product_a': product})[2] is not None:
+                continue
+            product_id = f"P{index + 1}"
+            if dedup:
+                group = groups[product_id] = dedup.group(product)
+                if group.source is not None or group.key in requested:
+                    continue
+                requested.add(group.key)
+            products[product_id] = product
+        return products, groups
+
+    def report(state: BatchState, faqs: dict, groups: dict) -> dict:
+        products, keys = state.get('products', []), window_keys(state)
+        if dedup:
+            # FAQs by group: this window's, then those read back from the sink once per window
+            shared = {}
+            for product_id, faq in faqs.items():
+                if faq:
+                    dedup.publish(groups[product_id], keys[int(product_id[1:]) - 1])
+                    shared[groups[product_id].key] = faq
+            for product_id, group in groups.items():
+                if product_id in faqs or group.source is None:
+                    continue
+                if group.key not in shared:
+                    shared[group.key] = get_sink().read('faq', group.source)
+                    if shared[group.key] is None:
+                        dedup.publish(group, None)
+                if shared[group.key]:
+                    product = products[int(product_id[1:]) - 1]
+                    faq = dedup.reuse(group, shared[group.key], product)
+                    if faq is not None:
+                        faqs[product_id] = faq
+        return {'faqs': [faqs.get(f"P{index + 1}", {}) for index in range(len(products))]}
+
+    def faq_batch_node(state: BatchState) -> dict:
+        products, groups = pending(state)
+        if token_budget > 0:
+            faqs, _ = faq_agent.generate_many(products, token_budget, max_concurrency)
+        else:
+            faqs, _ = faq_agent.generate_each(products, max_concurrency) if products else ({}, {})
+        return report(state, faqs, groups)
+
+    async def afaq_batch_node(state: BatchState) -> dict:
+        products, groups = pending(state)
+        if token_budget > 0:
+            faqs, _ = await faq_agent.agenerate_many(products, token_budget)
+        else:
+            faqs, _ = await faq_agent.agenerate_each(products) if products else ({}, {})
+        return report(state, faqs, groups)
+
+    return afaq_batch_node if use_async else faq_batch_node
+
+def product_key(name: str, occurrence: int = 1) -> str:
+    """Output, manifest and checkpoint key of a product: the slug of its name, wherever it sits in
+    the catalog; later products of a run with the same slug get --2, --3, ... (slugs never hold '--')"""
+    slug = slugify(str(name))
+    return slug if occurrence == 1 else f"{slug}--{occurrence}"
+
+def pair_key(key_a: str, key_b: str) -> str:
+    """Key of the comparison of two products, from their product keys"""
+    return f"{key_a}__vs__{key_b}"
+
+def make_compare_matrix_node(token_budget: int, use_async: bool = False, manifest: NodeManifest | None = None,
+                             max_concurrency: int = DEFAULT_CONCURRENCY):
+    """Compare every pair of the window with ComparisonMatrixAgent: products profiled once,
+    differences computed locally and narratives requested for several pairs at a time, up to
+    token_budget estimated tokens per request. Pairs left without a comparison fall back to the
+    per-pair compare node; with a manifest, pairs whose stored comparison is still current
+    are reused. Pairs a resumed run already finished are skipped."""
+    def pending(state: BatchState) -> tuple[list, dict, list]:
+        """(product pool, pairs to compare by id, reports of reused pairs)"""
+        pool, keys = state.get('partners', []) + state.get('products', []), state.get('keys', [])
+        pairs, reused, store = {}, [], get_run_store()
+        for index, (index_a, index_b) in enumerate(state.get('pairs', [])):
+            key = pair_key(keys[index_a], keys[index_b])
+            if store and store.is_done(key):
+                continue
+            pair_state = {'key': key, 'product_a': pool[index_a], 'product_b': pool[index_b]}
+            if manifest:
+                item, _, stored = manifest.prepare("compare_matrix", matrix_agent, pair_state)
+                if stored is not None:
+                    manifest.note(True, "compare_matrix", item)
+                    reused.append((index, key, stored['comparison']))
+                    continue
+            pairs[f"C{index + 1}"] = (index_a, index_b)
+        return pool, pairs, reused
+
+    def report(state: BatchState, pool: list, pairs: dict, pages: dict, reused: list) -> dict:
+        sink, keys = get_sink(), state.get('keys', [])
+        comparisons, compared = [], []
+        for comparison_id, page in pages.items():
+            index_a, index_b = pairs[comparison_id]
+            product_a, product_b, key = pool[index_a], pool[index_b], pair_key(keys[index_a], keys[index_b])
+            sink.write('comparison_page', page, key)
+            if manifest:
+                pair_state = {'key': key, 'product_a': product_a, 'product_b': product_b}
+                item, node_fingerprint, _ = manifest.prepare("compare_matrix", matrix_agent, pair_state)
+                manifest.note(False, "compare_matrix", item)
+                manifest.record("compare_matrix", item, node_fingerprint, {'comparison': page})
+            comparisons.append(page)
+            # Comparison ids are C<pair index + 1>
+            compared.append(int(comparison_id[1:]) - 1)
+        for index, key, page in reused:
+            sink.write('comparison_page', page, key)
+            comparisons.append(page)
+            compared.append(index)
+        return {'comparisons': comparisons, 'compared': sorted(compared)}
+
+    def compare_matrix_node(state: BatchState) -> dict:
+        pool, pairs, reused = pending(state)
+        pages, _ = matrix_agent.compare_many(pool, pairs, token_budget, max_concurrency) if pairs else ({}, {})
+        return report(state, pool, pairs, pages, reused)
+
+    async def acompare_matrix_node(state: BatchState) -> dict:
+        pool, pairs, reused = pending(state)
+        pages, _ = await matrix_agent.acompare_many(pool, pairs, token_budget) if pairs else ({}, {})
+        return report(state, pool, pairs, pages, reused)
+
+    return acompare_matrix_node if use_async else compare_matrix_node
+
+def window_keys(state: BatchState) -> list:
+    """Keys of the window's products (state['keys'] lists the partners' keys first)"""
+    return state.get('keys', [])[len(state.get('partners', [])):]
+
+def fan_out(state: BatchState) -> list:
+    """Conditional edge: one Send per product subgraph and one per requested pair that the
+    comparison matrix (if any) has not compared; items a resumed run already finished are skipped.
+
+    Pair indices refer to partners followed by this window's products.
+    """
+    products, keys = state.get('products', []), state.get('keys', [])
+    contents = state.get('contents') or [{}] * len(products)
+    faqs = state.get('faqs') or [{}] * len(products)
+    store = get_run_store()
+    sends = []
+    for key, product, content, faq in zip(window_keys(state), products, contents, faqs):
+        if store and store.skip(key):
+            continue
+        sends.append(Send("product_pipeline", {'key': key, 'product_a': product, 'content_a': content, 'faq_a': faq}))
+    pool = state.get('partners', []) + products
+    compared = set(state.get('compared') or ())
+    for index, (index_a, index_b) in enumerate(state.get('pairs', [])):
+        if index in compared:
+            continue
+        product_a, product_b = pool[index_a], pool[index_b]
+        key = pair_key(keys[index_a], keys[index_b])
+        if store and store.skip(key):
+            continue
+        sends.append(Send("compare_pair", {'key': key, 'product_a': product_a, 'product_b': product_b}))
+    return sends or [Send("collect", {})]
+
+def _product_report(key: str, result: ProductState) -> dict:
+    if result.get('error'):
+        return {'errors': [{'key': key, 'error': result['error']}]}
+    return {'pages': [result.get('product_page', {})]}
+
+def _render_request(pool: WorkerPool):
+    """Send the fields the worker-side CPU stages need to the pool as soon as the FAQ is done"""
+    def report(key: str, result: ProductState) -> dict:
+        if result.get('error'):
+            return {'errors': [{'key': key, 'error': result['error']}]}
+        pool.submit({'key': key, 'product': result['product_a'], 'faq': result.get('faq_a') or {}},
+                    get_sink().format)
+        return {'renders': [key]}
+    return report
+
+def make_product_pipeline_node(product_graph, use_async: bool = False, pool: WorkerPool | None = None):
+    """Wrap the compiled per-product subgraph as a batch node that reports into BatchState"""
+    report = _render_request(pool) if pool else _product_report
+
+    def product_pipeline_node(state: ProductState) -> dict:
+        return report(state['key'], product_graph.invoke(state))
+
+    async def aproduct_pipeline_node(state: ProductState) -> dict:
+        return report(state['key'], await product_graph.ainvoke(state))
+
+    return aproduct_pipeline_node if use_async else product_pipeline_node
+
+def _pair_report(key: str, result: PairState) -> dict:
+    if result.get('error'):
+        return {'errors': [{'key': key, 'error': result['error']}]}
+    return {'comparisons': [result.get('comparison', {})]}
+
+def make_compare_node(compare):
+    """Compare one pair with compare (ComparisonAgent.run, or arun for an async node) and write
+    it to the output sink"""
+    def compare_pair(state: PairState) -> dict:
+        return _write_comparison(state, compare(state))
+
+    async def acompare_pair(state: PairState) -> dict:
+        return _write_comparison(state, await compare(state))
+
+    return acompare_pair if inspect.iscoroutinefunction(compare) else compare_pair
+
+def _write_comparison(state: PairState, update: dict) -> dict:
+    if update.get('comparison'):
+        get_sink().write('comparison_page', update['comparison'], state['key'])
+    return update
+
+def make_compare_step(manifest: NodeManifest | None = None, use_async: bool = False):
+    """Comparison of one pair whose agent call the manifest skips when its inputs are unchanged"""
+    return make_compare_node(_agent_call(manifest, "compare_products",
+                                         compare_agent.arun if use_async else compare_agent.run, compare_agent))
+
+def make_compare_pair_node(compare_step, use_async: bool = False):
+    """Wrap the (possibly incremental) comparison step as a batch node that reports into BatchState"""
+    def compare_pair_node(state: PairState) -> dict:
+        return _pair_report(state['key'], compare_step(state))
+
+    async def acompare_pair_node(state: PairState) -> dict:
+        return _pair_report(state['key'], await compare_step(state))
+
+    return acompare_pair_node if use_async else compare_pair_node
+
+def _rendered_report(rendered: list) -> dict:
+    sink = get_sink()
+    pages, errors = [], []
+    for key, payload, error in rendered:
+        if error:
+            errors.append({'key': key, 'error': error})
+        elif payload:
+            sink.write_encoded('product_page', payload, key)
+            pages.append(key)
+    return {'pages': pages, 'errors': errors}
+
+def make_render_pages_node(pool: WorkerPool, use_async: bool = False):
+    """Wait for the pages of every product the window submitted to the worker pool (content
+    blocks, page assembly and serialization run there); the encoded pages are written to the output sink here"""
+    def render_pages_node(state: BatchState) -> dict:
+        return _rendered_report(pool.collect(get_sink().format)) if state.get('renders') else {}
+
+    async def arender_pages_node(state: BatchState) -> dict:
+        return _rendered_report(await pool.acollect(get_sink().format)) if state.get('renders') else {}
+
+    return arender_pages_node if use_async else render_pages_node
+
+def collect_node(state: BatchState) -> dict:
+    """Join point for all product and pair branches"""
+    return {}
+
+
+def build_batch_graph(use_async: bool = False, manifest: NodeManifest | None = None,
+                      faq_batch_tokens: int = 0, max_concurrency: int = DEFAULT_CONCURRENCY,
+                      pool: WorkerPool | None = None, compare_batch_tokens: int = 0,
+                      dedup: CanonicalIndex | None = None) -> StateGraph:
+    """use_async runs the LLM nodes on the event loop (execute with ainvoke);
+    a manifest skips per-product and per-pair nodes whose inputs are unchanged;
+    faq_batch_tokens > 0 packs several products into each FAQ request before fan-out;
+    a dedup index generates the FAQs before fan-out once per group of products with the same content;
+    compare_batch_tokens > 0 compares the window's pairs with the comparison matrix before fan-out;
+    a worker pool renders content blocks and pages in other processes as each product's FAQ is done"""
+    logger.info("Building LangGraph batch pipeline with per-product fan-out...")
+
+    product_graph = build_product_graph(use_async, manifest, pool is not None).compile()
+    compare_step = make_compare_step(manifest, use_async)
+    graph = StateGraph(BatchState)
+    graph.add_node("parse_catalog", traced("parse_catalog", parse_catalog_node))
+    graph.add_node("product_pipeline", traced("product_pipeline",
+                                              make_product_pipeline_node(product_graph, use_async, pool)))
+    graph.add_node("compare_pair", traced("compare_pair", make_compare_pair_node(compare_step, use_async)))
+    graph.add_node("collect", traced("collect", collect_node))
+
+    graph.add_edge(START, "parse_catalog")
+    fan_out_source = "parse_catalog"
+    if pool is None:
+        # With a worker pool the content blocks are built next to the page assembly instead
+        graph.add_node("generate_content_batch", traced("generate_content_batch", generate_content_batch_node))
+        graph.add_edge("parse_catalog", "generate_content_batch")
+        fan_out_source = "generate_content_batch"
+    if faq_batch_tokens > 0 or dedup is not None:
+        graph.add_node("generate_faq_batch", traced("generate_faq_batch", make_faq_batch_node(
+            faq_batch_tokens, use_async, manifest, max_concurrency, dedup)))
+        graph.add_edge(fan_out_source, "generate_faq_batch")
+        fan_out_source = "generate_faq_batch"
+    if compare_batch_tokens > 0:
+        graph.add_node("compare_matrix", traced("compare_matrix", make_compare_matrix_node(
+            compare_batch_tokens, use_async, manifest, max_concurrency)))
+        graph.add_edge(fan_out_source, "compare_matrix")
+        fan_out_source = "compare_matrix"
+    graph.add_conditional_edges(fan_out_source, fan_out, ["product_pipeline", "compare_pair", "collect"])
+    if pool is None:
+        graph.add_edge("product_pipeline", "collect")
+        graph.add_edge("compare_pair", "collect")
+    else:
+        graph.add_node("render_pages", traced("render_pages", make_render_pages_node(pool, use_async)))
+        graph.add_edge("product_pipeline", "render_pages")
+        graph.add_edge("compare_pair", "render_pages")
+        graph.add_edge("render_pages", "collect")
+    graph.add_edge("collect", END)
+    observe_graph("batch", graph)
+    return graph
+
+
+DEFAULT_WINDOW_SIZE = 64
+
+
+class BatchRun:
+    """Feeds a lazily-read product stream through the compiled batch graph window by window.
+
+    Only the current window, the products still referenced by pending pairs, a count per
+    product name (so repeated names get distinct keys) and the result counters are kept in
+    memory, so peak memory grows with the distinct names at most, not with the products.
+    """
+
+    def __init__(self, products, pairs_spec=None, category_key: str = "category",
+                 window_size: int = DEFAULT_WINDOW_SIZE):
+        self.products = products
+        self.window_size = window_size
+        self.planner = PairPlanner(pairs_spec, category_key)
+        self.summary = {'products': 0, 'pages': 0, 'comparisons': 0, 'errors': []}
+        self.occurrences = {}
+        self.keys = {}
+
+    def key(self, product_dict) -> str:
+        """Key of the next catalog entry; the same in every run whatever the entry's position"""
+        name = product_dict.get("product_name", "")
+        occurrence = self.occurrences[name] = self.occurrences.get(name, 0) + 1
+        return product_key(name, occurrence)
+
+    def windows(self):
+        """Initial BatchState for each window of the stream; entries that are not JSON objects
+        are reported as errors and left out"""
+        for window in iter_windows(self.products, self.window_size):
+            offset = self.planner.position
+            entries = [position for position, entry in enumerate(window, offset) if is_product_entry(entry)]
+            invalid = [{'key': f"entry-{position}", 'error': f"Catalog entry {position} is not a JSON object"}
+                       for position, entry in enumerate(window, offset) if not is_product_entry(entry)]
+            self.keys.update((position, self.key(window[position - offset])) for position in entries)
+            partner_positions, pairs = self.planner.plan(window)
+            positions = partner_positions + entries
+            pool_index = {position: index for index, position in enumerate(positions)}
+            keys = [self.keys[position] for position in positions]
+            if self.planner.pairs_spec == ALL_PAIRS_IN_CATEGORY:
+                # Category pairs have no order of their own; key order keeps their keys when the catalog is reordered
+                pairs = [(a, b) if self.keys[a] <= self.keys[b] else (b, a) for a, b in pairs]
+            # Keys of products a later pair can still refer to
+            self.keys = {position: key for position, key in self.keys.items() if position in self.planner.retained}
+            yield {
+                'catalog': [window[position - offset] for position in entries],
+                'keys': keys,
+                'partners': [parser_agent.parse(self.planner.retained[position]) for position in partner_positions],
+                'pairs': [(pool_index[a], pool_index[b]) for a, b in pairs],
+                'products': [],
+                'contents': [],
+                'faqs': [],
+                'compared': [],
+                'renders': [],
+                'pages': [],
+                'comparisons': [],
+                'errors': invalid
+            }
+
+    def absorb(self, final_state: BatchState) -> None:
+        """Fold one window's results into the running summary and drop them"""
+        self.summary['products'] += len(final_state['catalog'])
+        self.summary['pages'] += len(final_state['pages'])
+        self.summary['comparisons'] += len(final_state['comparisons'])
+        self.summary['errors'].extend(final_state['errors'])
+        if get_run_store():
+            self.checkpoint(final_state)
+        logger.info(f"Window done: {self.summary['products']} products processed so far")
+
+    def checkpoint(self, final_state: BatchState) -> None:
+        """Flush the window's outputs, then mark its products and pairs done or failed"""
+        store = get_run_store()
+        keys = final_state['keys']
+        items = window_keys(final_state)
+        items += [pair_key(keys[index_a], keys[index_b]) for index_a, index_b in final_state['pairs']]
+        failed = {error['key']: error['error'] for error in final_state['errors']}
+        get_sink().flush()
+        store.record([item for item in items if item not in failed and not store.is_done(item)],
+                     {item: failed[item] for item in items if item in failed})
+
+    def finish(self) -> dict:
+        for first, second in self.planner.unresolved():
+            self.summary['errors'].append({'key': f"{first}__vs__{second}",
+                                           'error': f"Unknown product in pair ({first}, {second})"})
+        logger.info(f"Batch finished: {self.summary['pages']} pages, {self.summary['comparisons']} comparisons, "
+                    f"{len(self.summary['errors'])} errors")
+        return self.summary
+
+
+def run_batch(products, pairs_spec=None, category_key: str = "category",
+              max_concurrency: int = DEFAULT_CONCURRENCY, manifest: NodeManifest | None = None,
+              window_size: int = DEFAULT_WINDOW_SIZE, faq_batch_tokens: int = 0,
+              compare_batch_tokens: int = 0) -> dict:
+    """Run the batch graph over a product iterable (list or lazy stream), one window at a time"""
+    compiled_graph = build_batch_graph(manifest=manifest, faq_batch_tokens=faq_batch_tokens,
+                                       max_concurrency=max_concurrency, pool=get_pool(),
+                                       compare_batch_tokens=compare_batch_tokens, dedup=get_dedup_index()).compile()
+    batch_run = BatchRun(products, pairs_spec, category_key, window_size)
+
+    logger.info(f"Executing batch pipeline: window {window_size}, concurrency {max_concurrency}")
+    for initial_state in batch_run.windows():
+        batch_run.absorb(compiled_graph.invoke(initial_state, config={'max_concurrency': max_concurrency}))
+    return batch_run.finish()
+
+
+async def run_batch_async(products, pairs_spec=None, category_key: str = "category",
+                          max_concurrency: int = DEFAULT_CONCURRENCY,
+                          manifest: NodeManifest | None = None,
+                          window_size: int = DEFAULT_WINDOW_SIZE, faq_batch_tokens: int = 0,
+                          compare_batch_tokens: int = 0) -> dict:
+    """Async batch run: every FAQ and comparison call of a window overlaps on the current event loop"""
+    compiled_graph = build_batch_graph(use_async=True, manifest=manifest, faq_batch_tokens=faq_batch_tokens,
+                                       pool=get_pool(), compare_batch_tokens=compare_batch_tokens,
+                                       dedup=get_dedup_index()).compile()
+    batch_run = BatchRun(products, pairs_spec, category_key, window_size)
+
+    logger.info(f"Executing async batch pipeline: window {window_size}, concurrency {max_concurrency}")
+    for initial_state in batch_run.windows():
+        batch_run.absorb(await compiled_graph.ainvoke(initial_state, config={'max_concurrency': max_concurrency}))
+    return batch_run.finish()
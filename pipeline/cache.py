@@ -0,0 +1,140 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger()
+
+DEFAULT_CACHE_PATH = os.path.join('output', '.cache', 'llm_responses.sqlite')
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_AGE_DAYS = 30
+EVICT_EVERY = 500
+
+
+def cache_key(prompt_text: str, model: str, temperature: float, prompt_version: str) -> str:
+    """Content address of one LLM call: everything that determines its response"""
+    digest = hashlib.sha256()
+    for part in (prompt_version, model, repr(temperature), prompt_text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Persistent SQLite cache of raw LLM response text keyed by cache_key"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS, refresh: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, content TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key: str) -> str | None:
+        """Cached response text, or None on a miss (always a miss in refresh mode)"""
+        with self._lock:
+            if self.refresh:
+                self.misses += 1
+                return None
+            row = self._conn.execute(
+                "SELECT content, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        """Store a response; periodically evicts expired and least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            self._conn.commit()
+            self.writes += 1
+            due = self.writes % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def discard(self, key: str) -> None:
+        """Forget one response, e.g. one that turned out to be unusable"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Drop entries older than max_age, then the least recently used beyond max_entries"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,)
+            ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._conn.commit()
+        if removed:
+            logger.info(f"LLM cache evicted {removed} entries")
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Process-wide cache used by pipeline.llm; None disables caching
+_cache: ResponseCache | None = None
+
+
+def configure_cache(enabled: bool = True, refresh: bool = False, path: str = DEFAULT_CACHE_PATH,
+                    max_entries: int = DEFAULT_MAX_ENTRIES,
+                    max_age_days: float = DEFAULT_MAX_AGE_DAYS) -> ResponseCache | None:
+    """Install (or disable) the process-wide response cache"""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = ResponseCache(path, max_entries, max_age_days, refresh) if enabled else None
+    return _cache
+
+
+def get_cache() -> ResponseCache | None:
+    return _cache
+
+
+def log_cache_stats() -> None:
+    if _cache is not None:
+        stats = _cache.stats()
+        logger.info(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, "
+                    f"{stats['writes']} writes (hit rate {stats['hit_rate']:.0%})")
@@ -0,0 +1,211 @@
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger()
+
+# Fields that decide a product's FAQ apart from its name and price
+CONTENT_FIELDS = ('concentration', 'skin_type', 'ingredients', 'benefits', 'use', 'side_effects')
+TEXT_FIELDS = ('use', 'side_effects')
+
+# Word-trigram Jaccard similarity of the text fields above which two products count as one
+DEFAULT_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+# Groups remembered across windows; the least recently used are forgotten first
+MAX_GROUPS = 100_000
+
+_WORD = re.compile(r"[a-z0-9%.]+")
+_DIGITS = re.compile(r"\d+")
+# British and American spellings that listings of the same product mix
+_SPELLINGS = {'moisturiser': 'moisturizer', 'moisturise': 'moisturize', 'colour': 'color'}
+
+
+def normalize_text(text: str, name: str = "") -> str:
+    """Lowercase words of text with punctuation, spacing and spelling variants evened out and
+    the product's own name left out"""
+    text = str(text).lower()
+    if name:
+        text = text.replace(name.lower(), " ")
+    return " ".join(_SPELLINGS.get(word, word) for word in _WORD.findall(text))
+
+
+def _normalize_list(values) -> tuple:
+    return tuple(sorted(normalize_text(value) for value in values or ()))
+
+
+def shingles(text: str) -> frozenset:
+    """Word trigrams of normalized text (the words themselves for very short texts)"""
+    words = text.split()
+    if len(words) < SHINGLE_SIZE:
+        return frozenset(words)
+    return frozenset(" ".join(words[index:index + SHINGLE_SIZE]) for index in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+
+class Group:
+    """Products sharing one FAQ: the representative it is generated for, and the output key its
+    FAQ was written under once known (the FAQ itself stays in the output sink)"""
+    __slots__ = ('key', 'bucket', 'name', 'price', 'texts', 'source', 'members')
+
+    def __init__(self, key: str, bucket: str, product, texts: dict):
+        self.key = key
+        self.bucket = bucket
+        self.name = product['name']
+        self.price = product['price']
+        self.texts = texts
+        self.source = None
+        self.members = 0
+
+
+def _mention(old: str, flags=0) -> re.Pattern:
+    return re.compile(rf"(?<!\w){re.escape(old)}(?!\w)", flags)
+
+
+def _replace(text: str, old: str, new: str) -> str:
+    if not old or old == new:
+        return text
+    return _mention(old).sub(lambda _: new, text)
+
+
+def _still_mentions(text: str, old: str, new: str) -> bool:
+    """Whether text still mentions old in any case once new (which may contain old, as a
+    variant's name contains its base name) is left out"""
+    if not old or old.lower() == new.lower():
+        return False
+    return _mention(old, re.IGNORECASE).search(text.replace(new, " ") if new else text) is not None
+
+
+def respecialize(faq: dict, group: Group, product) -> dict | None:
+    """The group's FAQ with the representative's name and price replaced by product's, or None
+    if the representative is still mentioned afterwards (a differently cased name, a price
+    written without its currency), so that product gets a FAQ of its own"""
+    if product['name'] == group.name and product['price'] == group.price:
+        return faq
+
+    def specialize(text):
+        return _replace(_replace(text, group.name, product['name']), group.price, product['price'])
+
+    items = [{**item, 'Question': specialize(item['Question']), 'Answer': specialize(item['Answer'])}
+             for item in faq.get('FAQs', [])]
+    old_digits, new_digits = "".join(_DIGITS.findall(group.price)), "".join(_DIGITS.findall(product['price']))
+    for item in items:
+        for text in (item['Question'], item['Answer']):
+            if _still_mentions(text, group.name, product['name']) or \
+                    _still_mentions(text, group.price, product['price']) or \
+                    _still_mentions(text.replace(product['name'], " ").replace(product['price'], " "),
+                                    old_digits, new_digits):
+                return None
+    return {**faq, 'FAQs': items}
+
+
+class CanonicalIndex:
+    """Groups products whose FAQ would be the same: identical normalized content fields
+    (exact match by hash), or identical structured fields and usage / side-effect texts
+    whose word-trigram similarity reaches threshold (near duplicates, e.g. regional listings
+    with reworded instructions). Names and prices never count, so sizes, bundles and regional
+    variants of a product share one FAQ, generated for the group's first product and
+    re-specialized to each member's name and price. Only the representative's output key is
+    kept per group; members of later windows read its FAQ back from the output sink.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, max_groups: int = MAX_GROUPS):
+        self.threshold = threshold
+        self.max_groups = max_groups
+        self.groups = OrderedDict()
+        self.buckets = {}
+        self.counts = {'products': 0, 'groups': 0, 'exact': 0, 'near': 0, 'reused': 0, 'not_reused': 0}
+        self._lock = threading.Lock()
+
+    def group(self, product) -> Group:
+        """The group of product, created with product as its representative if it has none"""
+        name = product['name']
+        texts = {field: normalize_text(product[field], name) for field in TEXT_FIELDS}
+        structured = (normalize_text(product['concentration']), _normalize_list(product['skin_type']),
+                      _normalize_list(product['ingredients']), _normalize_list(product['benefits']))
+        key = _digest(structured, texts['use'], texts['side_effects'])
+        bucket = _digest(structured)
+        with self._lock:
+            self.counts['products'] += 1
+            group = self.groups.get(key)
+            if group is not None:
+                self.counts['exact'] += 1
+            else:
+                group = self._near(bucket, texts)
+            if group is None:
+                group = Group(key, bucket, product, {field: shingles(text) for field, text in texts.items()})
+                self._add(group)
+            self.groups.move_to_end(group.key)
+            group.members += 1
+            return group
+
+    def _near(self, bucket: str, texts: dict) -> Group | None:
+        candidates = self.buckets.get(bucket, ())
+        if not candidates:
+            return None
+        product_shingles = {field: shingles(text) for field, text in texts.items()}
+        for key in candidates:
+            group = self.groups[key]
+            if all(similarity(product_shingles[field], group.texts[field]) >= self.threshold for field in TEXT_FIELDS):
+                self.counts['near'] += 1
+                return group
+        return None
+
+    def _add(self, group: Group) -> None:
+        self.groups[group.key] = group
+        self.buckets.setdefault(group.bucket, []).append(group.key)
+        self.counts['groups'] += 1
+        while len(self.groups) > self.max_groups:
+            _, oldest = self.groups.popitem(last=False)
+            keys = self.buckets[oldest.bucket]
+            keys.remove(oldest.key)
+            if not keys:
+                del self.buckets[oldest.bucket]
+
+    def publish(self, group: Group, key: str | None) -> None:
+        """Remember the output key the group's FAQ was written under; None when it can no longer
+        be read, so the group's next product is requested again"""
+        group.source = key
+
+    def reuse(self, group: Group, faq: dict, product) -> dict | None:
+        """The group's FAQ specialized to product, counted as an avoided FAQ call; None if it
+        cannot be specialized (see respecialize) and product needs its own request"""
+        specialized = respecialize(faq, group, product)
+        with self._lock:
+            self.counts['reused' if specialized is not None else 'not_reused'] += 1
+        return specialized
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+# Process-wide index; None (the default) disables FAQ deduplication
+_index: CanonicalIndex | None = None
+
+
+def configure_dedup(enabled: bool = False, threshold: float = DEFAULT_THRESHOLD) -> CanonicalIndex | None:
+    global _index
+    _index = CanonicalIndex(threshold) if enabled else None
+    return _index
+
+
+def get_dedup_index() -> CanonicalIndex | None:
+    return _index
+
+
+def log_dedup_stats() -> None:
+    if _index is not None:
+        stats = _index.stats()
+        logger.info(f"FAQ dedup: {stats['products']} products in {stats['groups']} content groups "
+                    f"({stats['exact']} exact and {stats['near']} near duplicates), "
+                    f"{stats['reused']} FAQ calls avoided, {stats['not_reused']} shared FAQs that still named "
+                    f"their representative requested again")
@@ -0,0 +1,106 @@
+import json
+import logging
+from itertools import islice
+
+logger = logging.getLogger()
+
+READ_CHUNK_SIZE = 1 << 16
+JSONL_SUFFIXES = ('.jsonl', '.ndjson')
+_DELIMITERS = frozenset(' \t\r\n,]')
+
+
+def iter_jsonl(path: str):
+    """Yield one product per non-empty line of a JSONL file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON line: {e}")
+
+
+def iter_json_array(path: str, chunk_size: int = READ_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array without loading the whole file.
+
+    The file is read in chunks and each element is decoded with raw_decode as soon as it is
+    complete, so memory stays bounded by the largest single element plus one chunk.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    exhausted = False
+    count = 0
+
+    with open(path, 'r', encoding='utf-8') as f:
+        def fill():
+            nonlocal buffer, position, exhausted
+            chunk = f.read(chunk_size)
+            if not chunk:
+                exhausted = True
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or exhausted:
+                    return
+                fill()
+
+        fill()
+        skip_whitespace()
+        if buffer[position:position + 1] != '[':
+            raise ValueError(f"{path}: expected a JSON array of products")
+        position += 1
+
+        while True:
+            skip_whitespace()
+            if position >= len(buffer):
+                raise ValueError(f"{path}: unterminated JSON array")
+            if buffer[position] == ']':
+                return
+            if count:
+                if buffer[position] != ',':
+                    raise ValueError(f"{path}: expected ',' between products")
+                position += 1
+                skip_whitespace()
+
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                    # A number cut at the chunk boundary ("2" of "2.5") still decodes; only trust
+                    # an element once it is followed by a delimiter
+                    if end < len(buffer) and buffer[end] in _DELIMITERS:
+                        break
+                    if exhausted:
+                        raise ValueError(f"{path}: invalid JSON element in array")
+                    raise json.JSONDecodeError("element not terminated yet", buffer, end)
+                except json.JSONDecodeError:
+                    if exhausted:
+                        raise ValueError(f"{path}: invalid JSON element in array")
+                    fill()
+            position = end
+            count += 1
+            yield element
+
+
+def iter_products(path: str):
+    """Lazily yield raw product dicts from a JSONL file or a (possibly huge) JSON array"""
+    if path.endswith(JSONL_SUFFIXES):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def iter_windows(products, size: int):
+    """Group a product stream into lists of at most size products"""
+    products = iter(products)
+    while True:
+        window = list(islice(products, size))
+        if not window:
+            return
+        yield window
@@ -0,0 +1,144 @@
+import json
+from typing import TYPE_CHECKING
+
+from pipeline.tracing import DEFAULT_PROFILE_PATH, longest_path
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
+# Keys any node may write (the first error wins) that never order nodes
+UNORDERED_KEYS = frozenset({'error'})
+
+
+class Dataflow:
+    """Graph nodes declared with the state keys they read and write.
+
+    Edges are derived rather than wired by hand: a node runs after the nodes that write any
+    key it reads, so nodes without a data dependency (e.g. FAQ and comparison) run in the
+    same step. A node with several producers gets one join edge and runs once, after all of
+    them. Agent nodes take their keys from the agent's READS/WRITES.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, name: str, fn, agent=None, reads: tuple | None = None, writes: tuple | None = None) -> None:
+        reads = getattr(agent, 'READS', ()) if reads is None else reads
+        writes = getattr(agent, 'WRITES', ()) if writes is None else writes
+        self.nodes[name] = {'fn': fn, 'agent': agent, 'reads': tuple(reads), 'writes': tuple(writes)}
+
+    def producers(self) -> dict:
+        """key -> the node writing it; raises ValueError if two nodes write the same key"""
+        producers = {}
+        for name, spec in self.nodes.items():
+            for key in spec['writes']:
+                if key in UNORDERED_KEYS:
+                    continue
+                if key in producers:
+                    raise ValueError(f"State key {key!r} is written by both {producers[key]} and {name}")
+                producers[key] = name
+        return producers
+
+    def dependencies(self) -> dict:
+        """node -> {producer node: keys read from it}, without producers already implied by
+        another dependency (transitive reduction); raises ValueError on a cycle"""
+        producers = self.producers()
+        direct = {}
+        for name, spec in self.nodes.items():
+            direct[name] = {}
+            for key in spec['reads']:
+                producer = producers.get(key)
+                # Keys nobody writes come with the initial state
+                if producer is not None and producer != name:
+                    direct[name].setdefault(producer, []).append(key)
+
+        ancestors, visiting = {}, set()
+
+        def upstream(name):
+            if name not in ancestors:
+                if name in visiting:
+                    raise ValueError(f"Cycle in the node dataflow through {name}")
+                visiting.add(name)
+                found = set()
+                for producer in direct[name]:
+                    found |= {producer} | upstream(producer)
+                visiting.discard(name)
+                ancestors[name] = found
+            return ancestors[name]
+
+        for name in direct:
+            upstream(name)
+        return {
+            name: {producer: keys for producer, keys in sources.items()
+                   if not any(producer in ancestors[other] for other in sources if other != producer)}
+            for name, sources in direct.items()
+        }
+
+    def successors(self, dependencies: dict | None = None) -> dict:
+        """node -> nodes that wait for it, with START and END included"""
+        from langgraph.graph import START, END
+        dependencies = self.dependencies() if dependencies is None else dependencies
+        successors = {name: set() for name in self.nodes}
+        successors[START] = set()
+        for name, sources in dependencies.items():
+            for source in sources or (START,):
+                successors[source].add(name)
+        for name in self.nodes:
+            if not successors[name]:
+                successors[name].add(END)
+        return successors
+
+    def build(self, state_schema) -> "StateGraph":
+        """StateGraph with the declared nodes and the derived edges"""
+        from langgraph.graph import StateGraph, START, END
+        graph = StateGraph(state_schema)
+        dependencies = self.dependencies()
+        for name, spec in self.nodes.items():
+            graph.add_node(name, spec['fn'])
+        for name, sources in dependencies.items():
+            if not sources:
+                graph.add_edge(START, name)
+            elif len(sources) == 1:
+                graph.add_edge(next(iter(sources)), name)
+            else:
+                # Join edge: the node runs once, after every producer has finished
+                graph.add_edge(sorted(sources), name)
+        for name, targets in self.successors(dependencies).items():
+            if END in targets:
+                graph.add_edge(name, END)
+        return graph
+
+    def estimated_weights(self, profile_path: str = DEFAULT_PROFILE_PATH) -> tuple[dict, str]:
+        """(node -> weight, unit): the slowest run of each node from an earlier --profile run
+        if its profile exists, else one per LLM-calling agent node"""
+        try:
+            with open(profile_path, 'r', encoding='utf-8') as f:
+                nodes = json.load(f)['nodes']
+            if any(name in nodes for name in self.nodes):
+                return {name: nodes[name]['max_s'] for name in self.nodes if name in nodes}, f"s, from {profile_path}"
+        except (OSError, ValueError, KeyError):
+            pass
+        return {name: 1.0 for name, spec in self.nodes.items() if hasattr(spec['agent'], 'PROMPT_VERSION')}, \
+            "LLM calls"
+
+    def describe(self, title: str, profile_path: str = DEFAULT_PROFILE_PATH) -> str:
+        """Text report of the derived dependencies, the parallel steps and the critical path"""
+        dependencies = self.dependencies()
+        lines = [f"{title} DAG (derived from node reads/writes):"]
+        for name, sources in dependencies.items():
+            after = ", ".join(f"{source} ({', '.join(keys)})" for source, keys in sources.items()) or "START"
+            lines.append(f"  {name} <- {after}")
+
+        steps, placed = [], set()
+        while len(placed) < len(dependencies):
+            ready = [name for name, sources in dependencies.items()
+                     if name not in placed and set(sources) <= placed]
+            steps.append(ready)
+            placed.update(ready)
+        lines.append("Steps (nodes in a step run concurrently):")
+        lines.extend(f"  {index}: {', '.join(step)}" for index, step in enumerate(steps, 1))
+
+        weights, unit = self.estimated_weights(profile_path)
+        path = longest_path(self.successors(dependencies), weights)
+        lines.append(f"Critical path: {' -> '.join(path['nodes'])} = {path['seconds']:g} ({unit})")
+        return "\n".join(lines)
@@ -0,0 +1,240 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+from pipeline.cache import get_cache, cache_key
+from pipeline.scheduler import get_scheduler, PRIORITY_FAQ
+from pipeline import tracing
+
+logger = logging.getLogger()
+
+MODEL_NAME = "mistral-large-latest"
+TEMPERATURE = 0.4
+DEFAULT_BASE_URL = "https://api.mistral.ai/v1"
+MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "64"))
+REQUEST_TIMEOUT = 120
+CHARS_PER_TOKEN = 4
+# Completion tokens assumed per request when budgeting tokens-per-minute before the real usage is known
+EXPECTED_OUTPUT_TOKENS = 1000
+
+# Process-wide clients, one per (model, temperature)
+_clients = {}
+_clients_lock = threading.Lock()
+_sync_slots = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+_async_slots = weakref.WeakKeyDictionary()
+# Chat models whose httpx.AsyncClient belongs to one event loop: {loop: {(model, temperature): model}}
+_async_clients = weakref.WeakKeyDictionary()
+# Optional stand-in for ChatMistralAI, e.g. the offline benchmark's fake model
+_llm_factory = None
+_env_loaded = False
+
+# httpx, langchain_mistralai and langchain_core are imported on the first real LLM call
+# (get_llm / a cache hit), so runs whose LLM nodes skip never pay for them
+
+
+def load_env() -> None:
+    """Load .env into the environment, once per process; variables already set win"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_api_key() -> str | None:
+    """Mistral API key from the environment (or .env)"""
+    load_env()
+    return os.environ.get('MISTRAL_API_KEY')
+
+
+def get_base_url() -> str:
+    load_env()
+    return os.environ.get("MISTRAL_BASE_URL", DEFAULT_BASE_URL)
+
+
+def is_available() -> bool:
+    """True if LLM calls can be made: an API key is set or a model factory is installed (else LLM nodes skip)"""
+    return _llm_factory is not None or bool(get_api_key())
+
+
+def set_llm_factory(factory) -> None:
+    """Build chat models with factory(model, temperature) instead of ChatMistralAI; None restores the default.
+    The factory's models need LangChain's invoke/ainvoke returning an AIMessage."""
+    global _llm_factory
+    with _clients_lock:
+        _llm_factory = factory
+        _clients.clear()
+        _async_clients.clear()
+
+
+def _headers(api_key: str) -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    }
+
+
+def _pool_limits():
+    """Keep-alive pool sized to the in-flight bound so overlapped calls reuse connections"""
+    import httpx
+    return httpx.Limits(max_connections=MAX_IN_FLIGHT, max_keepalive_connections=MAX_IN_FLIGHT, keepalive_expiry=60)
+
+
+def get_llm(model: str = MODEL_NAME, temperature: float = TEMPERATURE):
+    """Shared ChatMistralAI client backed by pooled keep-alive HTTP connections"""
+    key = (model, temperature)
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None and _llm_factory is not None:
+            llm = _clients[key] = _llm_factory(model, temperature)
+        elif llm is None:
+            import httpx
+            from langchain_mistralai import ChatMistralAI
+            api_key = get_api_key()
+            llm = ChatMistralAI(
+                api_key=api_key,
+                model=model,
+                temperature=temperature,
+                max_concurrent_requests=MAX_IN_FLIGHT,
+                client=httpx.Client(base_url=get_base_url(), headers=_headers(api_key),
+                                    timeout=REQUEST_TIMEOUT, limits=_pool_limits()),
+            )
+            _clients[key] = llm
+            logger.info(f"LLM client created for {model} (temperature {temperature})")
+    return llm
+
+
+def _async_llm(model: str, temperature: float, loop: asyncio.AbstractEventLoop):
+    """Shared client for async calls on loop. httpx.AsyncClient is tied to the event loop it
+    first ran on, so each loop gets a copy of the shared client with its own AsyncClient
+    (the sync client is shared); aclose_clients closes them before the loop ends."""
+    llm = get_llm(model, temperature)
+    if _llm_factory is not None:
+        return llm
+    with _clients_lock:
+        bound = _async_clients.setdefault(loop, {})
+        if (model, temperature) not in bound:
+            import httpx
+            async_client = httpx.AsyncClient(base_url=get_base_url(), headers=_headers(get_api_key()),
+                                             timeout=REQUEST_TIMEOUT, limits=_pool_limits())
+            bound[(model, temperature)] = llm.model_copy(update={'async_client': async_client})
+        return bound[(model, temperature)]
+
+
+async def aclose_clients() -> None:
+    """Close the async HTTP clients of the running loop (their pooled connections die with it)"""
+    with _clients_lock:
+        bound = _async_clients.pop(asyncio.get_running_loop(), {})
+    for llm in bound.values():
+        await llm.async_client.aclose()
+
+
+def run(coroutine):
+    """asyncio.run for coroutines that make async LLM calls: the loop's HTTP clients are
+    closed before the loop is"""
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await aclose_clients()
+    return asyncio.run(main())
+
+
+def _async_slots_for(loop: asyncio.AbstractEventLoop) -> asyncio.BoundedSemaphore:
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = _async_slots[loop] = asyncio.BoundedSemaphore(MAX_IN_FLIGHT)
+    return slots
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text, good enough for packing requests into a budget"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _cached(prompt_text: str, model: str, temperature: float, prompt_version: str):
+    """(key, cached AIMessage or None); key is None when caching is disabled"""
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    key = cache_key(prompt_text, model, temperature, prompt_version)
+    content = cache.get(key)
+    if content is None:
+        return key, None
+    from langchain_core.messages import AIMessage
+    return key, AIMessage(content=content, response_metadata={'cache_hit': True})
+
+
+def _remember(key: str | None, response) -> None:
+    if key is not None and isinstance(response.content, str):
+        get_cache().put(key, response.content)
+
+
+def forget(prompt_text: str, prompt_version: str = "1", model: str = MODEL_NAME,
+           temperature: float = TEMPERATURE) -> None:
+    """Drop a cached response the caller could not use, so a retry asks the model again"""
+    cache = get_cache()
+    if cache is not None:
+        cache.discard(cache_key(prompt_text, model, temperature, prompt_version))
+
+
+def _used_tokens(response) -> int | None:
+    usage = getattr(response, 'usage_metadata', None)
+    if not usage:
+        return None
+    tracing.add(tokens_in=usage.get('input_tokens', 0), tokens_out=usage.get('output_tokens', 0))
+    return usage.get('total_tokens')
+
+
+def _cache_hit(response):
+    tracing.add(cache_hits=1)
+    return response
+
+
+def invoke(prompt_text: str, prompt_version: str = "1", model: str = MODEL_NAME,
+           temperature: float = TEMPERATURE, priority: int = PRIORITY_FAQ):
+    """Blocking LLM call through the response cache, the rate-limit scheduler and the shared client"""
+    with tracing.span('llm', 'llm', model=model, priority=priority):
+        key, response = _cached(prompt_text, model, temperature, prompt_version)
+        if response is not None:
+            return _cache_hit(response)
+        
+        from langchain_core.messages import HumanMessage
+        llm = get_llm(model, temperature)
+        scheduler = get_scheduler()
+        cost = estimate_tokens(prompt_text) + EXPECTED_OUTPUT_TOKENS
+        
+        def send():
+            with _sync_slots:
+                return llm.invoke([HumanMessage(content=prompt_text)])
+        
+        response = scheduler.call(send, cost, priority)
+        scheduler.settle(cost, _used_tokens(response))
+        _remember(key, response)
+        return response
+
+
+async def ainvoke(prompt_text: str, prompt_version: str = "1", model: str = MODEL_NAME,
+                  temperature: float = TEMPERATURE, priority: int = PRIORITY_FAQ):
+    """Async LLM call through the response cache, the rate-limit scheduler and the shared client"""
+    with tracing.span('llm', 'llm', model=model, priority=priority):
+        key, response = _cached(prompt_text, model, temperature, prompt_version)
+        if response is not None:
+            return _cache_hit(response)
+        
+        from langchain_core.messages import HumanMessage
+        loop = asyncio.get_running_loop()
+        llm = _async_llm(model, temperature, loop)
+        scheduler = get_scheduler()
+        cost = estimate_tokens(prompt_text) + EXPECTED_OUTPUT_TOKENS
+        
+        async def send():
+            async with _async_slots_for(loop):
+                return await llm.ainvoke([HumanMessage(content=prompt_text)])
+        
+        response = await scheduler.acall(send, cost, priority)
+        scheduler.settle(cost, _used_tokens(response))
+        _remember(key, response)
+        return response
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import logging
+import threading
+import functools
+from collections.abc import Mapping
+
+logger = logging.getLogger()
+
+DEFAULT_MANIFEST_PATH = os.path.join('output', '.manifest.sqlite')
+DEFAULT_REPORT_PATH = os.path.join('output', 'incremental_report.json')
+
+_code_versions = {}
+
+
+def agent_version(agent) -> str:
+    """Agent code version: hash of the agent's source module plus its PROMPT_VERSION, if any"""
+    cls = type(agent)
+    version = _code_versions.get(cls)
+    if version is None:
+        with open(inspect.getsourcefile(cls), 'rb') as f:
+            digest = hashlib.sha256(f.read())
+        digest.update(str(getattr(cls, 'PROMPT_VERSION', '')).encode('utf-8'))
+        version = _code_versions[cls] = digest.hexdigest()[:16]
+    return version
+
+
+def _plain(value):
+    """JSON fallback: Product records hash like the product dicts they replaced"""
+    return value.as_dict() if hasattr(value, 'as_dict') else str(value)
+
+
+def fingerprint(inputs: dict, version: str) -> str:
+    """Stable hash of a node's input keys and the code version that consumes them"""
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=_plain)
+    return hashlib.sha256(f"{version}\0{payload}".encode('utf-8')).hexdigest()
+
+
+def item_key(state: dict) -> str:
+    """Which product (or pair) a node call is about: its artifact key, or the product names in
+    single runs, whose artifacts are not keyed"""
+    if state.get('key'):
+        return state['key']
+    names = [state[k].get('name', '') for k in ('product_a', 'product_b') if isinstance(state.get(k), Mapping)]
+    return " | ".join(names)
+
+
+class NodeManifest:
+    """Persistent record of each node's input fingerprint and the outputs it produced"""
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self.skipped = []
+        self.recomputed = []
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            " node TEXT NOT NULL, item TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+            " outputs TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (node, item))"
+        )
+        self._conn.commit()
+
+    def lookup(self, node: str, item: str, node_fingerprint: str) -> dict | None:
+        """Stored outputs if the node last ran on exactly these inputs, else None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, outputs FROM nodes WHERE node = ? AND item = ?", (node, item)
+            ).fetchone()
+        if row is None or row[0] != node_fingerprint:
+            return None
+        return json.loads(row[1])
+
+    def record(self, node: str, item: str, node_fingerprint: str, outputs: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO nodes (node, item, fingerprint, outputs, updated) VALUES (?, ?, ?, ?, ?)",
+                (node, item, node_fingerprint, json.dumps(outputs, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def note(self, skipped: bool, node: str, item: str) -> None:
+        with self._lock:
+            (self.skipped if skipped else self.recomputed).append({'node': node, 'item': item})
+
+    def report(self) -> dict:
+        return {
+            'skipped': len(self.skipped),
+            'recomputed': len(self.recomputed),
+            'skipped_nodes': self.skipped,
+            'recomputed_nodes': self.recomputed,
+        }
+
+    def write_report(self, path: str = DEFAULT_REPORT_PATH) -> None:
+        """Log the skipped/recomputed summary and save the full report as JSON"""
+        report = self.report()
+        logger.info(f"Incremental run: {report['skipped']} node runs skipped, "
+                    f"{report['recomputed']} recomputed")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def prepare(self, node: str, agent, state: dict) -> tuple:
+        """(item, fingerprint, stored outputs or None) for a call of node on state's READS inputs"""
+        inputs = {key: state.get(key) for key in agent.READS}
+        item = item_key(state)
+        node_fingerprint = fingerprint(inputs, agent_version(agent))
+        return item, node_fingerprint, self.lookup(node, item, node_fingerprint)
+
+    def wrap(self, node: str, fn, agent):
+        """Wrap an agent call of a node so it is skipped when its inputs are unchanged since the last run.
+
+        The agent's READS keys are fingerprinted; on a skip the stored WRITES outputs are returned
+        as the call's update instead of calling fn, on a successful run with non-empty outputs
+        (from fn's update, or already in the state) they are recorded. Only the call is wrapped:
+        the node writes stored and fresh outputs to the sink alike.
+        """
+        writes = agent.WRITES
+
+        def reuse(item, stored):
+            self.note(True, node, item)
+            return dict(stored)
+
+        def remember(state, update, item, node_fingerprint):
+            self.note(False, node, item)
+            outputs = {key: update.get(key) or state.get(key) for key in writes}
+            # Empty outputs (e.g. LLM skipped without an API key) are never reused
+            if not update.get('error') and all(outputs.values()):
+                self.record(node, item, node_fingerprint, outputs)
+            return update
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state):
+                item, node_fingerprint, stored = self.prepare(node, agent, state)
+                if stored is not None:
+                    return reuse(item, stored)
+                return remember(state, await fn(state), item, node_fingerprint)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state):
+            item, node_fingerprint, stored = self.prepare(node, agent, state)
+            if stored is not None:
+                return reuse(item, stored)
+            return remember(state, fn(state), item, node_fingerprint)
+        return wrapper
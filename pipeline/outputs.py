@@ -0,0 +1,322 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from pipeline import tracing
+
+logger = logging.getLogger()
+
+_SLUG_PATTERN = re.compile(r"[^a-z0-9]+")
+
+OUTPUT_DIR = 'output'
+DEFAULT_FLUSH_RECORDS = 500
+DEFAULT_SHARD_RECORDS = 50_000
+
+
+def encode_pretty(data: dict) -> bytes:
+    """Indented JSON document, as written by PrettyJsonSink"""
+    return json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+
+
+def encode_record(data: dict, key: str | None = None) -> bytes:
+    """Compact {"key", "data"} JSONL line, as written by JsonlShardSink"""
+    return (json.dumps({'key': key, 'data': data}, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+def encode_for(output_format: str, data: dict, key: str | None = None) -> bytes:
+    """Artifact bytes for a sink format, so serialization can happen away from the sink (e.g. in a worker)"""
+    return encode_record(data, key) if output_format == "jsonl" else encode_pretty(data)
+
+
+def save_json(data: dict, path: str) -> int:
+    """Safe JSON save utility; writes to a temp file and renames so readers never see partial files.
+    Returns the number of bytes written (0 on failure)."""
+    try:
+        encoded = encode_pretty(data)
+    except (TypeError, ValueError) as e:
+        logger.error(f"Failed to save JSON to {path}: {e}")
+        return 0
+    return save_bytes(encoded, path)
+
+
+def save_bytes(encoded: bytes, path: str) -> int:
+    """Atomically write already encoded JSON; returns the number of bytes written (0 on failure)"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved JSON: {path}")
+        return len(encoded)
+    except Exception as e:
+        logger.error(f"Failed to save JSON to {path}: {e}")
+        return 0
+
+
+def slugify(name: str) -> str:
+    """Filesystem-safe identifier for a product name"""
+    slug = _SLUG_PATTERN.sub("-", name.lower()).strip("-")
+    return slug or "product"
+
+
+# OUTPUT SINKS - where generated artifacts (faq, product_page, comparison_page) go
+
+class OutputSink:
+    """Destination for generated artifacts; key identifies the product or pair (None for single runs)"""
+
+    format = None
+
+    def __init__(self):
+        self.bytes_written = 0
+        self.records_written = 0
+
+    def write(self, artifact: str, data: dict, key: str | None = None) -> None:
+        self.write_encoded(artifact, encode_for(self.format, data, key), key)
+
+    def write_encoded(self, artifact: str, payload: bytes, key: str | None = None) -> None:
+        """Write an artifact already serialized with encode_for(self.format, ...)"""
+        raise NotImplementedError
+
+    def read(self, artifact: str, key: str) -> dict | None:
+        """An artifact this sink wrote for key, or None if it cannot be read back"""
+        return None
+
+    def flush(self) -> None:
+        """Hand everything written so far to the file system"""
+
+    def close(self) -> None:
+        pass
+
+
+class PrettyJsonSink(OutputSink):
+    """One indented JSON file per artifact: output/<artifact>.json for single runs,
+    output/<artifact>/<key>.json in batch mode so products never share a file"""
+
+    format = "pretty"
+
+    def __init__(self, root: str = OUTPUT_DIR):
+        super().__init__()
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, artifact: str, key: str | None) -> str:
+        if key is None:
+            return os.path.join(self.root, f"{artifact}.json")
+        return os.path.join(self.root, artifact, f"{key}.json")
+
+    def write(self, artifact: str, data: dict, key: str | None = None) -> None:
+        self._count(save_json(data, self._path(artifact, key)))
+
+    def write_encoded(self, artifact: str, payload: bytes, key: str | None = None) -> None:
+        self._count(save_bytes(payload, self._path(artifact, key)))
+
+    def read(self, artifact: str, key: str) -> dict | None:
+        try:
+            with open(self._path(artifact, key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _count(self, written: int) -> None:
+        tracing.add(output_bytes=written)
+        with self._lock:
+            self.bytes_written += written
+            self.records_written += 1 if written else 0
+
+
+class JsonlShardSink(OutputSink):
+    """Buffered, append-only JSONL shards per artifact.
+
+    Records are encoded compactly as {"key": ..., "data": ...} lines, buffered in memory and
+    appended in flush_records-sized writes to output/<artifact>/part-<run>-<n>.jsonl.part.
+    A shard is atomically renamed to .jsonl once it holds shard_records records or on close,
+    so a finished .jsonl file is always complete. run_id names the shards; a resumed run
+    reuses it and continues their numbering. Shards are never rewritten by a run: a key written
+    again adds a newer record, and compact_shards drops the older ones when asked to. The shard
+    and offset of each record this run wrote are kept so read can fetch it back.
+    """
+
+    format = "jsonl"
+
+    def __init__(self, root: str = OUTPUT_DIR, flush_records: int = DEFAULT_FLUSH_RECORDS,
+                 shard_records: int = DEFAULT_SHARD_RECORDS, run_id: str | None = None):
+        super().__init__()
+        self.root = root
+        self.flush_records = flush_records
+        self.shard_records = shard_records
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._shards = {}
+        # Keys this run wrote per artifact, with their (shard path, offset) once flushed
+        self._written = {}
+
+    def write_encoded(self, artifact: str, payload: bytes, key: str | None = None) -> None:
+        tracing.add(output_bytes=len(payload))
+        with self._lock:
+            self._written.setdefault(artifact, {})[key] = None
+            buffer = self._buffers.setdefault(artifact, [])
+            buffer.append((key, payload))
+            if len(buffer) >= self.flush_records:
+                self._flush(artifact)
+
+    def read(self, artifact: str, key: str) -> dict | None:
+        with self._lock:
+            locations = self._written.get(artifact, {})
+            if key not in locations:
+                return None
+            if locations[key] is None:
+                self._flush(artifact)
+            path, offset = locations[key]
+            shard = self._shards.get(artifact)
+            if shard is not None and shard['path'] == path:
+                shard['file'].flush()
+                path = f"{path}.part"
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.readline())['data']
+
+    def _flush(self, artifact: str) -> None:
+        buffer = self._buffers.get(artifact)
+        while buffer:
+            shard = self._shards.get(artifact)
+            if shard is None:
+                shard = self._open_shard(artifact)
+            room = self.shard_records - shard['records']
+            chunk, buffer[:] = buffer[:room], buffer[room:]
+            locations, offset = self._written[artifact], shard['bytes']
+            for key, payload in chunk:
+                locations[key] = (shard['path'], offset)
+                offset += len(payload)
+            encoded = b"".join(payload for _, payload in chunk)
+            shard['file'].write(encoded)
+            shard['records'] += len(chunk)
+            shard['bytes'] += len(encoded)
+            self.bytes_written += len(encoded)
+            self.records_written += len(chunk)
+            if shard['records'] >= self.shard_records:
+                self._close_shard(artifact)
+
+    def _open_shard(self, artifact: str) -> dict:
+        directory = os.path.join(self.root, artifact)
+        os.makedirs(directory, exist_ok=True)
+        number = len([name for name in os.listdir(directory) if name.startswith(f"part-{self.run_id}-")]) + 1
+        path = os.path.join(directory, f"part-{self.run_id}-{number:05d}.jsonl")
+        shard = {'path': path, 'file': open(f"{path}.part", "wb"), 'records': 0, 'bytes': 0}
+        self._shards[artifact] = shard
+        return shard
+
+    def _close_shard(self, artifact: str) -> None:
+        shard = self._shards.pop(artifact)
+        shard['file'].close()
+        os.replace(f"{shard['path']}.part", shard['path'])
+        logger.info(f"Saved JSONL shard: {shard['path']} ({shard['records']} records)")
+
+    def flush(self) -> None:
+        with self._lock:
+            for artifact in list(self._buffers):
+                self._flush(artifact)
+            for shard in self._shards.values():
+                shard['file'].flush()
+
+    def close(self) -> None:
+        with self._lock:
+            for artifact in list(self._buffers):
+                self._flush(artifact)
+            for artifact in list(self._shards):
+                self._close_shard(artifact)
+            self._written = {}
+
+    def recover(self, keep) -> int:
+        """Clean up the shards an interrupted run with this run_id left behind: unfinished
+        .part shards become .jsonl files, and records whose key fails keep(key) (items that
+        will be redone) or that were cut off mid-line are dropped. Returns the records dropped."""
+        dropped = 0
+        prefix = f"part-{self.run_id}-"
+        for artifact in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else ():
+            directory = os.path.join(self.root, artifact)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(entry for entry in os.listdir(directory) if entry.startswith(prefix)):
+                path = os.path.join(directory, name)
+                with open(path, 'rb') as f:
+                    lines = f.read().splitlines(keepends=True)
+                kept = []
+                for line in lines:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if line.endswith(b"\n") and keep(record.get('key')):
+                        kept.append(line)
+                dropped += len(lines) - len(kept)
+                target = path[:-len(".part")] if name.endswith(".part") else path
+                if not kept:
+                    os.remove(path)
+                elif len(kept) < len(lines) or target != path:
+                    save_bytes(b"".join(kept), target)
+                    if target != path:
+                        os.remove(path)
+        return dropped
+
+
+def compact_shards(root: str = OUTPUT_DIR) -> int:
+    """Rewrite the finished JSONL shards under root so that every key keeps only its newest
+    record: the last one of the most recently written shard holding it. Run it while no run
+    writes to root; returns the records dropped."""
+    dropped = 0
+    for artifact in sorted(os.listdir(root)) if os.path.isdir(root) else ():
+        directory = os.path.join(root, artifact)
+        if not os.path.isdir(directory):
+            continue
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)
+                 if name.startswith("part-") and name.endswith(".jsonl")]
+        seen = set()
+        # Newest shard first, and within a shard the last record first
+        for path in sorted(paths, key=lambda path: (os.path.getmtime(path), path), reverse=True):
+            with open(path, 'rb') as f:
+                lines = f.read().splitlines(keepends=True)
+            kept = []
+            for line in reversed(lines):
+                key = json.loads(line).get('key')
+                if key not in seen:
+                    seen.add(key)
+                    kept.append(line)
+            dropped += len(lines) - len(kept)
+            if not kept:
+                os.remove(path)
+            elif len(kept) < len(lines):
+                written = os.stat(path)
+                save_bytes(b"".join(reversed(kept)), path)
+                # Keep the shard's place in the newest-first order
+                os.utime(path, ns=(written.st_atime_ns, written.st_mtime_ns))
+    return dropped
+
+
+# Process-wide sink used by the pipeline nodes
+_sink: OutputSink = PrettyJsonSink()
+
+
+def configure_sink(output_format: str = "pretty", flush_records: int = DEFAULT_FLUSH_RECORDS,
+                   shard_records: int = DEFAULT_SHARD_RECORDS, run_id: str | None = None) -> OutputSink:
+    """Install the process-wide output sink ('pretty' or 'jsonl')"""
+    global _sink
+    _sink.close()
+    if output_format == "jsonl":
+        _sink = JsonlShardSink(flush_records=flush_records, shard_records=shard_records, run_id=run_id)
+    else:
+        _sink = PrettyJsonSink()
+    return _sink
+
+
+def get_sink() -> OutputSink:
+    return _sink
+
+
+def close_sink() -> None:
+    _sink.close()
+    if _sink.records_written:
+        logger.info(f"Output: {_sink.records_written} records, {_sink.bytes_written} bytes")
@@ -0,0 +1,77 @@
+import json
+import logging
+import threading
+from agents.parser import plain_product
+from pipeline.llm import estimate_tokens
+
+logger = logging.getLogger()
+
+
+class PromptTooLarge(ValueError):
+    """A prompt is estimated above the per-call token budget and is not sent"""
+
+
+def compact_product(product) -> str:
+    """Canonical compact JSON of a product: sorted keys, no whitespace, empty fields dropped"""
+    fields = {field: value for field, value in plain_product(product).items() if value not in ("", [], (), None)}
+    return json.dumps(fields, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+class PromptBudget:
+    """Counts the tokens of every outgoing prompt, refuses prompts above the per-call budget
+    and keeps the totals per prompt kind for the end-of-run report. A budget of 0 means unlimited."""
+
+    def __init__(self, max_tokens: int = 0):
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._metrics = {'prompts': 0, 'tokens': 0, 'rejected': 0}
+        self._kinds = {}
+
+    def fits(self, tokens: int) -> bool:
+        return not self.max_tokens or tokens <= self.max_tokens
+
+    def admit(self, prompt: str, kind: str) -> str:
+        """Return prompt if its estimated tokens fit the budget, else raise PromptTooLarge"""
+        tokens = estimate_tokens(prompt)
+        if not self.fits(tokens):
+            with self._lock:
+                self._metrics['rejected'] += 1
+            raise PromptTooLarge(f"{kind} prompt of ~{tokens} tokens exceeds the budget of {self.max_tokens}")
+        with self._lock:
+            self._metrics['prompts'] += 1
+            self._metrics['tokens'] += tokens
+            counts = self._kinds.setdefault(kind, {'prompts': 0, 'tokens': 0})
+            counts['prompts'] += 1
+            counts['tokens'] += tokens
+        return prompt
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['kinds'] = {kind: dict(counts) for kind, counts in self._kinds.items()}
+        return metrics
+
+
+# Process-wide budget used by the LLM agents
+_budget = PromptBudget()
+
+
+def configure_prompt_budget(max_tokens: int = 0) -> PromptBudget:
+    """Install the process-wide prompt budget; 0 disables the per-call limit"""
+    global _budget
+    _budget = PromptBudget(max_tokens)
+    if max_tokens:
+        logger.info(f"Prompt budget: {max_tokens} tokens per call")
+    return _budget
+
+
+def get_prompt_budget() -> PromptBudget:
+    return _budget
+
+
+def log_prompt_stats() -> None:
+    stats = _budget.stats()
+    if stats['prompts'] or stats['rejected']:
+        kinds = ", ".join(f"{kind} {counts['prompts']} (~{counts['tokens']})" for kind, counts in stats['kinds'].items())
+        logger.info(f"Prompts: {stats['prompts']} built, ~{stats['tokens']} tokens ({kinds}), "
+                    f"{stats['rejected']} over budget")
@@ -0,0 +1,283 @@
+import re
+import json
+import logging
+import threading
+from pipeline import llm
+from pipeline.prompts import get_prompt_budget
+
+logger = logging.getLogger()
+
+_FENCE = re.compile(r"```[A-Za-z]*\s*(.*?)```", re.S)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class InvalidResponse(ValueError):
+    """An LLM answer that is still unusable after local repair and a re-ask"""
+
+
+# TEXT -> OBJECT
+
+def strip_fences(text: str) -> str:
+    """Body of the first ``` fenced block, or the text without stray fences"""
+    match = _FENCE.search(text)
+    return match.group(1) if match else text.replace("```", "")
+
+
+def outermost_object(text: str) -> str | None:
+    """The first balanced {...} of text (unterminated if the answer was cut off), or None"""
+    start = text.find('{')
+    if start < 0:
+        return None
+    depth, in_string, escaped = 0, False, False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+
+def repair(text: str) -> str:
+    """Cheap fixes for common near-JSON: trailing commas, an unterminated string and
+    unclosed brackets of a truncated answer"""
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in '}]' and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(',')
+    return text + "".join(reversed(stack))
+
+
+def load_object(text: str) -> tuple[dict | None, bool]:
+    """(JSON object found in an LLM answer or None, whether local repair was needed)"""
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, False
+    except json.JSONDecodeError:
+        pass
+    candidate = outermost_object(strip_fences(text))
+    if candidate is None:
+        return None, True
+    for attempt in (candidate, repair(candidate)):
+        try:
+            data = json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+        return (data, True) if isinstance(data, dict) else (None, True)
+    return None, True
+
+
+# SCHEMAS
+
+def text_field(value):
+    """Non-empty string; a list of strings is joined"""
+    if isinstance(value, list) and value and all(isinstance(item, str) for item in value):
+        value = " ".join(value)
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def list_field(value):
+    """Non-empty list"""
+    return value if isinstance(value, list) and value else None
+
+
+def faq_items(value):
+    """FAQ list with Id/Question/Answer items: keys matched case-insensitively, Ids coerced
+    to integers (or numbered by position), items without a question or answer dropped"""
+    if not isinstance(value, list):
+        return None
+    items = []
+    for position, item in enumerate(value, 1):
+        if not isinstance(item, dict):
+            continue
+        fields = {str(key).lower(): field for key, field in item.items()}
+        question, answer = text_field(fields.get('question')), text_field(fields.get('answer'))
+        if question is None or answer is None:
+            continue
+        number = fields.get('id')
+        if isinstance(number, str) and number.strip().isdigit():
+            number = int(number)
+        items.append({'Id': number if isinstance(number, int) else position, 'Question': question, 'Answer': answer})
+    return items or None
+
+
+class ResponseSchema:
+    """Required top-level fields of one artifact, each with a normalizer that returns the
+    (locally repaired) value or None if it is unusable. aliases map keys the model used
+    instead of the requested ones; keys also match case-insensitively. positional fields
+    that are still missing take the remaining unknown keys in answer order (e.g. summaries
+    keyed by a shortened product name). Other extra keys are kept."""
+
+    def __init__(self, fields: dict, aliases: dict | None = None, positional: tuple = ()):
+        self.fields = fields
+        self.aliases = aliases or {}
+        self.positional = positional
+
+    def check(self, data) -> tuple[dict, list]:
+        """(normalized data, names of fields that are missing or invalid)"""
+        if not isinstance(data, dict):
+            return {}, list(self.fields)
+        data = dict(data)
+        for alias, field in self.aliases.items():
+            if field not in data and alias in data:
+                data[field] = data.pop(alias)
+        lowered = {str(key).lower(): key for key in data}
+        for field in self.fields:
+            if field not in data and field.lower() in lowered:
+                data[field] = data.pop(lowered[field.lower()])
+        unknown = [key for key in data if key not in self.fields]
+        for field in self.positional:
+            if field not in data and unknown:
+                data[field] = data.pop(unknown.pop(0))
+
+        result, broken = {}, []
+        for field, normalize in self.fields.items():
+            value = normalize(data[field]) if field in data else None
+            if value is None:
+                broken.append(field)
+            else:
+                result[field] = value
+        result.update((key, value) for key, value in data.items() if key not in self.fields)
+        return result, broken
+
+
+# Expected value of each normalizer's field, spelled out in re-ask prompts
+_FORMATS = {
+    text_field: "a string",
+    list_field: "a non-empty list of strings",
+    faq_items: 'a list of {"Id": integer, "Question": string, "Answer": string} objects',
+}
+
+
+FAQ_SCHEMA = ResponseSchema({'FAQs': faq_items}, aliases={'FAQ': 'FAQs', 'faq': 'FAQs'})
+
+
+def comparison_schema(name_a: str, name_b: str) -> ResponseSchema:
+    """Comparison answer: one summary keyed by each product name, the points and the recommendation"""
+    return ResponseSchema(
+        {name_a: text_field, name_b: text_field, 'Comparison': list_field, 'Recommendation': text_field},
+        aliases={'Product A': name_a, 'Product B': name_b},
+        positional=(name_a, name_b),
+    )
+
+
+# Narrative part of a comparison whose summaries and differences are computed locally
+NARRATIVE_SCHEMA = ResponseSchema({'Comparison': list_field, 'Recommendation': text_field})
+
+
+# PARSE, REPAIR, RE-ASK
+
+class ResponseStats:
+    """How LLM answers were made usable: as sent, by local repair, by a re-ask, or not at all"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'clean': 0, 'repaired': 0, 'reasked': 0, 'failed': 0}
+
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            self.counts[outcome] += 1
+
+
+_stats = ResponseStats()
+
+
+def parse(content: str, schema: ResponseSchema) -> tuple[dict, list, bool]:
+    """(normalized data, broken fields, whether local repair was needed) of one answer"""
+    data, repaired = load_object(content)
+    result, broken = schema.check(data)
+    return result, broken, repaired or result != data
+
+
+def reask_prompt(content: str, broken: list, schema: ResponseSchema) -> str:
+    """The broken answer plus an instruction to answer only the broken fields; the original
+    request (and its product data) is not sent again"""
+    keys = "\n".join(f"- {json.dumps(field, ensure_ascii=False)}: {_FORMATS.get(schema.fields[field], 'a value')}"
+                     for field in broken)
+    return (f"Your previous reply was:\n{content}\n\nIt lacked valid values for these keys:\n{keys}\n"
+            f"Using only the facts in that reply, answer with JSON only, without ``` fences: "
+            f"an object with just those keys.")
+
+
+def _settle(data: dict, broken: list, repaired: bool) -> dict | None:
+    if not broken:
+        _stats.count('repaired' if repaired else 'clean')
+        return data
+    return None
+
+
+def _merge(data: dict, broken: list, content: str, schema: ResponseSchema, prompts: tuple,
+           prompt_version: str) -> dict:
+    patch, _ = load_object(content)
+    result, still_broken = schema.check({**data, **(patch or {})})
+    if still_broken:
+        _stats.count('failed')
+        # Neither answer is usable: do not let the cache replay them on a retry or a resumed run
+        for prompt in prompts:
+            llm.forget(prompt, prompt_version)
+        raise InvalidResponse(f"No valid value for {', '.join(still_broken)} after a re-ask")
+    _stats.count('reasked')
+    logger.info(f"Re-asked the model for {', '.join(broken)} only")
+    return result
+
+
+def resolve(content: str, schema: ResponseSchema, prompt: str, prompt_version: str, priority: int) -> dict:
+    """Usable data of an answer to prompt: parsed and repaired locally, and only if that fails,
+    the broken fields are requested again (once) and merged in. Raises InvalidResponse."""
+    data, broken, repaired = parse(content, schema)
+    settled = _settle(data, broken, repaired)
+    if settled is not None:
+        return settled
+    reask = get_prompt_budget().admit(reask_prompt(content, broken, schema), 'reask')
+    response = llm.invoke(reask, prompt_version, priority=priority)
+    return _merge(data, broken, response.content, schema, (prompt, reask), prompt_version)
+
+
+async def aresolve(content: str, schema: ResponseSchema, prompt: str, prompt_version: str, priority: int) -> dict:
+    """Async variant of resolve"""
+    data, broken, repaired = parse(content, schema)
+    settled = _settle(data, broken, repaired)
+    if settled is not None:
+        return settled
+    reask = get_prompt_budget().admit(reask_prompt(content, broken, schema), 'reask')
+    response = await llm.ainvoke(reask, prompt_version, priority=priority)
+    return _merge(data, broken, response.content, schema, (prompt, reask), prompt_version)
+
+
+def response_stats() -> dict:
+    return dict(_stats.counts)
+
+
+def log_response_stats() -> None:
+    counts = response_stats()
+    if any(counts.values()):
+        logger.info(f"LLM answers: {counts['clean']} valid as sent, {counts['repaired']} repaired locally, "
+                    f"{counts['reasked']} completed by a re-ask, {counts['failed']} unusable")
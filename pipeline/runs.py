@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger()
+
+DEFAULT_RUNS_PATH = os.path.join('output', '.runs.sqlite')
+
+# Options of a catalog run that decide which items (and item keys) it has
+RUN_OPTIONS = ('catalog', 'pairs', 'category_key', 'output_format')
+
+
+class UnknownRun(ValueError):
+    """--resume named a run id that the run store has no record of"""
+
+
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+class RunStore:
+    """Checkpoints of catalog runs: per run, which products and pairs are done or failed.
+
+    Items are the keys the output sink writes under (<position>-<product slug> and
+    <slug>__vs__<slug>). An item is marked done only after its whole window finished and the
+    sink flushed it, so a resumed run skips exactly the items whose outputs are on disk and
+    redoes the failed ones and those that were in flight when the run died.
+    """
+
+    def __init__(self, path: str = DEFAULT_RUNS_PATH):
+        self.path = path
+        self.run_id = None
+        self.done = set()
+        self.skipped = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY, options TEXT NOT NULL, status TEXT NOT NULL,"
+            " created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " run_id TEXT NOT NULL, item TEXT NOT NULL, status TEXT NOT NULL, error TEXT,"
+            " updated REAL NOT NULL, PRIMARY KEY (run_id, item))"
+        )
+        self._conn.commit()
+
+    def start(self, options: dict, run_id: str | None = None) -> str:
+        """Register a new run, or reopen run_id to resume it; returns the run id.
+        Raises UnknownRun if run_id was never started."""
+        options = {key: options.get(key) for key in RUN_OPTIONS}
+        now = time.time()
+        with self._lock:
+            if run_id is None:
+                run_id = new_run_id()
+                self._conn.execute("INSERT INTO runs (run_id, options, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+                                   (run_id, json.dumps(options), "running", now, now))
+            else:
+                row = self._conn.execute("SELECT options FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+                if row is None:
+                    raise UnknownRun(f"No run {run_id!r} in {self.path}")
+                stored = json.loads(row[0])
+                changed = [key for key in RUN_OPTIONS if stored.get(key) != options[key]]
+                if changed:
+                    logger.warning(f"Resuming run {run_id} with different {', '.join(changed)} than it was "
+                                   f"started with; items may not match")
+                self._conn.execute("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?",
+                                   ("running", now, run_id))
+                self.done = {item for (item,) in self._conn.execute(
+                    "SELECT item FROM items WHERE run_id = ? AND status = 'done'", (run_id,))}
+            self._conn.commit()
+            self.run_id = run_id
+        return run_id
+
+    def is_done(self, item: str) -> bool:
+        """Whether a resumed run already finished item"""
+        return item in self.done
+
+    def skip(self, item: str) -> bool:
+        """is_done, counting the item as skipped when it is"""
+        if item not in self.done:
+            return False
+        with self._lock:
+            self.skipped += 1
+        return True
+
+    def record(self, done: list, failed: dict) -> None:
+        """Checkpoint one window: items done, and failed items with their error"""
+        now = time.time()
+        rows = [(self.run_id, item, "done", None, now) for item in done]
+        rows += [(self.run_id, item, "failed", error, now) for item, error in failed.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO items (run_id, item, status, error, updated) VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("UPDATE runs SET updated = ? WHERE run_id = ?", (now, self.run_id))
+            self._conn.commit()
+            self.done.update(done)
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM items WHERE run_id = ? GROUP BY status",
+                                      (self.run_id,)).fetchall()
+        return {'done': 0, 'failed': 0, **dict(rows)}
+
+    def finish(self) -> dict:
+        """Mark the run finished and log its checkpoint counts"""
+        counts = self.counts()
+        with self._lock:
+            self._conn.execute("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?",
+                               ("finished", time.time(), self.run_id))
+            self._conn.commit()
+        self.finished = True
+        logger.info(f"Run {self.run_id}: {counts['done']} items done, {counts['failed']} failed, "
+                    f"{self.skipped} skipped as already done")
+        if counts['failed']:
+            logger.info(f"Retry the failed items with --resume {self.run_id}")
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Process-wide run store; None (the default) disables checkpointing
+_store: RunStore | None = None
+
+
+def configure_run_store(enabled: bool = False, path: str = DEFAULT_RUNS_PATH) -> RunStore | None:
+    global _store
+    if _store is not None:
+        _store.close()
+    _store = RunStore(path) if enabled else None
+    return _store
+
+
+def get_run_store() -> RunStore | None:
+    return _store
+
+
+def close_run_store() -> None:
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
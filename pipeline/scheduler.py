@@ -0,0 +1,297 @@
+import sys
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+from collections import deque
+from pipeline import tracing
+
+logger = logging.getLogger()
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_FAQ = 10
+PRIORITY_COMPARISON = 20
+
+# Seconds of the per-minute budget that may be spent in one burst
+BURST_SECONDS = 10
+# Span over which the per-minute limits hold
+WINDOW_SECONDS = 60.0
+DEFAULT_MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Budget of rate_per_minute units per rolling minute. A rate of 0 means unlimited.
+
+    Units refill continuously at rate_per_minute / 60 per second into a bucket of at most
+    capacity units (BURST_SECONDS of the rate by default), which paces requests instead of
+    sending a minute's budget at once. The units granted over the last WINDOW_SECONDS, with
+    later corrections, never exceed rate_per_minute, however full the bucket is. Costs are
+    charged in full, also above capacity: the level goes negative and later callers wait
+    until the debt is paid back.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.limit = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute * BURST_SECONDS / 60.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        # (time, units) granted or corrected within the last window, oldest first
+        self.granted = deque()
+        self.window_units = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        while self.granted and self.granted[0][0] <= now - WINDOW_SECONDS:
+            self.window_units -= self.granted.popleft()[1]
+        if not self.granted:
+            self.window_units = 0.0
+
+    def _window_wait(self, amount: float, now: float) -> float:
+        """Seconds until amount more units fit the rolling window (a request larger than the
+        whole limit waits for an empty window)"""
+        excess = self.window_units + min(amount, self.limit) - self.limit
+        if excess <= 0:
+            return 0.0
+        for granted_at, units in self.granted:
+            excess -= units
+            if excess <= 0:
+                return granted_at + WINDOW_SECONDS - now
+        return self.granted[-1][0] + WINDOW_SECONDS - now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount units are available (0 if they are now)"""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        bucket_wait = 0.0 if self.level >= needed else (needed - self.level) / self.rate
+        return max(bucket_wait, self._window_wait(amount, now))
+
+    def _charge(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+        self.granted.append((now, amount))
+        self.window_units += amount
+
+    def take(self, amount: float, now: float) -> None:
+        if self.rate:
+            self._charge(amount, now)
+
+    def adjust(self, amount: float, now: float) -> None:
+        """Give back (negative amount) or charge extra units once the real cost is known"""
+        if self.rate:
+            self._charge(amount, now)
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds the provider asked us to wait, if the error carries a Retry-After header"""
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limiting (429) and transient server errors (5xx) are retried; everything else is not"""
+    # httpx is only loaded once a real client exists; before that no error can be an httpx one
+    httpx = sys.modules.get('httpx')
+    return httpx is not None and isinstance(error, httpx.HTTPStatusError) \
+        and error.response.status_code in RETRYABLE_STATUS
+
+
+class LLMScheduler:
+    """Admission control for every LLM request.
+
+    Requests wait in one priority queue and are released, head first, only when both the
+    requests-per-minute and the (estimated) tokens-per-minute buckets allow it. A 429 or 5xx
+    pauses the whole queue for a jittered exponential backoff (or the provider's Retry-After)
+    and the request is retried, so sustained load runs at the limit instead of tripping it.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_retries: int = DEFAULT_MAX_RETRIES):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._metrics = {'granted': 0, 'retries': 0, 'rate_limited': 0, 'server_errors': 0,
+                         'failed': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'queue_max': 0, 'tokens': 0}
+
+    # Queue
+
+    def _enqueue(self, priority: int, wake) -> tuple:
+        ticket = (priority, next(self._sequence), wake)
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+            self._metrics['queue_max'] = max(self._metrics['queue_max'], len(self._queue))
+        return ticket
+
+    def _grant(self, ticket: tuple, cost: int) -> float | None:
+        """0 if ticket may go now, seconds to wait if it heads the queue, None if it is not at the head"""
+        with self._lock:
+            if self._queue[0] is not ticket:
+                return None
+            now = time.monotonic()
+            wait = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(cost, now))
+            if wait > 0:
+                return wait
+            self.requests.take(1, now)
+            self.tokens.take(cost, now)
+            heapq.heappop(self._queue)
+            self._metrics['granted'] += 1
+            self._metrics['tokens'] += cost
+            self._wake_head()
+            return 0.0
+
+    def _withdraw(self, ticket: tuple) -> None:
+        """Remove a ticket whose caller gave up (e.g. a cancelled coroutine)"""
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._wake_head()
+
+    def _wake_head(self) -> None:
+        if self._queue:
+            self._queue[0][2]()
+
+    def _waited(self, started: float) -> float:
+        waited = time.monotonic() - started
+        with self._lock:
+            self._metrics['wait_total'] += waited
+            self._metrics['wait_max'] = max(self._metrics['wait_max'], waited)
+        return waited
+
+    def acquire(self, cost: int, priority: int = PRIORITY_FAQ) -> float:
+        """Block until a request estimated at cost tokens may be sent; returns the seconds waited"""
+        started = time.monotonic()
+        event = threading.Event()
+        ticket = self._enqueue(priority, event.set)
+        try:
+            while True:
+                wait = self._grant(ticket, cost)
+                if wait == 0:
+                    break
+                event.wait(wait)
+                event.clear()
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        return self._waited(started)
+
+    async def aacquire(self, cost: int, priority: int = PRIORITY_FAQ) -> float:
+        """Async variant of acquire; waits without blocking the event loop"""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        ticket = self._enqueue(priority, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while True:
+                wait = self._grant(ticket, cost)
+                if wait == 0:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        return self._waited(started)
+
+    def settle(self, estimated: int, actual: int | None) -> None:
+        """Correct the token bucket with the real usage reported by the provider"""
+        if actual is None:
+            return
+        with self._lock:
+            self.tokens.adjust(actual - estimated, time.monotonic())
+            self._metrics['tokens'] += actual - estimated
+
+    # Backoff
+
+    def _backoff(self, error: Exception, attempt: int) -> float | None:
+        """Seconds to pause before retrying, or None if the error is final"""
+        if not is_retryable(error) or attempt >= self.max_retries:
+            with self._lock:
+                self._metrics['failed'] += 1
+            return None
+        delay = retry_after(error)
+        if delay is None:
+            # Full jitter keeps many callers from retrying in lockstep
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        status = error.response.status_code
+        with self._lock:
+            self._metrics['retries'] += 1
+            self._metrics['rate_limited' if status == 429 else 'server_errors'] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        tracing.add(retries=1)
+        logger.warning(f"LLM request failed with {status}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def call(self, send, cost: int, priority: int = PRIORITY_FAQ):
+        """Run send() once admitted, retrying 429/5xx responses with backoff"""
+        for attempt in itertools.count():
+            tracing.add(queue_wait=self.acquire(cost, priority))
+            try:
+                return send()
+            except Exception as e:
+                if self._backoff(e, attempt) is None:
+                    raise
+
+    async def acall(self, send, cost: int, priority: int = PRIORITY_FAQ):
+        """Async variant of call; send() returns an awaitable"""
+        for attempt in itertools.count():
+            tracing.add(queue_wait=await self.aacquire(cost, priority))
+            try:
+                return await send()
+            except Exception as e:
+                if self._backoff(e, attempt) is None:
+                    raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['queue_depth'] = len(self._queue)
+        metrics['wait_avg'] = round(metrics['wait_total'] / metrics['granted'], 3) if metrics['granted'] else 0.0
+        metrics['wait_total'] = round(metrics['wait_total'], 3)
+        metrics['wait_max'] = round(metrics['wait_max'], 3)
+        return metrics
+
+
+# Process-wide scheduler used by pipeline.llm
+_scheduler = LLMScheduler()
+
+
+def configure_scheduler(rpm: int = 0, tpm: int = 0, max_retries: int = DEFAULT_MAX_RETRIES) -> LLMScheduler:
+    """Install the process-wide scheduler; 0 disables the corresponding limit"""
+    global _scheduler
+    _scheduler = LLMScheduler(rpm, tpm, max_retries)
+    if rpm or tpm:
+        logger.info(f"LLM scheduler limits: {rpm or 'unlimited'} requests/min, {tpm or 'unlimited'} tokens/min")
+    return _scheduler
+
+
+def get_scheduler() -> LLMScheduler:
+    return _scheduler
+
+
+def log_scheduler_stats() -> None:
+    stats = _scheduler.stats()
+    if stats['granted']:
+        logger.info(f"LLM scheduler: {stats['granted']} requests, {stats['retries']} retries "
+                    f"({stats['rate_limited']} rate limited), max queue {stats['queue_max']}, "
+                    f"wait avg {stats['wait_avg']}s / max {stats['wait_max']}s")
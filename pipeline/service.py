@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import uuid
+import queue
+import signal
+import logging
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from agents.parser import ParserAgent
+from pipeline import llm
+from pipeline.batch import build_product_graph, make_compare_step, product_key, pair_key
+from pipeline.manifest import NodeManifest
+from pipeline.tracing import traced
+
+logger = logging.getLogger()
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_THREADS = 8
+# Finished jobs kept for status queries; the oldest are forgotten first
+MAX_FINISHED_JOBS = 10_000
+INBOX_POLL_SECONDS = 1.0
+MAX_WAIT_SECONDS = 300
+
+JOB_KINDS = {'product': 1, 'compare': 2}
+# Raw template fields a job product may carry, by expected type; product_name is required
+TEXT_FIELDS = ('product_name', 'concentration', 'how_to_use', 'side_effects', 'price')
+LIST_FIELDS = ('skin_type', 'key_ingredients', 'benefits')
+
+parser_agent = ParserAgent()
+
+
+class QueueFull(Exception):
+    """The service is at capacity; the caller should retry later"""
+
+
+class Job:
+    """One product or comparison request and its outcome"""
+
+    def __init__(self, kind: str, products: list, source: str = "http"):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.products = products
+        self.source = source
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def describe(self) -> dict:
+        """Status document returned by the API"""
+        info = {'id': self.id, 'kind': self.kind, 'status': self.status}
+        if self.started:
+            info['queued_s'] = round(self.started - self.submitted, 4)
+        if self.finished:
+            info['run_s'] = round(self.finished - self.started, 4)
+        if self.result is not None:
+            info['result'] = self.result
+        if self.error:
+            info['error'] = self.error
+        return info
+
+
+def product_problems(product: dict) -> list:
+    """What is wrong with one raw job product: a missing name, or fields of the wrong type"""
+    problems = [] if isinstance(product.get('product_name'), str) and product['product_name'].strip() \
+        else ["'product_name' must be a non-empty string"]
+    problems += [f"'{field}' must be a string" for field in TEXT_FIELDS[1:]
+                 if field in product and not isinstance(product[field], str)]
+    problems += [f"'{field}' must be a list of strings" for field in LIST_FIELDS
+                 if field in product and not (isinstance(product[field], list)
+                                              and all(isinstance(item, str) for item in product[field]))]
+    return problems
+
+
+def validate_job(body) -> Job:
+    """Job from a request body {"kind": "product" | "compare", "products": [raw product, ...]};
+    raises ValueError with a message for the client"""
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    kind = body.get('kind', 'product')
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind {kind!r}; expected one of {', '.join(JOB_KINDS)}")
+    products = body.get('products')
+    if not isinstance(products, list) or len(products) != JOB_KINDS[kind] \
+            or not all(isinstance(product, dict) for product in products):
+        raise ValueError(f"A {kind} job needs 'products': a list of {JOB_KINDS[kind]} product object(s)")
+    for index, product in enumerate(products):
+        problems = product_problems(product)
+        if problems:
+            raise ValueError(f"Product {index}: {'; '.join(problems)}")
+    return Job(kind, products)
+
+
+class PipelineService:
+    """Long-running executor of product and comparison jobs.
+
+    The per-product and per-pair graphs are compiled once and LLM clients stay warm, so a
+    job only pays for its own node work. Jobs wait in a bounded queue served by a fixed
+    number of threads; when the queue is full, submit raises QueueFull (HTTP 503) instead
+    of letting latency grow without bound.
+    """
+
+    def __init__(self, threads: int = DEFAULT_THREADS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 manifest: NodeManifest | None = None):
+        self.product_graph = build_product_graph(manifest=manifest).compile()
+        self.compare_step = traced("compare_products", make_compare_step(manifest))
+        self.jobs = OrderedDict()
+        self.counts = {'accepted': 0, 'rejected': 0, 'done': 0, 'failed': 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._serve_jobs, name=f"job-{index}", daemon=True)
+                         for index in range(threads)]
+        if llm.is_available():
+            # Create the pooled client now rather than on the first job
+            llm.get_llm()
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Let running jobs finish, then stop the job threads"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, job: Job) -> Job:
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.counts['rejected'] += 1
+            raise QueueFull(f"Job queue is full ({self._queue.maxsize} jobs)")
+        with self._lock:
+            self.counts['accepted'] += 1
+            self.jobs[job.id] = job
+            self._forget_finished()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def health(self) -> dict:
+        with self._lock:
+            running = sum(1 for job in self.jobs.values() if job.status == "running")
+            counts = dict(self.counts)
+        return {'queued': self._queue.qsize(), 'capacity': self._queue.maxsize, 'running': running,
+                'threads': len(self._threads), **counts}
+
+    def _forget_finished(self) -> None:
+        """Drop the oldest finished jobs beyond MAX_FINISHED_JOBS (called with the lock held)"""
+        excess = len(self.jobs) - MAX_FINISHED_JOBS
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done.is_set()][:max(0, excess)]:
+            del self.jobs[job_id]
+
+    def _serve_jobs(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.status, job.started = "running", time.time()
+            try:
+                job.result, job.error = self.run(job)
+            except Exception as e:
+                job.error = f"Job failed unexpectedly: {e}"
+            job.status = "failed" if job.error else "done"
+            job.finished = time.time()
+            with self._lock:
+                self.counts[job.status] += 1
+            logger.info(f"Job {job.id} ({job.kind}) {job.status} in {job.finished - job.started:.2f}s")
+            job.done.set()
+
+    def run(self, job: Job) -> tuple[dict | None, str | None]:
+        """(result, error) of one job; node outputs are also written to the output sink under
+        the product's (or pair's) key, so a later job for the same product replaces them"""
+        products = [parser_agent.parse(raw) for raw in job.products]
+        if job.kind == 'product':
+            key = product_key(products[0]['name'])
+            state = self.product_graph.invoke({'key': key, 'product_a': products[0],
+                                               'content_a': {}, 'faq_a': {}, 'product_page': {}, 'error': None})
+            return {'faq': state.get('faq_a'), 'product_page': state.get('product_page')}, state.get('error')
+        key = pair_key(product_key(products[0]['name']), product_key(products[1]['name']))
+        update = self.compare_step({'key': key, 'product_a': products[0], 'product_b': products[1]})
+        return {'comparison': update.get('comparison')}, update.get('error')
+
+
+# HTTP API
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """POST /jobs submits a job (?wait=SECONDS answers when it is done), GET /jobs/<id> returns
+    its status and result, GET /health the queue state"""
+    protocol_version = "HTTP/1.1"
+    service: PipelineService = None
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _reply(self, status: int, body: dict, headers: dict | None = None) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip('/')
+        if path == '/health':
+            return self._reply(200, self.service.health())
+        if path.startswith('/jobs/'):
+            job = self.service.get(path[len('/jobs/'):])
+            return self._reply(200, job.describe()) if job else self._reply(404, {'error': "Unknown job"})
+        return self._reply(404, {'error': "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            return self._reply(404, {'error': "Not found"})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            job = validate_job(json.loads(self.rfile.read(length) or b'null'))
+            wait = min(float(parse_qs(url.query).get('wait', ['0'])[0]), MAX_WAIT_SECONDS)
+        except (ValueError, json.JSONDecodeError) as e:
+            return self._reply(400, {'error': str(e)})
+        try:
+            self.service.submit(job)
+        except QueueFull as e:
+            return self._reply(503, {'error': str(e)}, {'Retry-After': '1'})
+        if wait > 0:
+            job.done.wait(wait)
+        return self._reply(200 if job.done.is_set() else 202, job.describe(),
+                           {'Location': f"/jobs/{job.id}"})
+
+
+# FILE INBOX
+
+class Inbox:
+    """Directory inbox: every <name>.json job file (same body as POST /jobs) is moved to
+    processing/ once accepted and its status document is written to results/<name>.json.
+    Files stay in the inbox while the queue is full."""
+
+    def __init__(self, path: str, service: PipelineService):
+        self.path = path
+        self.service = service
+        self.processing = os.path.join(path, 'processing')
+        self.results = os.path.join(path, 'results')
+        os.makedirs(self.processing, exist_ok=True)
+        os.makedirs(self.results, exist_ok=True)
+        self._stop = threading.Event()
+        self._pending = []
+        self._thread = threading.Thread(target=self._watch, name="inbox", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._collect(wait=True)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(INBOX_POLL_SECONDS):
+            self._collect()
+            self._accept()
+
+    def _accept(self) -> None:
+        for name in sorted(entry for entry in os.listdir(self.path) if entry.endswith('.json')):
+            source = os.path.join(self.path, name)
+            try:
+                with open(source, 'r', encoding='utf-8') as f:
+                    job = validate_job(json.load(f))
+            except (OSError, ValueError) as e:
+                self._write_result(name, {'status': "failed", 'error': f"Invalid job file: {e}"})
+                os.remove(source)
+                continue
+            job.source = name
+            try:
+                self.service.submit(job)
+            except QueueFull:
+                return
+            os.replace(source, os.path.join(self.processing, name))
+            self._pending.append(job)
+
+    def _collect(self, wait: bool = False) -> None:
+        """Write the results of finished inbox jobs"""
+        still_running = []
+        for job in self._pending:
+            if wait:
+                job.done.wait()
+            if not job.done.is_set():
+                still_running.append(job)
+                continue
+            self._write_result(job.source, job.describe())
+            os.remove(os.path.join(self.processing, job.source))
+        self._pending = still_running
+
+    def _write_result(self, name: str, document: dict) -> None:
+        target = os.path.join(self.results, name)
+        with open(target + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=4, ensure_ascii=False)
+        os.replace(target + ".tmp", target)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, threads: int = DEFAULT_THREADS,
+          queue_size: int = DEFAULT_QUEUE_SIZE, inbox: str | None = None,
+          manifest: NodeManifest | None = None) -> None:
+    """Run the service until interrupted (Ctrl+C or SIGTERM); queued and running jobs are finished first"""
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _interrupt)
+    service = PipelineService(threads, queue_size, manifest)
+    service.start()
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    watcher = Inbox(inbox, service) if inbox else None
+    if watcher:
+        watcher.start()
+    logger.info(f"Service listening on http://{host}:{server.server_address[1]} "
+                f"({threads} job threads, queue {queue_size}{f', inbox {inbox}' if inbox else ''})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Service stopping...")
+    finally:
+        server.server_close()
+        if watcher:
+            watcher.stop()
+        service.stop()
@@ -0,0 +1,50 @@
+import operator
+from typing import TypedDict, Annotated
+
+
+# Reducers shared by the single-run and batch graphs
+def keep_first(existing, new):
+    """Reducer: Keep existing value (first write wins), ignore concurrent updates"""
+    return existing if existing else new
+
+
+# Per-product subgraph state (mirrors the Product A branch of PipelineState)
+class ProductState(TypedDict):
+    """State of one product flowing through content -> FAQ -> page assembly; key is its artifact key"""
+    key: Annotated[str, keep_first]
+    product_a: Annotated[dict, keep_first]
+    content_a: Annotated[dict, keep_first]
+    faq_a: Annotated[dict, keep_first]
+    product_page: Annotated[dict, keep_first]
+    error: Annotated[str | None, keep_first]
+
+
+# Per-pair comparison state
+class PairState(TypedDict):
+    """State of one product pair flowing through the comparison node"""
+    key: Annotated[str, keep_first]
+    product_a: Annotated[dict, keep_first]
+    product_b: Annotated[dict, keep_first]
+    comparison: Annotated[dict, keep_first]
+    error: Annotated[str | None, keep_first]
+
+
+# Catalog-level state for the batch graph
+class BatchState(TypedDict):
+    """Batch state for one catalog window: fan-out inputs plus results collected from every
+    product and pair. partners are already-parsed products from earlier windows that pairs refer to;
+    keys are the output keys of the partners followed by the window's products (the indices pairs use);
+    renders are the keys of products submitted for page rendering in worker processes (pages then holds their keys);
+    compared are the indices of the pairs the comparison matrix already compared."""
+    catalog: Annotated[list, keep_first]
+    keys: Annotated[list, keep_first]
+    partners: Annotated[list, keep_first]
+    pairs: Annotated[list, keep_first]
+    products: Annotated[list, keep_first]
+    contents: Annotated[list, keep_first]
+    faqs: Annotated[list, keep_first]
+    compared: Annotated[list, keep_first]
+    renders: Annotated[list, operator.add]
+    pages: Annotated[list, operator.add]
+    comparisons: Annotated[list, operator.add]
+    errors: Annotated[list, operator.add]
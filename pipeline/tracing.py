@@ -0,0 +1,248 @@
+import os
+import json
+import math
+import time
+import asyncio
+import inspect
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger()
+
+DEFAULT_TRACE_PATH = os.path.join('output', 'trace.json')
+DEFAULT_PROFILE_PATH = os.path.join('output', 'profile.json')
+
+# Counters rolled up from LLM spans into the node span that made the call
+COUNTERS = ('tokens_in', 'tokens_out', 'cache_hits', 'retries', 'queue_wait', 'output_bytes')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _distribution(durations: list) -> dict:
+    return {
+        'count': len(durations),
+        'total_s': round(sum(durations), 4),
+        'p50_s': round(percentile(durations, 0.50), 4),
+        'p95_s': round(percentile(durations, 0.95), 4),
+        'p99_s': round(percentile(durations, 0.99), 4),
+        'max_s': round(max(durations), 4),
+    }
+
+
+def graph_successors(graph) -> dict:
+    """Node -> nodes that can run after it, from a StateGraph's plain, conditional and join edges"""
+    successors = {}
+    for source, target in graph.edges:
+        successors.setdefault(source, set()).add(target)
+    for source, branches in graph.branches.items():
+        for branch in branches.values():
+            targets = branch.ends.values() if branch.ends else graph.nodes
+            successors.setdefault(source, set()).update(targets)
+    for sources, target in getattr(graph, 'waiting_edges', ()):
+        for source in sources:
+            successors.setdefault(source, set()).add(target)
+    return successors
+
+
+def longest_path(successors: dict, weights: dict) -> dict:
+    """Heaviest START -> END path through successors, each node weighing weights[node] (default 0)"""
+    from langgraph.constants import START, END
+    memo = {}
+
+    def longest(node):
+        if node not in memo:
+            best = (0.0, [])
+            for successor in sorted(successors.get(node, ())):
+                if successor != END:
+                    candidate = longest(successor)
+                    if candidate[0] > best[0] or not best[1]:
+                        best = candidate
+            memo[node] = (weights.get(node, 0.0) + best[0], [node] + best[1])
+        return memo[node]
+
+    seconds, path = longest(START)
+    return {'nodes': path[1:], 'seconds': round(seconds, 4)}
+
+
+class Tracer:
+    """Collects node and LLM spans of one run.
+
+    Spans nest through a context variable, so an LLM call (and its cache hit, tokens, queue
+    wait and retries) or a sink write is attributed to the node that made it.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.graphs = {}
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def _lane(self) -> int:
+        """Chrome trace thread id: one lane per thread, or per task on an event loop"""
+        try:
+            owner = id(asyncio.current_task())
+        except RuntimeError:
+            owner = threading.get_ident()
+        with self._lock:
+            return self._lanes.setdefault(owner, len(self._lanes) + 1)
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        parent = _current_span.get()
+        record = {'name': name, 'cat': category, 'lane': self._lane(), 'args': args,
+                  'start': time.perf_counter()}
+        token = _current_span.set(record)
+        try:
+            yield record
+        finally:
+            record['end'] = time.perf_counter()
+            _current_span.reset(token)
+            if parent is not None:
+                for counter in COUNTERS:
+                    if counter in record['args']:
+                        parent['args'][counter] = parent['args'].get(counter, 0) + record['args'][counter]
+            with self._lock:
+                self.spans.append(record)
+
+    def observe_graph(self, name: str, graph) -> None:
+        self.graphs[name] = graph
+
+    def critical_path(self, graph) -> dict:
+        """Longest START -> END path of graph, weighting each node by its slowest observed run"""
+        weights = {}
+        for record in self.spans:
+            if record['cat'] == 'node':
+                weights[record['name']] = max(weights.get(record['name'], 0.0), record['end'] - record['start'])
+        return longest_path(graph_successors(graph), weights)
+
+    def summary(self) -> dict:
+        """Per-node and LLM latency percentiles, LLM usage totals and the critical path of each graph"""
+        nodes, llm_durations, llm = {}, [], {counter: 0 for counter in COUNTERS}
+        for record in self.spans:
+            duration = record['end'] - record['start']
+            if record['cat'] == 'llm':
+                llm_durations.append(duration)
+                for counter in COUNTERS:
+                    llm[counter] += record['args'].get(counter, 0)
+                continue
+            entry = nodes.setdefault(record['name'], {'durations': [], 'tokens_in': 0, 'tokens_out': 0,
+                                                      'output_bytes': 0})
+            entry['durations'].append(duration)
+            for counter in ('tokens_in', 'tokens_out', 'output_bytes'):
+                entry[counter] += record['args'].get(counter, 0)
+
+        llm['queue_wait'] = round(llm['queue_wait'], 4)
+        llm.pop('output_bytes')
+        return {
+            'wall_s': round(time.perf_counter() - self.started, 4),
+            'nodes': {
+                name: {**_distribution(entry.pop('durations')), **entry}
+                for name, entry in sorted(nodes.items(), key=lambda item: -sum(item[1]['durations']))
+            },
+            'llm': {**(_distribution(llm_durations) if llm_durations else {'count': 0}), **llm},
+            'critical_path': {name: self.critical_path(graph) for name, graph in self.graphs.items()},
+        }
+
+    def chrome_trace(self) -> dict:
+        """Trace Event Format document (chrome://tracing, ui.perfetto.dev)"""
+        pid = os.getpid()
+        return {
+            'traceEvents': [
+                {
+                    'name': record['name'],
+                    'cat': record['cat'],
+                    'ph': 'X',
+                    'ts': round((record['start'] - self.started) * 1e6, 1),
+                    'dur': round((record['end'] - record['start']) * 1e6, 1),
+                    'pid': pid,
+                    'tid': record['lane'],
+                    'args': record['args'],
+                }
+                for record in self.spans
+            ],
+            'displayTimeUnit': 'ms',
+        }
+
+    def write(self, trace_path: str = DEFAULT_TRACE_PATH, profile_path: str = DEFAULT_PROFILE_PATH) -> dict:
+        """Save the Chrome trace and the run summary, log the summary's headline numbers"""
+        summary = self.summary()
+        for path, data in ((trace_path, self.chrome_trace()), (profile_path, summary)):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+
+        logger.info(f"Run profile ({summary['wall_s']}s wall), slowest nodes by total time:")
+        for name, entry in list(summary['nodes'].items())[:8]:
+            logger.info(f"  {name}: {entry['count']} runs, total {entry['total_s']}s, "
+                        f"p50 {entry['p50_s']}s, p95 {entry['p95_s']}s, p99 {entry['p99_s']}s")
+        llm = summary['llm']
+        if llm['count']:
+            logger.info(f"  LLM: {llm['count']} calls, {llm['cache_hits']} cache hits, {llm['tokens_in']} tokens in, "
+                        f"{llm['tokens_out']} out, {llm['retries']} retries, {llm['queue_wait']}s queued")
+        for name, path in summary['critical_path'].items():
+            logger.info(f"  Critical path ({name}): {' -> '.join(path['nodes'])} = {path['seconds']}s")
+        logger.info(f"Trace saved: {trace_path} (open in ui.perfetto.dev), profile: {profile_path}")
+        return summary
+
+
+# Process-wide tracer; None (the default) makes every hook a no-op
+_tracer: Tracer | None = None
+
+
+def configure_tracing(enabled: bool = False) -> Tracer | None:
+    global _tracer
+    _tracer = Tracer() if enabled else None
+    return _tracer
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def span(name: str, category: str, **args):
+    """Context manager timing one unit of work (no-op unless tracing is enabled)"""
+    return _tracer.span(name, category, **args) if _tracer else nullcontext()
+
+
+def add(**counters) -> None:
+    """Add to the counters of the innermost open span (no-op outside a span)"""
+    record = _current_span.get()
+    if record is not None:
+        args = record['args']
+        for counter, value in counters.items():
+            args[counter] = args.get(counter, 0) + value
+
+
+def observe_graph(name: str, graph) -> None:
+    """Remember a graph's edges for the critical-path report"""
+    if _tracer:
+        _tracer.observe_graph(name, graph)
+
+
+def traced(name: str, fn):
+    """Wrap a LangGraph node function in a 'node' span; returns fn itself when tracing is off"""
+    if _tracer is None:
+        return fn
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(state):
+            with span(name, 'node', item=state.get('key')):
+                return await fn(state)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(state):
+        with span(name, 'node', item=state.get('key')):
+            return fn(state)
+    return wrapper
@@ -0,0 +1,123 @@
+import math
+import asyncio
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from agents.content_block import ContentBlockAgent, to_columns
+from agents.page_assembler import PageAssemblerAgent
+from pipeline.outputs import encode_for
+
+logger = logging.getLogger()
+
+# Smallest chunk worth a round trip to a worker process (rendering takes about 0.15 ms per product)
+MIN_CHUNK_SIZE = 4
+# Chunks each worker gets per window, so the first ones start while later FAQs are still pending
+CHUNKS_PER_WORKER = 4
+
+content_agent = ContentBlockAgent()
+page_agent = PageAssemblerAgent()
+
+
+def render_chunk(items: list, output_format: str) -> list:
+    """Worker: content blocks, page assembly and serialization for a chunk of products.
+
+    items are {'key', 'product', 'faq'} dicts, the only fields the CPU stages need. Returns
+    (key, encoded product page or None, error or None) per item; the content blocks are built
+    and consumed inside the worker and never cross the process boundary.
+    """
+    contents = content_agent.build_batch(to_columns([item['product'] for item in items]))
+    rendered = []
+    for item, content in zip(items, contents):
+        update = page_agent.run({'product_a': item['product'], 'content_a': content, 'faq_a': item['faq']})
+        page = update.get('product_page')
+        payload = encode_for(output_format, page, item['key']) if page else None
+        rendered.append((item['key'], payload, update.get('error')))
+    return rendered
+
+
+def warm_up() -> None:
+    """No-op task that makes a worker start (and import its modules) ahead of the first chunk"""
+
+
+def chunk_size(window_size: int, workers: int) -> int:
+    """About CHUNKS_PER_WORKER chunks per worker for a full window, but no chunk smaller than MIN_CHUNK_SIZE"""
+    return max(MIN_CHUNK_SIZE, math.ceil(window_size / (CHUNKS_PER_WORKER * max(1, workers))))
+
+
+class WorkerPool:
+    """Process pool for the deterministic CPU stages of a batch run.
+
+    Workers are spawned rather than forked so they never inherit the orchestrator's threads
+    or event loop. Products are submitted one by one as their FAQ is done and leave in chunks
+    of minimal fields as soon as a chunk is full; encoded pages come back.
+    """
+
+    def __init__(self, workers: int, window_size: int):
+        self.workers = workers
+        self.chunk_size = chunk_size(window_size, workers)
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+        self._lock = threading.Lock()
+        self._pending = []
+        self._futures = []
+        # Start the workers now so their startup overlaps the first window's LLM calls
+        for _ in range(workers):
+            self._executor.submit(warm_up)
+        if window_size < workers * MIN_CHUNK_SIZE:
+            logger.warning(f"A window of {window_size} products keeps at most "
+                           f"{math.ceil(window_size / MIN_CHUNK_SIZE)} of {workers} workers busy")
+        logger.info(f"Worker pool started with {workers} processes, {self.chunk_size} products per chunk")
+
+    def submit(self, item: dict, output_format: str) -> None:
+        """Queue one product for rendering; a full chunk is sent to the workers right away"""
+        with self._lock:
+            self._pending.append(item)
+            if len(self._pending) >= self.chunk_size:
+                self._send(output_format)
+
+    def _send(self, output_format: str) -> None:
+        if self._pending:
+            self._futures.append(self._executor.submit(render_chunk, self._pending, output_format))
+            self._pending = []
+
+    def _drain(self, output_format: str) -> list:
+        """Send the last partial chunk and take the futures of everything submitted so far"""
+        with self._lock:
+            self._send(output_format)
+            futures, self._futures = self._futures, []
+        return futures
+
+    def collect(self, output_format: str) -> list:
+        """(key, encoded page or None, error or None) for every product submitted since the last collect"""
+        return [entry for future in self._drain(output_format) for entry in future.result()]
+
+    async def acollect(self, output_format: str) -> list:
+        """Async variant of collect; the event loop keeps serving LLM calls while workers run"""
+        futures = [asyncio.wrap_future(future) for future in self._drain(output_format)]
+        return [entry for chunk in await asyncio.gather(*futures) for entry in chunk]
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+
+# Process-wide pool; None runs every stage in the orchestrator process
+_pool: WorkerPool | None = None
+
+
+def configure_workers(workers: int = 0, window_size: int = 64) -> WorkerPool | None:
+    global _pool
+    shutdown_workers()
+    _pool = WorkerPool(workers, window_size) if workers > 0 else None
+    return _pool
+
+
+def get_pool() -> WorkerPool | None:
+    return _pool
+
+
+def shutdown_workers() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
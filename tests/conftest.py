@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm import FakeChatModel
+from pipeline import llm
+from pipeline.cache import configure_cache
+from pipeline.canonical import configure_dedup
+from pipeline.outputs import configure_sink, close_sink
+from pipeline.runs import configure_run_store, close_run_store
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    """Process-wide response cache in a temporary directory, removed afterwards"""
+    cache = configure_cache(path=str(tmp_path / 'llm_responses.sqlite'))
+    yield cache
+    configure_cache(enabled=False)
+
+
+@pytest.fixture
+def chat_model():
+    """Install a model factory returning the given chat model; the default is restored afterwards"""
+    def install(model):
+        llm.set_llm_factory(lambda model_name, temperature: model)
+        return model
+    yield install
+    llm.set_llm_factory(None)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a temporary directory (output/ lands there) with the CLI's process-wide defaults:
+    no response cache, no checkpoints, no dedup and a pretty sink; restored afterwards"""
+    monkeypatch.chdir(tmp_path)
+    configure_cache(enabled=False)
+    configure_run_store(False)
+    configure_dedup(False)
+    configure_sink("pretty")
+    yield tmp_path
+    close_sink()
+    close_run_store()
+    configure_dedup(False)
+    configure_sink("pretty")
+
+
+@pytest.fixture
+def fake_model(chat_model):
+    """The offline benchmark model, answering at once; .calls counts the requests"""
+    return chat_model(FakeChatModel(latency="fixed:0"))
@@ -0,0 +1,26 @@
+from benchmarks.synthetic import make_catalog
+from pipeline.batch import run_batch, PairPlanner
+from pipeline.outputs import close_sink
+
+
+def test_planner_skips_entries_that_are_not_objects():
+    catalog = make_catalog(3, seed=8)
+    for product in catalog:
+        product['category'] = 'serum'
+    planner = PairPlanner("category")
+    _, pairs = planner.plan([catalog[0], "not a product", None, catalog[1]])
+    _, later = planner.plan([catalog[2]])
+    assert pairs == [(0, 3)] and later == [(0, 4), (3, 4)]
+
+
+def test_non_object_entries_are_reported_and_the_rest_of_the_window_runs(workdir, fake_model):
+    catalog = make_catalog(4, seed=9)
+    for product in catalog:
+        product['category'] = 'serum'
+    try:
+        summary = run_batch(iter(catalog[:2] + ["not a product"] + catalog[2:]), "category", window_size=3)
+    finally:
+        close_sink()
+    assert summary['products'] == 4 and summary['pages'] == 4
+    assert summary['comparisons'] == 6
+    assert summary['errors'] == [{'key': "entry-2", 'error': "Catalog entry 2 is not a JSON object"}]
@@ -0,0 +1,52 @@
+import json
+import random
+
+import httpx
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmarks import pipeline_run
+from benchmarks.fake_llm import FakeChatModel, parse_latency
+
+
+def test_latency_specs():
+    rng = random.Random(1)
+    assert parse_latency("fixed:0.25")(rng) == 0.25
+    assert all(0.1 <= parse_latency("uniform:0.1,0.2")(rng) <= 0.2 for _ in range(100))
+    assert parse_latency("lognormal:0.8,0")(rng) == pytest.approx(0.8)
+    with pytest.raises(ValueError, match="Unknown latency distribution"):
+        parse_latency("gamma:1")
+
+
+def test_fake_failures_follow_the_seed():
+    def outcomes(seed):
+        model = FakeChatModel(latency="fixed:0", error_rate=0.2, rate_limit_rate=0.2, seed=seed)
+        statuses = []
+        for _ in range(50):
+            try:
+                model.invoke([HumanMessage(content="Create 15 FAQ question and answer pairs")])
+                statuses.append(200)
+            except httpx.HTTPStatusError as e:
+                statuses.append(e.response.status_code)
+        return statuses
+
+    assert outcomes(3) == outcomes(3) != outcomes(4)
+    assert {200, 429, 500} <= set(outcomes(3))
+
+
+def test_a_benchmark_run_is_saved_and_compared_with_the_latest(tmp_path, capsys):
+    args = ['--products', "6", '--latency', "fixed:0", '--pairs', "category", '--results-dir', str(tmp_path)]
+    assert pipeline_run.main(args + ['--label', "first"]) == 0
+    assert pipeline_run.main(args + ['--label', "second", '--compare', "latest", '--threshold', "100"]) == 0
+    first, second = sorted(tmp_path.glob('*.json'))
+    result = json.loads(second.read_text(encoding='utf-8'))['results'][0]
+    assert result['case']['products'] == 6 and result['llm']['count'] > 6
+    assert f"Compared with {first}" in capsys.readouterr().out
+
+
+def test_throughput_drops_beyond_the_threshold_are_regressions():
+    case = {'mode': 'batch', 'products': 10, 'workers': 0}
+    before = [{'case': case, 'products_per_s': 10.0, 'peak_rss_mb': 100.0, 'llm': {'count': 20}, 'output_bytes': 0}]
+    after = [{**before[0], 'products_per_s': 8.0}]
+    assert pipeline_run.compare(after, before, 0.1) == ["batch x10: throughput -20.0%"]
+    assert pipeline_run.compare(after, before, 0.3) == []
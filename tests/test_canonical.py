@@ -0,0 +1,92 @@
+import json
+import random
+import re
+
+from langchain_core.messages import AIMessage
+
+from agents.parser import ParserAgent
+from benchmarks.synthetic import make_catalog, make_variant
+from pipeline.batch import run_batch, product_key
+from pipeline.canonical import CanonicalIndex, configure_dedup, respecialize
+from pipeline.outputs import close_sink, get_sink
+
+_PRODUCT = re.compile(r'Product: (\{.*\})')
+
+
+class NamingModel:
+    """Chat model answering every FAQ prompt with one FAQ that names the product; style
+    'exact' repeats name and price as given, 'loose' lowercases the name and drops the currency"""
+
+    def __init__(self, style: str):
+        self.style = style
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        self.calls += 1
+        product = json.loads(_PRODUCT.search(messages[-1].content).group(1))
+        name, price = product['name'], product['price']
+        if self.style == 'loose':
+            name, price = name.lower(), "".join(re.findall(r"\d+", price))
+        faq = {'FAQs': [{'Id': 1, 'Question': f"What is {name}?", 'Answer': f"{name} costs {price}."}]}
+        return AIMessage(content=json.dumps(faq))
+
+
+def _products(*raws) -> list:
+    parser = ParserAgent()
+    return [parser.parse(raw) for raw in raws]
+
+
+def test_variants_share_a_group_and_other_content_does_not():
+    base, other = make_catalog(2, seed=41)
+    variant = make_variant(random.Random(1), base, 2)
+    index = CanonicalIndex()
+    groups = [index.group(product) for product in _products(base, variant, other)]
+    assert groups[0] is groups[1] and groups[2] is not groups[0]
+    assert index.stats()['groups'] == 2
+
+
+def test_respecialize_replaces_name_and_price():
+    base, variant = _products({'product_name': "Glow Serum", 'price': "₹699"},
+                              {'product_name': "Glow Serum 30ml", 'price': "₹899"})
+    group = CanonicalIndex().group(base)
+    faq = {'FAQs': [{'Id': 1, 'Question': "What is Glow Serum?", 'Answer': "Glow Serum costs ₹699."}]}
+    assert respecialize(faq, group, variant)['FAQs'][0] == \
+        {'Id': 1, 'Question': "What is Glow Serum 30ml?", 'Answer': "Glow Serum 30ml costs ₹899."}
+
+
+def test_respecialize_gives_up_when_the_representative_is_still_named():
+    base, variant = _products({'product_name': "Glow Serum", 'price': "₹699"},
+                              {'product_name': "Glow Serum 30ml", 'price': "₹899"})
+    group = CanonicalIndex().group(base)
+    for answer in ("glow serum suits oily skin.", "It costs 699 rupees."):
+        faq = {'FAQs': [{'Id': 1, 'Question': "What is Glow Serum?", 'Answer': answer}]}
+        assert respecialize(faq, group, variant) is None
+
+
+def _dedup_run(catalog: list) -> dict:
+    index = configure_dedup(True)
+    try:
+        run_batch(iter(catalog), window_size=4)
+        return index.stats()
+    finally:
+        close_sink()
+
+
+def test_members_reuse_the_representative_faq(workdir, chat_model):
+    model = chat_model(NamingModel('exact'))
+    base = make_catalog(1, seed=42)[0]
+    variant = make_variant(random.Random(2), base, 1)
+    stats = _dedup_run([base, variant])
+    assert model.calls == 1 and stats['reused'] == 1
+    faq = get_sink().read('faq', product_key(variant['product_name']))
+    assert faq['FAQs'][0]['Answer'] == f"{variant['product_name']} costs {variant['price']}."
+
+
+def test_members_fall_back_to_their_own_request_when_substitution_fails(workdir, chat_model):
+    model = chat_model(NamingModel('loose'))
+    base = make_catalog(1, seed=42)[0]
+    variant = make_variant(random.Random(2), base, 1)
+    stats = _dedup_run([base, variant])
+    assert model.calls == 2 and (stats['reused'], stats['not_reused']) == (0, 1)
+    faq = get_sink().read('faq', product_key(variant['product_name']))
+    assert faq['FAQs'][0]['Question'] == f"What is {variant['product_name'].lower()}?"
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from agents.parser import ParserAgent
+from benchmarks.synthetic import make_catalog
+from pipeline.catalog import iter_json_array, iter_products, iter_windows
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_json_array_streams_every_element(tmp_path, chunk_size):
+    catalog = make_catalog(6, seed=11) + ["not a product", 2.5, None]
+    path = tmp_path / 'catalog.json'
+    path.write_text(json.dumps(catalog, ensure_ascii=False, indent=2), encoding='utf-8')
+    assert list(iter_json_array(str(path), chunk_size=chunk_size)) == catalog
+
+
+def test_jsonl_skips_blank_lines_and_names_the_broken_line(tmp_path):
+    path = tmp_path / 'catalog.jsonl'
+    path.write_text('{"product_name": "A"}\n\n{"product_name": "B"}\n{"product_name": \n', encoding='utf-8')
+    entries = iter_products(str(path))
+    # Lazy: the entries before the broken line are read before it fails
+    assert [next(entries)['product_name'], next(entries)['product_name']] == ["A", "B"]
+    with pytest.raises(ValueError, match=r"catalog\.jsonl:4"):
+        next(entries)
+
+
+def test_unterminated_array_is_an_error(tmp_path):
+    path = tmp_path / 'catalog.json'
+    path.write_text('[{"product_name": "A"}, {"product_name": "B"}', encoding='utf-8')
+    with pytest.raises(ValueError, match="invalid JSON element|unterminated"):
+        list(iter_json_array(str(path), chunk_size=8))
+
+
+def test_windows_split_a_lazy_stream():
+    assert list(iter_windows(iter(range(7)), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_a_malformed_entry_keeps_the_rest_of_the_window():
+    catalog = make_catalog(3, seed=12)
+    result = ParserAgent().run_catalog({'catalog': [catalog[0], "not a product", catalog[1], catalog[2]],
+                                        'keys': ["a", "b", "c", "d"]})
+    assert [product.name for product in result['products']] == [entry['product_name'] for entry in catalog]
+    assert [error['key'] for error in result['errors']] == ["b"]
+    assert "expected a JSON object, got str" in result['errors'][0]['error']
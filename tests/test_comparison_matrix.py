@@ -0,0 +1,40 @@
+import json
+
+from agents.comparison import ComparisonAgent
+from agents.comparison_matrix import ComparisonMatrixAgent, profile
+from agents.parser import ParserAgent
+from benchmarks.synthetic import make_catalog
+
+
+def _pool(size: int, seed: int) -> list:
+    parser = ParserAgent()
+    return [parser.parse(raw) for raw in make_catalog(size, seed=seed)]
+
+
+def test_prompt_lists_profile_facts_instead_of_product_json():
+    agent = ComparisonMatrixAgent()
+    pool = _pool(3, seed=21)
+    pairs = {"C1": (0, 1), "C2": (0, 2)}
+    prompt = agent.build_batch_prompt(pool, pairs, agent.differences(pool, pairs))
+
+    listed = [line for line in prompt.splitlines() if line[:1] == "P" and line[1:2].isdigit()]
+    assert len(listed) == 3
+    for line, product in zip(listed, pool):
+        facts = json.loads(line.split(": ", 1)[1])
+        assert facts['summary'] == profile(product).summary
+        assert isinstance(facts['price'], int) and facts['ingredients'] == list(product['ingredients'])
+    # Usage and side effects are not needed to write the narrative
+    assert all(product['use'] not in prompt and product['side_effects'] not in prompt for product in pool)
+    assert 'C1: a=P1 b=P2 {"price"' in prompt
+
+
+def test_pages_have_the_comparison_agent_shape(fake_model):
+    agent = ComparisonMatrixAgent()
+    pool = _pool(4, seed=22)
+    pages, errors = agent.compare_many(pool, {"C1": (0, 1), "C2": (2, 3)}, token_budget=8000)
+    assert errors == {} and fake_model.calls == 1
+    for comparison_id, (index_a, index_b) in {"C1": (0, 1), "C2": (2, 3)}.items():
+        schema = ComparisonAgent().schema(pool[index_a], pool[index_b])
+        page = pages[comparison_id]
+        assert set(page) == set(schema.fields)
+        assert page[pool[index_a]['name']] == profile(pool[index_a]).summary
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from agents.content_block import ContentBlockAgent, to_columns
+from agents.parser import ParserAgent
+from benchmarks.content_blocks import check_equivalence
+from benchmarks.synthetic import make_catalog
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template.json')
+
+with open(TEMPLATE, encoding='utf-8') as f:
+    TEMPLATE_PRODUCTS = json.load(f)
+
+BASE = TEMPLATE_PRODUCTS[0]
+EDGE_CASES = {
+    'missing price': {key: value for key, value in BASE.items() if key != 'price'},
+    'price without digits': {**BASE, 'price': "on request"},
+    'dollar price': {**BASE, 'price': "$24.99"},
+    'currency code after the amount': {**BASE, 'price': "45 GBP"},
+    'unknown currency': {**BASE, 'price': "CHF 30"},
+    'empty lists': {**BASE, 'skin_type': [], 'key_ingredients': [], 'benefits': []},
+    'separators only in usage': {**BASE, 'how_to_use': " • . • "},
+    'high severity': {**BASE, 'side_effects': "May cause a burning RASH"},
+    'no fields': {},
+}
+
+
+@pytest.mark.parametrize('raw', TEMPLATE_PRODUCTS + list(EDGE_CASES.values()),
+                         ids=[f"template-{index}" for index in range(len(TEMPLATE_PRODUCTS))] + list(EDGE_CASES))
+def test_batch_of_one_matches_build(raw):
+    agent = ContentBlockAgent()
+    product = ParserAgent().parse(raw)
+    assert agent.build(product) == agent.build_batch(to_columns([product]))[0]
+    # Plain product dicts with empty fields left out take the dict path of to_columns
+    plain = {field: value for field, value in product.as_dict().items() if value not in ("", [], None)}
+    assert agent.build(plain) == agent.build_batch(to_columns([plain]))[0]
+
+
+def test_one_batch_matches_per_product_builds():
+    agent = ContentBlockAgent()
+    parser = ParserAgent()
+    products = [parser.parse(raw) for raw in TEMPLATE_PRODUCTS + list(EDGE_CASES.values()) + make_catalog(50)]
+    assert agent.build_batch(to_columns(products)) == [agent.build(product) for product in products]
+
+
+def test_prices_are_parsed_with_their_currency():
+    agent = ContentBlockAgent()
+    prices = [agent.build(ParserAgent().parse(raw))['price_block'] for raw in EDGE_CASES.values()]
+    assert prices[:5] == [{'value': None, 'currency': "INR"}, {'value': None, 'currency': "INR"},
+                          {'value': 2499, 'currency': "USD"}, {'value': 45, 'currency': "GBP"},
+                          {'value': 30, 'currency': "INR"}]
+
+
+def test_both_paths_match_the_original_implementation():
+    agent = ContentBlockAgent()
+    parser = ParserAgent()
+    products = [parser.parse(raw) for raw in TEMPLATE_PRODUCTS + list(EDGE_CASES.values()) + make_catalog(200)]
+    assert check_equivalence(products, [agent.build(product) for product in products],
+                             agent.build_batch(to_columns(products))) == 0
@@ -0,0 +1,65 @@
+import operator
+from typing import Annotated, TypedDict
+
+import pytest
+
+from main import build_pipeline_dataflow
+from pipeline.batch import product_dataflow
+from pipeline.dag import Dataflow
+
+
+def test_pipeline_edges_follow_reads_and_writes():
+    dependencies = build_pipeline_dataflow().dependencies()
+    assert dependencies['load_template'] == {}
+    assert dependencies['parse_product_a'] == {'load_template': ['template']}
+    # The comparison waits for both parsers only, not for content or FAQ
+    assert dependencies['compare_products'] == {'parse_product_a': ['product_a'], 'parse_product_b': ['product_b']}
+    assert dependencies['generate_faq'] == {'parse_product_a': ['product_a']}
+    # parse_product_a is implied by content and FAQ, so the page joins just those two
+    assert dependencies['assemble_product_page'] == {'generate_content_blocks': ['content_a'],
+                                                     'generate_faq': ['faq_a']}
+
+
+def test_product_dataflow_without_page_rendering_is_the_faq_alone():
+    assert product_dataflow(render_in_workers=True).dependencies() == {'generate_faq': {}}
+    assert set(product_dataflow().dependencies()['assemble_product_page']) == \
+        {'generate_content_blocks', 'generate_faq'}
+
+
+def test_two_writers_of_one_key_and_cycles_are_refused():
+    flow = Dataflow()
+    flow.add("a", None, writes=('x', 'error'))
+    flow.add("b", None, writes=('x', 'error'))
+    with pytest.raises(ValueError, match="'x' is written by both a and b"):
+        flow.dependencies()
+
+    flow = Dataflow()
+    flow.add("a", None, reads=('y',), writes=('x',))
+    flow.add("b", None, reads=('x',), writes=('y',))
+    with pytest.raises(ValueError, match="Cycle"):
+        flow.dependencies()
+
+
+class JoinState(TypedDict, total=False):
+    left: int
+    right: int
+    total: int
+    runs: Annotated[list, operator.add]
+
+
+def test_a_node_with_several_producers_runs_once_after_all_of_them():
+    flow = Dataflow()
+    flow.add("left", lambda state: {'left': 1, 'runs': ["left"]}, writes=('left',))
+    flow.add("right", lambda state: {'right': 2, 'runs': ["right"]}, writes=('right',))
+    flow.add("total", lambda state: {'total': state['left'] + state['right'], 'runs': ["total"]},
+             reads=('left', 'right'), writes=('total',))
+    result = flow.build(JoinState).compile().invoke({'runs': []})
+    assert result['total'] == 3
+    assert sorted(result['runs'][:2]) == ["left", "right"] and result['runs'][2:] == ["total"]
+
+
+def test_describe_reports_steps_and_the_critical_path(tmp_path):
+    report = build_pipeline_dataflow().describe("Pipeline", profile_path=str(tmp_path / 'missing.json'))
+    assert "  3: generate_content_blocks, generate_faq, compare_products" in report
+    # FAQ and comparison run side by side, so no path holds more than one LLM call
+    assert report.endswith("= 1 (LLM calls)")
@@ -0,0 +1,79 @@
+import json
+
+from agents.parser import ParserAgent
+from agents.question_gen import QuestionGenerationAgent
+from benchmarks.fake_llm import FakeChatModel, canned_faq
+from benchmarks.synthetic import make_catalog
+from pipeline.batch import run_batch
+from pipeline.llm import estimate_tokens
+from pipeline.outputs import close_sink
+from pipeline.prompts import configure_prompt_budget
+
+
+class DroppingFirst(FakeChatModel):
+    """Offline model whose first batched answer leaves out one product's section"""
+
+    def __init__(self, dropped: str):
+        super().__init__(latency="fixed:0")
+        self.dropped = dropped
+        self.batches = []
+
+    def invoke(self, messages, **kwargs):
+        response = super().invoke(messages, **kwargs)
+        answer = json.loads(response.content)
+        if 'FAQs' not in answer:
+            self.batches.append(sorted(answer))
+            if len(self.batches) == 1:
+                del answer[self.dropped]
+        return type(response)(content=json.dumps(answer))
+
+
+def _products(count: int, seed: int) -> dict:
+    parser = ParserAgent()
+    return {f"P{number}": parser.parse(raw) for number, raw in enumerate(make_catalog(count, seed=seed), 1)}
+
+
+def test_pack_keeps_every_request_within_the_token_budget():
+    agent = QuestionGenerationAgent()
+    products = _products(12, seed=81)
+    batches = agent.pack(products, token_budget=5000)
+    assert [product_id for batch in batches for product_id in batch] == list(products)
+    assert len(batches) > 1 and all(len(batch) * agent.FAQ_OUTPUT_TOKENS < 5000 for batch in batches)
+    # A budget below one product still sends each product on its own
+    assert [len(batch) for batch in agent.pack(products, token_budget=10)] == [1] * 12
+
+
+def test_pack_respects_the_per_call_prompt_budget():
+    agent = QuestionGenerationAgent()
+    products = _products(12, seed=82)
+    budget = configure_prompt_budget(400)
+    try:
+        batches = agent.pack(products, token_budget=100_000)
+        assert len(batches) > 1
+        assert all(budget.fits(estimate_tokens(agent.build_batch_prompt(batch))) for batch in batches)
+    finally:
+        configure_prompt_budget()
+
+
+def test_only_sections_that_fail_are_requested_again(workdir, chat_model):
+    model = chat_model(DroppingFirst("P2"))
+    faqs, errors = QuestionGenerationAgent().generate_many(_products(4, seed=83), token_budget=100_000)
+    assert errors == {} and set(faqs) == {"P1", "P2", "P3", "P4"}
+    assert model.batches == [["P1", "P2", "P3", "P4"], ["P2"]]
+    assert faqs["P1"] == canned_faq()
+
+
+def test_split_response_ignores_broken_sections():
+    agent = QuestionGenerationAgent()
+    content = '```json\n{"P1": {"faq": [{"id": "1", "question": "Q", "answer": "A"}]}, "P2": {"FAQs": []}}\n```'
+    assert agent.split_response(content, {"P1": None, "P2": None, "P3": None}) == \
+        {"P1": {'FAQs': [{'Id': 1, 'Question': "Q", 'Answer': "A"}]}}
+
+
+def test_batched_faqs_in_a_catalog_run_take_fewer_requests(workdir, fake_model):
+    try:
+        summary = run_batch(iter(make_catalog(10, seed=84)), window_size=10, faq_batch_tokens=8000)
+    finally:
+        close_sink()
+    assert summary['pages'] == 10 and summary['errors'] == []
+    assert fake_model.calls < 10
@@ -0,0 +1,26 @@
+import pytest
+
+from benchmarks.import_time import TARGETS, compare, measure_once, parse_importtime
+
+
+@pytest.mark.parametrize('target', ['main', 'agents', 'workers'])
+def test_cli_agents_and_workers_load_no_heavy_package(target):
+    assert measure_once(TARGETS[target])['heavy'] == []
+
+
+def test_importtime_lines_after_site_are_parsed():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       200 |        300 | site",
+        "import time:        50 |         50 |   pipeline.tracing",
+        "import time:       100 |        150 | pipeline",
+    ])
+    assert parse_importtime(stderr) == [(1, "pipeline.tracing", 50), (0, "pipeline", 150)]
+
+
+def test_a_newly_loaded_heavy_package_is_a_regression():
+    before = [{'target': 'main', 'min_ms': 80.0, 'heavy': []}]
+    assert compare([{'target': 'main', 'min_ms': 82.0, 'heavy': []}], before, 0.2) == []
+    assert compare([{'target': 'main', 'min_ms': 82.0, 'heavy': ['langgraph']}], before, 0.2) == \
+        ["main: now imports langgraph"]
+    assert compare([{'target': 'main', 'min_ms': 400.0, 'heavy': []}], before, 0.2) == ["main: import time +400.0%"]
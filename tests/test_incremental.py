@@ -0,0 +1,65 @@
+import os
+import random
+
+from benchmarks.synthetic import make_catalog, make_product
+from pipeline.batch import run_batch, product_key
+from pipeline.manifest import NodeManifest
+from pipeline.outputs import close_sink
+
+
+def incremental_run(catalog: list, pairs_spec=None) -> dict:
+    manifest = NodeManifest()
+    try:
+        run_batch(iter(catalog), pairs_spec, window_size=5, manifest=manifest)
+        return manifest.report()
+    finally:
+        manifest.close()
+        close_sink()
+
+
+def test_unchanged_products_are_skipped_after_an_insertion(workdir, fake_model):
+    catalog = make_catalog(12, seed=3)
+    first = incremental_run(catalog)
+    assert first['skipped'] == 0 and fake_model.calls == 12
+
+    inserted = make_product(random.Random(99), 99)
+    second = incremental_run([inserted] + catalog)
+    new_key = product_key(inserted['product_name'])
+    assert {entry['item'] for entry in second['recomputed_nodes']} == {new_key}
+    assert second['skipped'] == 3 * 12
+    # Only the inserted product asked for a FAQ
+    assert fake_model.calls == 13
+
+    # One artifact per product, none left behind under an old key
+    expected = sorted(f"{product_key(product['product_name'])}.json" for product in [inserted] + catalog)
+    assert sorted(os.listdir(workdir / 'output' / 'faq')) == expected
+    assert sorted(os.listdir(workdir / 'output' / 'product_page')) == expected
+
+
+def test_pairs_are_skipped_after_an_insertion(workdir, fake_model):
+    catalog = make_catalog(8, seed=4)
+    incremental_run(catalog, pairs_spec="category")
+    calls = fake_model.calls
+
+    inserted = make_product(random.Random(98), 98)
+    inserted['category'] = 'unrelated'
+    second = incremental_run([inserted] + catalog, pairs_spec="category")
+    assert {entry['item'] for entry in second['recomputed_nodes']} == {product_key(inserted['product_name'])}
+    assert fake_model.calls == calls + 1
+
+
+def test_repeated_names_get_distinct_keys(workdir, fake_model):
+    catalog = make_catalog(3, seed=5)
+    twin = {**catalog[0], 'price': '₹1'}
+    incremental_run(catalog + [twin])
+    slug = product_key(catalog[0]['product_name'])
+    assert sorted(os.listdir(workdir / 'output' / 'faq')).count(f"{slug}--2.json") == 1
+    assert os.path.exists(workdir / 'output' / 'faq' / f"{slug}.json")
+
+
+def test_reordered_catalog_is_skipped(workdir, fake_model):
+    catalog = make_catalog(10, seed=6)
+    incremental_run(catalog, pairs_spec="category")
+    calls = fake_model.calls
+    second = incremental_run(catalog[::-1], pairs_spec="category")
+    assert second['recomputed'] == 0 and fake_model.calls == calls
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from pipeline import llm
+from pipeline.cache import configure_cache
+
+
+class ChatCompletions(BaseHTTPRequestHandler):
+    """Minimal Mistral chat completions endpoint answering {} to every prompt"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        payload = json.dumps({
+            'id': "chat", 'object': "chat.completion", 'model': llm.MODEL_NAME,
+            'choices': [{'index': 0, 'message': {'role': "assistant", 'content': "{}"}, 'finish_reason': "stop"}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def mistral_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatCompletions)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('MISTRAL_API_KEY', "test")
+    monkeypatch.setenv('MISTRAL_BASE_URL', f"http://127.0.0.1:{server.server_address[1]}")
+    configure_cache(enabled=False)
+    llm.set_llm_factory(None)
+    yield
+    llm.set_llm_factory(None)
+    server.shutdown()
+    server.server_close()
+
+
+def test_each_event_loop_gets_its_own_client_closed_with_it(mistral_server):
+    clients = []
+
+    async def call():
+        response = await llm.ainvoke("Say {}", "test")
+        clients.append(llm._async_clients[asyncio.get_running_loop()][(llm.MODEL_NAME, llm.TEMPERATURE)].async_client)
+        return response.content
+
+    assert llm.run(call()) == "{}"
+    assert llm.run(call()) == "{}"
+    assert clients[0] is not clients[1]
+    assert all(client.is_closed for client in clients)
+    assert not llm._async_clients
+    # The shared sync client is untouched
+    assert llm.invoke("Say {} again", "test").content == "{}"
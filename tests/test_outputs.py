@@ -0,0 +1,93 @@
+import os
+import json
+
+import pytest
+
+from pipeline.outputs import JsonlShardSink, PrettyJsonSink, compact_shards, encode_for, encode_record
+
+
+@pytest.mark.parametrize('make_sink', [lambda root: PrettyJsonSink(str(root)),
+                                       lambda root: JsonlShardSink(str(root), flush_records=2, shard_records=3)],
+                         ids=['pretty', 'jsonl'])
+def test_written_artifacts_read_back(tmp_path, make_sink):
+    sink = make_sink(tmp_path)
+    faqs = {f"serum-{index}": {'FAQs': [{'Id': 1, 'Answer': f"answer {index}"}]} for index in range(8)}
+    for key, faq in faqs.items():
+        sink.write('faq', faq, key)
+    # Finished shards, the open .part shard and records still in the buffer
+    assert all(sink.read('faq', key) == faq for key, faq in faqs.items())
+    sink.write('faq', {'FAQs': []}, "serum-3")
+    assert sink.read('faq', "serum-3") == {'FAQs': []}
+    assert sink.read('faq', "unknown") is None
+    sink.close()
+
+
+def _records(root) -> list:
+    lines = []
+    for path in sorted((root / 'faq').glob('part-*.jsonl')):
+        lines += [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    return lines
+
+
+def test_runs_append_and_compaction_keeps_the_newest_record(tmp_path):
+    first = JsonlShardSink(str(tmp_path), run_id="run-1")
+    for key in ("a", "b", "c"):
+        first.write('faq', {'run': 1}, key)
+    first.close()
+    (old_shard,) = (tmp_path / 'faq').glob('part-run-1-*.jsonl')
+    os.utime(old_shard, (1_000_000, 1_000_000))
+    before = old_shard.read_bytes()
+
+    second = JsonlShardSink(str(tmp_path), run_id="run-0")
+    for key in ("b", "c", "c"):
+        second.write('faq', {'run': 2}, key)
+    second.close()
+    # Closing a run leaves earlier runs' shards alone
+    assert old_shard.read_bytes() == before
+    assert len(_records(tmp_path)) == 6
+
+    # The newest shard wins even though its run id sorts first
+    assert compact_shards(str(tmp_path)) == 3
+    assert sorted((record['key'], record['data']['run']) for record in _records(tmp_path)) == \
+        [("a", 1), ("b", 2), ("c", 2)]
+    assert compact_shards(str(tmp_path)) == 0
+
+
+def test_shards_rotate_and_are_only_complete_once_renamed(tmp_path):
+    sink = JsonlShardSink(str(tmp_path), flush_records=2, shard_records=3, run_id="run")
+    for index in range(7):
+        sink.write('faq', {'index': index}, f"key-{index}")
+    sink.flush()
+    names = sorted(os.listdir(tmp_path / 'faq'))
+    assert names == ["part-run-00001.jsonl", "part-run-00002.jsonl", "part-run-00003.jsonl.part"]
+    sink.close()
+    assert sorted(os.listdir(tmp_path / 'faq'))[-1] == "part-run-00003.jsonl"
+    assert [record['key'] for record in _records(tmp_path)] == [f"key-{index}" for index in range(7)]
+    assert (sink.records_written, sink.bytes_written) == \
+        (7, sum(path.stat().st_size for path in (tmp_path / 'faq').iterdir()))
+
+
+def test_recover_finishes_part_shards_and_drops_what_will_be_redone(tmp_path):
+    directory = tmp_path / 'faq'
+    directory.mkdir()
+    lines = [encode_record({'n': 1}, "done-1"), encode_record({'n': 2}, "redo"), encode_record({'n': 3}, "done-2")]
+    (directory / "part-run-00001.jsonl.part").write_bytes(b"".join(lines) + b'{"key":"done-3","da')
+    (directory / "part-other-00001.jsonl.part").write_bytes(lines[1])
+
+    sink = JsonlShardSink(str(tmp_path), run_id="run")
+    assert sink.recover(lambda key: key.startswith("done")) == 2
+    assert sorted(os.listdir(directory)) == ["part-other-00001.jsonl.part", "part-run-00001.jsonl"]
+    assert [record['key'] for record in _records(tmp_path)] == ["done-1", "done-2"]
+    # The resumed run continues the shard numbering
+    sink.write('faq', {'n': 4}, "redo")
+    sink.close()
+    assert "part-run-00002.jsonl" in os.listdir(directory)
+
+
+def test_pretty_artifacts_are_indented_json_files(tmp_path):
+    sink = PrettyJsonSink(str(tmp_path))
+    sink.write('faq', {'FAQs': ["é"]})
+    sink.write_encoded('faq', encode_for("pretty", {'FAQs': []}), "serum")
+    assert (tmp_path / 'faq.json').read_text(encoding='utf-8') == '{\n    "FAQs": [\n        "é"\n    ]\n}'
+    assert json.loads((tmp_path / 'faq' / 'serum.json').read_text(encoding='utf-8')) == {'FAQs': []}
+    assert sink.records_written == 2
@@ -0,0 +1,55 @@
+import json
+import pickle
+
+import pytest
+
+from agents.parser import ParserAgent, Product, plain_product
+from benchmarks.synthetic import make_catalog
+
+RAW = {'product_name': "Glow Serum", 'concentration': "10% Vitamin C", 'skin_type': ["Oily", "Combination"],
+       'key_ingredients': ["Vitamin C"], 'how_to_use': "Apply at night", 'benefits': ["Brightening"],
+       'price': "₹699", 'side_effects': "Mild tingling"}
+
+
+def test_product_reads_like_the_dict_it_replaces():
+    product = ParserAgent().parse(RAW)
+    assert product['name'] == product.get('name') == "Glow Serum"
+    assert product.get('category', "none") == "none"
+    with pytest.raises(KeyError):
+        product['category']
+    assert list(product) == list(product.keys()) and product.skin_type == ("Oily", "Combination")
+    assert plain_product(product) == {'name': "Glow Serum", 'concentration': "10% Vitamin C",
+                                      'skin_type': ["Oily", "Combination"], 'ingredients': ["Vitamin C"],
+                                      'use': "Apply at night", 'benefits': ["Brightening"], 'price': "₹699",
+                                      'side_effects': "Mild tingling"}
+    json.dumps(plain_product(product))
+
+
+def test_product_is_immutable():
+    product = ParserAgent().parse(RAW)
+    with pytest.raises(AttributeError):
+        product.name = "Other"
+    with pytest.raises(AttributeError):
+        del product.price
+    with pytest.raises(AttributeError):
+        product.category = "serum"
+
+
+def test_repeated_values_are_shared_between_products():
+    parser = ParserAgent()
+    first, second = parser.parse(RAW), parser.parse(json.loads(json.dumps(RAW)))
+    assert first == second and hash(first) == hash(second)
+    assert first.skin_type is second.skin_type and first.use is second.use
+
+
+def test_products_survive_pickling_with_shared_values():
+    products = [ParserAgent().parse(raw) for raw in make_catalog(5, seed=71)]
+    copies = pickle.loads(pickle.dumps(products))
+    assert copies == products
+    assert all(isinstance(copy, Product) for copy in copies)
+    assert copies[0].benefits is ParserAgent().parse(make_catalog(1, seed=71)[0]).benefits
+
+
+def test_entries_that_are_not_objects_are_refused():
+    with pytest.raises(TypeError, match="expected a JSON object, got list"):
+        ParserAgent().parse(["Glow Serum"])
@@ -0,0 +1,36 @@
+import json
+import os
+
+import pytest
+
+from agents.parser import ParserAgent
+from benchmarks.prompt_size import prompt_sizes
+from benchmarks.synthetic import make_catalog
+from pipeline.prompts import PromptBudget, PromptTooLarge, compact_product
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template.json')
+
+
+def test_compact_prompts_are_smaller_than_the_verbose_builders():
+    parser = ParserAgent()
+    with open(TEMPLATE, encoding='utf-8') as f:
+        products = [parser.parse(raw) for raw in json.load(f) + make_catalog(20)]
+    sizes = prompt_sizes(products)
+    assert set(sizes) == {'faq', 'faq_batch', 'comparison'}
+    assert all(compact < verbose for verbose, compact in sizes.values())
+
+
+def test_compact_product_drops_empty_fields_and_sorts_keys():
+    product = ParserAgent().parse({'product_name': "Glow", 'price': "₹1", 'benefits': [], 'side_effects': ""})
+    assert compact_product(product) == '{"name":"Glow","price":"₹1"}'
+
+
+def test_budget_counts_prompts_per_kind_and_refuses_large_ones():
+    budget = PromptBudget(max_tokens=10)
+    budget.admit("x" * 20, 'faq')
+    budget.admit("x" * 36, 'comparison')
+    with pytest.raises(PromptTooLarge):
+        budget.admit("x" * 200, 'faq')
+    stats = budget.stats()
+    assert (stats['prompts'], stats['rejected']) == (2, 1)
+    assert stats['kinds'] == {'faq': {'prompts': 1, 'tokens': 6}, 'comparison': {'prompts': 1, 'tokens': 10}}
@@ -0,0 +1,72 @@
+import json
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agents.comparison import ComparisonAgent
+from agents.question_gen import QuestionGenerationAgent
+
+PRODUCT_A = {'name': 'Glow Serum', 'concentration': '10% Vitamin C', 'skin_type': ['Oily'],
+             'ingredients': ['Vitamin C'], 'benefits': ['Brightening'], 'use': 'Apply 2-3 drops in the morning',
+             'side_effects': 'Mild tingling', 'price': '₹699'}
+PRODUCT_B = {**PRODUCT_A, 'name': 'Night Cream', 'price': '₹899'}
+
+FAQ = {'FAQs': [{'Id': 1, 'Question': 'What is it?', 'Answer': 'A serum.'}]}
+COMPARISON = {'Glow Serum': 'a', 'Night Cream': 'b', 'Comparison': [{'Point': 'p', 'Conclusion': 'c'}],
+              'Recommendation': 'r'}
+
+
+class RepairableModel:
+    """Answers with prose until fixed, then with the given JSON"""
+
+    def __init__(self, answer: dict):
+        self.answer = answer
+        self.fixed = False
+        self.calls = 0
+
+    def _respond(self) -> AIMessage:
+        self.calls += 1
+        return AIMessage(content=json.dumps(self.answer) if self.fixed else "Sorry, I cannot help with that.")
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        return self._respond()
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        return self._respond()
+
+
+def faq(state):
+    return QuestionGenerationAgent().run(state)['faq_a']
+
+
+def afaq(state):
+    return asyncio.run(QuestionGenerationAgent().arun(state))['faq_a']
+
+
+def compare(state):
+    return ComparisonAgent().run(state)['comparison']
+
+
+def acompare(state):
+    return asyncio.run(ComparisonAgent().arun(state))['comparison']
+
+
+@pytest.mark.parametrize('run, answer', [(faq, FAQ), (afaq, FAQ), (compare, COMPARISON), (acompare, COMPARISON)],
+                         ids=['faq', 'faq-async', 'comparison', 'comparison-async'])
+def test_unusable_answers_are_not_replayed(response_cache, chat_model, run, answer):
+    model = chat_model(RepairableModel(answer))
+    state = {'product_a': PRODUCT_A, 'product_b': PRODUCT_B}
+
+    assert run(state) == {}
+    # The answer and the re-ask both failed
+    assert model.calls == 2
+
+    model.fixed = True
+    assert run(state) == answer
+    assert model.calls == 3
+
+    # A usable answer is cached
+    assert run(state) == answer
+    assert model.calls == 3
+
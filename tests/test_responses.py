@@ -0,0 +1,89 @@
+import pytest
+from langchain_core.messages import AIMessage
+
+from agents.comparison import ComparisonAgent
+from agents.parser import ParserAgent
+from benchmarks.fake_llm import FakeChatModel
+from pipeline.prompts import compact_product, configure_prompt_budget
+from pipeline.responses import FAQ_SCHEMA, InvalidResponse, load_object, resolve
+
+
+class ScriptedModel:
+    """Chat model replying with the given answers in turn; .prompts keeps what it was sent"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def invoke(self, messages, **kwargs) -> AIMessage:
+        self.prompts.append(messages[-1].content)
+        return AIMessage(content=self.answers.pop(0))
+
+
+@pytest.fixture
+def prompt_budget(workdir):
+    budget = configure_prompt_budget()
+    yield budget
+    configure_prompt_budget()
+
+
+def test_reask_sends_the_broken_answer_without_the_product_data(chat_model, prompt_budget):
+    parser = ParserAgent()
+    product_a = parser.parse({'product_name': "Glow Serum", 'price': "₹699"})
+    product_b = parser.parse({'product_name': "Calm Cream", 'price': "₹499"})
+    agent = ComparisonAgent()
+    broken = '{"Glow Serum": "A light serum.", "Calm Cream": "A rich cream.", "Comparison": ["Price"]}'
+    model = chat_model(ScriptedModel(broken, '```json\n{"Recommendation": "Pick by skin type."}\n```'))
+
+    result = agent.run({'product_a': product_a, 'product_b': product_b})
+    assert result['comparison']['Recommendation'] == "Pick by skin type."
+    reask = model.prompts[1]
+    assert broken in reask and '"Recommendation"' in reask
+    assert compact_product(product_a) not in reask and agent.build_prompt(product_a, product_b) not in reask
+    kinds = prompt_budget.stats()['kinds']
+    assert kinds['comparison']['prompts'] == 1 and kinds['reask']['prompts'] == 1
+
+
+def test_a_failed_reask_raises(chat_model, prompt_budget):
+    chat_model(ScriptedModel('{"FAQ": []}'))
+    with pytest.raises(InvalidResponse, match="FAQs"):
+        resolve("no JSON here", FAQ_SCHEMA, "prompt", "1", 1)
+
+
+@pytest.mark.parametrize('answer, expected', [
+    ('{"Recommendation": "Either"}', ({'Recommendation': "Either"}, False)),
+    ('Sure! ```json\n{"Recommendation": "Either"}\n``` Hope it helps.', ({'Recommendation': "Either"}, True)),
+    ('{"Comparison": ["Price", "Size",], "Recommendation": "Either",}',
+     ({'Comparison': ["Price", "Size"], 'Recommendation': "Either"}, True)),
+    ('{"FAQs": [{"Id": 1, "Question": "Is it {gentle}?", "Answer": "Yes, it is gen',
+     ({'FAQs': [{'Id': 1, 'Question': "Is it {gentle}?", 'Answer': "Yes, it is gen"}]}, True)),
+    ('{"FAQs": [{"Id": 1, "Question": "Q", "Answer": "A"},', ({'FAQs': [{'Id': 1, 'Question': "Q", 'Answer': "A"}]}, True)),
+    ('["not", "an", "object"]', (None, True)),
+    ('no JSON here', (None, True)),
+], ids=['valid', 'fenced with chatter', 'trailing commas', 'cut off in a string', 'cut off after an item',
+        'array', 'prose'])
+def test_answers_are_repaired_locally(answer, expected):
+    assert load_object(answer) == expected
+
+
+def test_faq_schema_normalizes_keys_and_ids():
+    data, broken = FAQ_SCHEMA.check({'faq': [{'id': "2", 'question': "Q", 'answer': ["A", "B"]},
+                                             {'Question': "No answer"}, "junk"]})
+    assert broken == [] and data == {'FAQs': [{'Id': 2, 'Question': "Q", 'Answer': "A B"}]}
+
+
+def test_a_repaired_answer_needs_no_reask(chat_model, prompt_budget):
+    model = chat_model(ScriptedModel())
+    assert resolve('```\n{"FAQs": [{"Id": 1, "Question": "Q", "Answer": "A"}]\n```', FAQ_SCHEMA, "prompt", "1", 1) == \
+        {'FAQs': [{'Id': 1, 'Question': "Q", 'Answer': "A"}]}
+    assert model.prompts == []
+
+
+def test_malformed_fake_answers_are_completed_by_the_reask(workdir, chat_model, prompt_budget):
+    model = chat_model(FakeChatModel(latency="fixed:0", malformed_rate=1.0))
+    parser = ParserAgent()
+    product_a = parser.parse({'product_name': "Glow Serum", 'price': "₹699"})
+    product_b = parser.parse({'product_name': "Calm Cream", 'price': "₹499"})
+    comparison = ComparisonAgent().run({'product_a': product_a, 'product_b': product_b})['comparison']
+    assert model.calls == 2
+    assert set(comparison) == {"Glow Serum", "Calm Cream", 'Comparison', 'Recommendation'}
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.synthetic import make_catalog
+from pipeline.batch import run_batch, product_key
+from pipeline.outputs import close_sink
+from pipeline.runs import UnknownRun, configure_run_store
+
+
+class FailingFor(FakeChatModel):
+    """Offline model whose requests naming one product fail with a non-retryable error"""
+
+    def __init__(self, name: str):
+        super().__init__(latency="fixed:0")
+        self.name = name
+
+    def invoke(self, messages, **kwargs):
+        if self.name in messages[-1].content:
+            self.calls += 1
+            raise ValueError(f"no answer for {self.name}")
+        return super().invoke(messages, **kwargs)
+
+
+def _run(catalog: list, run_id: str | None = None) -> tuple[str, dict, dict]:
+    """(run id, batch summary, checkpoint counts) of one checkpointed category run"""
+    store = configure_run_store(True, path=os.path.join('output', '.runs.sqlite'))
+    run_id = store.start({'catalog': "catalog.json", 'pairs': "category"}, run_id)
+    try:
+        summary = run_batch(iter(catalog), "category", window_size=2)
+    finally:
+        close_sink()
+    return run_id, summary, store.finish()
+
+
+def test_resume_redoes_only_the_failed_items(workdir, chat_model):
+    catalog = make_catalog(3, seed=51)
+    for product in catalog:
+        product['category'] = 'serum'
+    failing = catalog[1]['product_name']
+    chat_model(FailingFor(failing))
+    run_id, summary, counts = _run(catalog)
+    # The product and its two comparisons fail; the other two products and their pair are done
+    assert summary['pages'] == 2 and summary['comparisons'] == 1
+    assert counts == {'done': 3, 'failed': 3}
+
+    model = chat_model(FakeChatModel(latency="fixed:0"))
+    _, summary, counts = _run(catalog, run_id)
+    assert model.calls == 3 and summary['errors'] == []
+    assert counts == {'done': 6, 'failed': 0}
+    assert os.path.exists(workdir / 'output' / 'faq' / f"{product_key(failing)}.json")
+
+
+def test_resuming_an_unknown_run_is_refused(workdir):
+    store = configure_run_store(True, path=os.path.join('output', '.runs.sqlite'))
+    with pytest.raises(UnknownRun):
+        store.start({}, "19700101-000000-1")
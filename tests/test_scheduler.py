@@ -0,0 +1,124 @@
+import random
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from pipeline import scheduler as scheduler_module
+from pipeline.scheduler import LLMScheduler, PRIORITY_FAQ, WINDOW_SECONDS
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ClockEvent:
+    """threading.Event whose wait advances the fake clock instead of sleeping"""
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+
+    def set(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def wait(self, timeout=None):
+        self.clock.now += max(timeout or 0, 1e-9)
+        return False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler_module.time, 'monotonic', clock)
+    monkeypatch.setattr(scheduler_module, 'threading',
+                        SimpleNamespace(Lock=threading.Lock, Event=lambda: ClockEvent(clock)))
+    return clock
+
+
+def drive(scheduler: LLMScheduler, clock: Clock, costs: list, actual=None) -> list:
+    """Send requests back to back through call, each as soon as the scheduler admits it,
+    settling each with its actual tokens; returns (send time, actual tokens) per request"""
+    grants = []
+    for cost in costs:
+        tokens = actual(cost) if actual else cost
+        scheduler.call(lambda: grants.append((clock.now, tokens)), cost, PRIORITY_FAQ)
+        scheduler.settle(cost, tokens)
+    return grants
+
+
+def max_per_window(grants: list) -> tuple[int, float]:
+    """(most requests, most tokens) granted in any WINDOW_SECONDS span"""
+    most_requests, most_tokens = 0, 0.0
+    for start, _ in grants:
+        inside = [tokens for granted_at, tokens in grants if start <= granted_at < start + WINDOW_SECONDS]
+        most_requests = max(most_requests, len(inside))
+        most_tokens = max(most_tokens, sum(inside))
+    return most_requests, most_tokens
+
+
+def test_requests_per_window_stay_within_rpm(clock):
+    grants = drive(LLMScheduler(rpm=120), clock, [100] * 600)
+    requests, _ = max_per_window(grants)
+    assert requests == 120
+    # The limit is used, not just respected: 600 requests take about 5 minutes
+    assert grants[-1][0] - grants[0][0] < 5 * WINDOW_SECONDS
+
+
+def test_tokens_per_window_stay_within_tpm(clock):
+    rng = random.Random(3)
+    # Mostly single requests, with batched requests larger than the bucket's burst capacity
+    costs = [rng.choice([rng.randint(500, 3000), 15_000]) for _ in range(300)]
+    grants = drive(LLMScheduler(tpm=60_000), clock, costs)
+    _, tokens = max_per_window(grants)
+    assert tokens <= 60_000
+    assert sum(costs) / (grants[-1][0] - grants[0][0] + WINDOW_SECONDS) * 60 > 0.8 * 60_000
+
+
+def test_underestimated_requests_delay_later_callers(clock):
+    rng = random.Random(5)
+    costs = [rng.randint(500, 3000) for _ in range(300)]
+    # Responses turn out twice as large as estimated; settle charges the difference
+    grants = drive(LLMScheduler(tpm=60_000), clock, costs, actual=lambda cost: 2 * cost)
+    _, tokens = max_per_window(grants)
+    # Only the last request's correction can land after the window was full
+    assert tokens <= 60_000 + max(costs)
+    assert sum(2 * cost for cost in costs) / (grants[-1][0] - grants[0][0] + WINDOW_SECONDS) * 60 <= 60_000
+
+
+def test_both_limits(clock):
+    grants = drive(LLMScheduler(rpm=30, tpm=20_000), clock, [1000] * 200)
+    requests, tokens = max_per_window(grants)
+    assert requests <= 30 and tokens <= 20_000
+
+
+def test_rate_limited_requests_pause_and_retry(clock):
+    scheduler = LLMScheduler(rpm=60)
+    request = httpx.Request('POST', "http://llm.test/v1/chat/completions")
+    errors = [httpx.HTTPStatusError("429", request=request, response=httpx.Response(429, headers={'retry-after': "7"}))]
+    sent = []
+
+    def send():
+        sent.append(clock.now)
+        if errors:
+            raise errors.pop()
+        return "answer"
+
+    assert scheduler.call(send, 100) == "answer"
+    assert sent[1] - sent[0] >= 7
+    stats = scheduler.stats()
+    assert (stats['granted'], stats['retries'], stats['rate_limited']) == (2, 1, 1)
+
+
+def test_final_errors_are_not_retried(clock):
+    scheduler = LLMScheduler()
+    with pytest.raises(ValueError):
+        scheduler.call(lambda: int("x"), 100)
+    assert scheduler.stats()['failed'] == 1
@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.synthetic import make_catalog
+from pipeline.batch import product_key
+from pipeline.outputs import close_sink
+from pipeline.service import PipelineService, ServiceHandler, validate_job
+
+
+@pytest.fixture
+def service_url(workdir, fake_model):
+    service = PipelineService(threads=2, queue_size=4)
+    service.start()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), type('TestHandler', (ServiceHandler,), {'service': service}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.stop()
+    close_sink()
+
+
+def post(url: str, body) -> tuple[int, dict]:
+    request = urllib.request.Request(f"{url}/jobs?wait=30", data=json.dumps(body).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize('product, problem', [
+    ({'price': "₹1"}, "'product_name' must be a non-empty string"),
+    ({'product_name': "Glow", 'price': 699}, "'price' must be a string"),
+    ({'product_name': "Glow", 'skin_type': "Oily"}, "'skin_type' must be a list of strings"),
+    ({'product_name': "Glow", 'benefits': ["Hydration", None]}, "'benefits' must be a list of strings"),
+])
+def test_products_with_wrong_fields_are_refused(product, problem):
+    with pytest.raises(ValueError, match=problem):
+        validate_job({'kind': 'product', 'products': [product]})
+
+
+def test_bad_fields_get_a_400(service_url):
+    status, body = post(service_url, {'kind': 'compare', 'products': [make_catalog(1)[0], {'product_name': 5}]})
+    assert status == 400 and body['error'].startswith("Product 1:")
+
+
+def test_repeated_jobs_replace_the_product_outputs(service_url, workdir):
+    product, other = make_catalog(2, seed=31)
+    for _ in range(3):
+        status, body = post(service_url, {'kind': 'product', 'products': [product]})
+        assert status == 200 and body['status'] == "done" and body['result']['faq']
+    status, body = post(service_url, {'kind': 'compare', 'products': [product, other]})
+    assert status == 200 and body['status'] == "done"
+
+    key = product_key(product['product_name'])
+    assert os.listdir(workdir / 'output' / 'faq') == [f"{key}.json"]
+    assert os.listdir(workdir / 'output' / 'product_page') == [f"{key}.json"]
+    assert os.listdir(workdir / 'output' / 'comparison_page') == \
+        [f"{key}__vs__{product_key(other['product_name'])}.json"]
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import make_catalog
+from pipeline import tracing
+from pipeline.batch import run_batch
+from pipeline.outputs import close_sink
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.configure_tracing(True)
+    yield tracer
+    tracing.configure_tracing(False)
+
+
+def test_percentiles_use_the_nearest_rank():
+    values = list(range(1, 101))
+    assert [tracing.percentile(values, fraction) for fraction in (0.5, 0.95, 0.99, 1.0)] == [50, 95, 99, 100]
+    assert tracing.percentile([3.0], 0.99) == 3.0
+
+
+def test_llm_counters_roll_up_into_the_calling_node(tracer):
+    with tracing.span("generate_faq", 'node'):
+        with tracing.span("llm", 'llm'):
+            tracing.add(tokens_in=120, tokens_out=40)
+        with tracing.span("llm", 'llm'):
+            tracing.add(tokens_in=80, cache_hits=1)
+    tracing.add(tokens_in=1)  # outside any span: ignored
+    summary = tracer.summary()
+    assert summary['llm']['count'] == 2
+    assert (summary['llm']['tokens_in'], summary['llm']['cache_hits']) == (200, 1)
+    assert summary['nodes']['generate_faq']['tokens_in'] == 200 and summary['nodes']['generate_faq']['count'] == 1
+
+
+def test_a_traced_batch_run_writes_its_trace_and_profile(workdir, fake_model, tracer):
+    try:
+        run_batch(iter(make_catalog(3, seed=61)), "category", window_size=2)
+    finally:
+        close_sink()
+    summary = tracer.write()
+    assert summary['nodes']['generate_faq']['count'] == 3
+    assert summary['llm']['count'] == fake_model.calls
+    assert summary['critical_path']['product']['nodes'][-1] == "assemble_product_page"
+
+    with open(workdir / 'output' / 'trace.json', encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    assert {event['cat'] for event in events} >= {'node', 'llm'}
+    assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in events)
+    with open(workdir / 'output' / 'profile.json', encoding='utf-8') as f:
+        assert json.load(f)['llm']['count'] == summary['llm']['count']
@@ -0,0 +1,35 @@
+import math
+
+import pytest
+
+from agents.parser import ParserAgent
+from pipeline.workers import WorkerPool, chunk_size, MIN_CHUNK_SIZE
+
+FAQ = {'FAQs': [{'Id': 1, 'Question': 'What is it?', 'Answer': 'A serum.'}]}
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4, 8])
+def test_default_window_keeps_every_worker_busy(workers):
+    size = chunk_size(64, workers)
+    assert size >= MIN_CHUNK_SIZE
+    assert math.ceil(64 / size) >= workers
+
+
+def test_full_chunks_leave_before_collect():
+    parser = ParserAgent()
+    product = parser.parse({'product_name': 'Glow Serum', 'concentration': '10% Vitamin C', 'skin_type': ['Oily'],
+                            'key_ingredients': ['Vitamin C'], 'benefits': ['Brightening'], 'how_to_use': 'Daily',
+                            'side_effects': 'None', 'price': '₹699'})
+    pool = WorkerPool(2, window_size=16)
+    try:
+        keys = [f"{index:05d}-glow-serum" for index in range(10)]
+        for key in keys:
+            pool.submit({'key': key, 'product': product, 'faq': FAQ}, 'jsonl')
+        # 10 products in chunks of 4: two chunks are already with the workers, two products wait
+        assert len(pool._futures) == 2 and len(pool._pending) == 2
+        rendered = pool.collect('jsonl')
+        assert [key for key, _, _ in rendered] == keys
+        assert all(payload and error is None for _, payload, error in rendered)
+        assert pool.collect('jsonl') == []
+    finally:
+        pool.close()